@@ -1,7 +1,7 @@
 """
-Alembic configuration and initialization script.
-Run: alembic init alembic
-Then configure the migration environment.
+Alembic migration environment.
+Run from the repository root: alembic upgrade head
+The database comes from DATABASE_URL, as for the services.
 """
 
 import os
@@ -19,7 +19,7 @@ from shared.database import Base
 from shared.models import (
     User, Merchant, RiderCompany, Rider,
     Order, OrderTracking, Payment, Transaction, Payout,
-    RiderDocument, RiderReview, Message
+    RiderDocument, RiderReview, RiderStats, Message
 )
 
 # Get database URL
@@ -0,0 +1,68 @@
+"""Composite indexes for hot order and review queries
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+Indexes the predicates the services filter on most:
+
+    orders (assigned_rider_id, status)       rider load, availability checks
+    orders (status, acceptance_deadline)     acceptance-timeout sweep
+    orders (company_id, status)              company dashboards
+    orders (merchant_id, created_at, id)     merchant order list, keyset paging
+    rider_reviews (rider_id, created_at)     a rider's reviews, newest first
+
+The same indexes are declared on the models, so databases created by
+Base.metadata.create_all already have them; IF NOT EXISTS makes this
+revision a no-op there. On PostgreSQL the indexes are built CONCURRENTLY so
+the orders table stays writable during the upgrade.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_orders_rider_status", "orders", ["assigned_rider_id", "status"]),
+    ("ix_orders_status_deadline", "orders", ["status", "acceptance_deadline"]),
+    ("ix_orders_company_status", "orders", ["company_id", "status"]),
+    ("ix_orders_merchant_created", "orders", ["merchant_id", "created_at", "id"]),
+    ("ix_rider_reviews_rider_created", "rider_reviews", ["rider_id", "created_at"]),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    concurrently = bind.dialect.name == "postgresql"
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            if table not in tables:
+                # Not created yet; create_all will build it with these indexes
+                continue
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=concurrently
+            )
+    if concurrently:
+        for table in sorted({table for _, table, _ in INDEXES} & tables):
+            op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    concurrently = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                if_exists=True,
+                postgresql_concurrently=concurrently
+            )
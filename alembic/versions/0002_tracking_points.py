@@ -0,0 +1,38 @@
+"""Location history table for tracking sessions
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+tracking_service flushes buffered rider fixes here in batches; the route
+endpoint reads them back by (tracking_id, ts).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "tracking_points" in sa.inspect(op.get_bind()).get_table_names():
+        # Already built by Base.metadata.create_all
+        return
+    op.create_table(
+        "tracking_points",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer, "sqlite"), primary_key=True, autoincrement=True),
+        sa.Column("tracking_id", sa.String(36), nullable=False),
+        sa.Column("ts", sa.Integer, nullable=False),
+        sa.Column("lat", sa.Float, nullable=False),
+        sa.Column("lng", sa.Float, nullable=False),
+    )
+    op.create_index("ix_tracking_points_tracking_ts", "tracking_points", ["tracking_id", "ts"])
+
+
+def downgrade():
+    op.drop_index("ix_tracking_points_tracking_ts", table_name="tracking_points", if_exists=True)
+    op.drop_table("tracking_points")
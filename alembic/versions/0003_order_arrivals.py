@@ -0,0 +1,32 @@
+"""Geofence arrival timestamps on orders
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+tracking_service reports ARRIVED_AT_PICKUP / ARRIVED_AT_DROPOFF from its
+geofences; the order service keeps the first report of each.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+COLUMNS = ("arrived_pickup_at", "arrived_dropoff_at")
+
+
+def upgrade():
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("orders")}
+    for name in COLUMNS:
+        if name not in existing:  # already built by Base.metadata.create_all
+            op.add_column("orders", sa.Column(name, sa.DateTime, nullable=True))
+
+
+def downgrade():
+    for name in COLUMNS:
+        op.drop_column("orders", name)
@@ -0,0 +1,113 @@
+"""Persistent payment ledger
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+payment_service kept payments, payouts, company balances, its transaction
+log and alerts in process memory. They move to payment_intents, payouts
+(new scheduling columns), a double-entry ledger (ledger_entries plus
+per-account balance snapshots in ledger_accounts) and payment_events.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BIGINT_PK = sa.BigInteger().with_variant(sa.Integer, "sqlite")
+
+PAYOUT_COLUMNS = (
+    sa.Column("schedule", sa.String(20), nullable=True),
+    sa.Column("next_run", sa.Integer, nullable=True),
+    sa.Column("retries", sa.Integer, nullable=True),
+    sa.Column("reason", sa.String(100), nullable=True),
+    sa.Column("last_retry_at", sa.Integer, nullable=True),
+    sa.Column("cancelled_at", sa.DateTime, nullable=True),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())  # some may already be built by Base.metadata.create_all
+
+    existing = {c["name"] for c in inspector.get_columns("payouts")}
+    for column in PAYOUT_COLUMNS:
+        if column.name not in existing:
+            op.add_column("payouts", column)
+
+    if "payment_intents" not in tables:
+        op.create_table(
+            "payment_intents",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("status", sa.String(30), index=True),
+            sa.Column("amount", sa.Integer, nullable=False),
+            sa.Column("currency", sa.String(3)),
+            sa.Column("phone", sa.String(20), nullable=True),
+            sa.Column("metadata", sa.JSON),
+            sa.Column("company_id", sa.String(36), nullable=True, index=True),
+            sa.Column("platform_fee", sa.Integer),
+            sa.Column("merchant_amount", sa.Integer),
+            sa.Column("hubtel_ref", sa.String(100), nullable=True),
+            sa.Column("reference", sa.String(100), nullable=True),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("updated_at", sa.DateTime),
+        )
+
+    if "ledger_entries" not in tables:
+        op.create_table(
+            "ledger_entries",
+            sa.Column("id", BIGINT_PK, primary_key=True, autoincrement=True),
+            sa.Column("txn_id", sa.String(36), nullable=False, index=True),
+            sa.Column("account", sa.String(100), nullable=False),
+            sa.Column("amount", sa.BigInteger, nullable=False),
+            sa.Column("entry_type", sa.String(30), nullable=False),
+            sa.Column("payment_id", sa.String(36), nullable=True),
+            sa.Column("payout_id", sa.String(36), nullable=True),
+            sa.Column("ref", sa.String(100), nullable=True),
+            sa.Column("created_at", sa.DateTime),
+        )
+        op.create_index("ix_ledger_entries_account_id", "ledger_entries", ["account", "id"])
+        op.create_index("ix_ledger_entries_payout", "ledger_entries", ["payout_id"])
+
+    if "ledger_accounts" not in tables:
+        op.create_table(
+            "ledger_accounts",
+            sa.Column("account", sa.String(100), primary_key=True),
+            sa.Column("balance", sa.BigInteger, nullable=False),
+            sa.Column("entry_id", sa.BigInteger, nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+
+    if "payment_events" not in tables:
+        op.create_table(
+            "payment_events",
+            sa.Column("id", BIGINT_PK, primary_key=True, autoincrement=True),
+            sa.Column("kind", sa.String(20), nullable=False),
+            sa.Column("level", sa.String(20), nullable=True),
+            sa.Column("message", sa.Text, nullable=True),
+            sa.Column("payment_id", sa.String(36), nullable=True, index=True),
+            sa.Column("payout_id", sa.String(36), nullable=True),
+            sa.Column("status", sa.String(50), nullable=True),
+            sa.Column("hubtel_ref", sa.String(100), nullable=True),
+            sa.Column("amount", sa.Float, nullable=True),
+            sa.Column("data", sa.JSON, nullable=True),
+            sa.Column("created_at", sa.DateTime),
+        )
+        op.create_index("ix_payment_events_kind_id", "payment_events", ["kind", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_payment_events_kind_id", table_name="payment_events", if_exists=True)
+    op.drop_table("payment_events")
+    op.drop_table("ledger_accounts")
+    op.drop_index("ix_ledger_entries_payout", table_name="ledger_entries", if_exists=True)
+    op.drop_index("ix_ledger_entries_account_id", table_name="ledger_entries", if_exists=True)
+    op.drop_table("ledger_entries")
+    op.drop_table("payment_intents")
+    for column in PAYOUT_COLUMNS:
+        op.drop_column("payouts", column.name)
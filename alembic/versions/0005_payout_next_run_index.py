@@ -0,0 +1,28 @@
+"""Index payouts by (status, next_run)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+payment_service's payout scheduler reads open payouts falling due within
+its resync window; the index keeps that read independent of payout history.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {ix["name"] for ix in sa.inspect(op.get_bind()).get_indexes("payouts")}
+    if "ix_payouts_status_next_run" not in existing:  # already built by Base.metadata.create_all
+        op.create_index("ix_payouts_status_next_run", "payouts", ["status", "next_run"])
+
+
+def downgrade():
+    op.drop_index("ix_payouts_status_next_run", table_name="payouts", if_exists=True)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+ANOMAAH Delivery Platform — DB Concurrency Benchmark
+══════════════════════════════════════════════════════
+Fires N concurrent requests at a running service and reports latency
+percentiles. Run it once against a build that uses the sync Session
+endpoints and once against the AsyncSession ones (same DB, same data) to
+compare p99 under load. POST bodies make it usable for order creation,
+which fans out to payment/tracking/notification calls.
+
+Usage:
+  python3 benchmark_db_concurrency.py --token <JWT>
+  python3 benchmark_db_concurrency.py --url http://localhost:8500/orders --concurrency 500 --requests 5000
+  python3 benchmark_db_concurrency.py --url http://localhost:8700/riders/<id>/rating
+  python3 benchmark_db_concurrency.py --baseline http://old-host:8500/orders --url http://localhost:8500/orders
+  python3 benchmark_db_concurrency.py --method POST --body @order.json --url http://localhost:8500/orders/create
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of floats."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+async def run_load(url: str, token: str, concurrency: int, total: int,
+                   method: str = "GET", body=None) -> dict:
+    """Send `total` requests with at most `concurrency` in flight."""
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=60.0) as client:
+        async def one():
+            nonlocal errors
+            async with sem:
+                start = time.perf_counter()
+                try:
+                    resp = await client.request(method, url, json=body)
+                    if resp.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "url": url,
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+def print_result(label: str, r: dict):
+    print(f"{label:<10} {r['url']}")
+    print(f"           {r['requests']} requests, {r['errors']} errors, {r['rps']:.0f} req/s")
+    print(f"           p50 {r['p50_ms']:.1f} ms   p95 {r['p95_ms']:.1f} ms   "
+          f"p99 {r['p99_ms']:.1f} ms   mean {r['mean_ms']:.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent latency benchmark for DB-backed endpoints")
+    parser.add_argument("--url", default="http://localhost:8500/orders", help="Endpoint under test")
+    parser.add_argument("--baseline", help="Optional second endpoint (e.g. the sync build) to compare against")
+    parser.add_argument("--token", default="", help="Bearer token for authenticated endpoints")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--body", help="JSON request body, or @file to read it from a file")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=50)
+    args = parser.parse_args()
+
+    body = None
+    if args.body:
+        raw = open(args.body[1:]).read() if args.body.startswith("@") else args.body
+        body = json.loads(raw)
+
+    targets = [("baseline", args.baseline), ("candidate", args.url)] if args.baseline else [("result", args.url)]
+    results = {}
+    for label, url in targets:
+        await run_load(url, args.token, min(args.concurrency, args.warmup), args.warmup, args.method, body)
+        results[label] = await run_load(url, args.token, args.concurrency, args.requests, args.method, body)
+        print_result(label, results[label])
+
+    if args.baseline:
+        before, after = results["baseline"]["p99_ms"], results["candidate"]["p99_ms"]
+        change = (before - after) / before * 100 if before else 0.0
+        print(f"\np99 {before:.1f} ms -> {after:.1f} ms ({change:.1f}% lower)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
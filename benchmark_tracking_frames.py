@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+ANOMAAH Delivery Platform — Tracking Frame Size Benchmark
+═══════════════════════════════════════════════════════════
+Replays a synthetic delivery (a rider moving toward the dropoff with the
+status advancing) through tracking_service's JSON location_update frame
+and the compact binary frame from shared/tracking_frames.py, and reports
+bytes per update on the wire (payload + server websocket frame header),
+the total for a whole delivery and the encode cost of each format.
+--deflate also shows per-message DEFLATE sizes, roughly what
+permessage-deflate without context takeover would send.
+
+Usage:
+  python3 benchmark_tracking_frames.py
+  python3 benchmark_tracking_frames.py --updates 1800 --watchers 3 --deflate
+"""
+
+import argparse
+import json
+import math
+import statistics
+import time
+import zlib
+
+from shared.tracking_frames import FRAME_SIZE, decode_location_frame, encode_location_frame
+
+PICKUP = (5.6037, -0.1870)   # Accra
+DROPOFF = (5.6500, -0.1500)
+
+
+def ws_header_size(payload_len: int) -> int:
+    """Unmasked (server → client) websocket frame header length."""
+    if payload_len < 126:
+        return 2
+    return 4 if payload_len < 65536 else 10
+
+
+def synthetic_updates(n: int) -> list:
+    """location_update messages for one delivery, as ConnectionManager.broadcast receives them."""
+    statuses = ["ASSIGNED", "PICKED_UP", "IN_TRANSIT"]
+    started = 1704067800
+    updates = []
+    for i in range(n):
+        t = i / max(n - 1, 1)
+        lat = PICKUP[0] + (DROPOFF[0] - PICKUP[0]) * t + math.sin(i / 7) * 1e-4
+        lng = PICKUP[1] + (DROPOFF[1] - PICKUP[1]) * t + math.cos(i / 11) * 1e-4
+        status = "DELIVERED" if i == n - 1 else statuses[min(2, i * 3 // n)]
+        updates.append({
+            "type": "location_update",
+            "data": {
+                "tracking_id": "TRK-7f3c9a2e41b8",
+                "order_id": "8c1f4e2a-6b7d-4f0e-9a3b-2d5c7e9f1a4b",
+                "rider_id": "3e9b7c1d-2f4a-4b8e-8d6c-1a5f9e3b7c2d",
+                "status": status,
+                "current_location": {"lat": round(lat, 7), "lng": round(lng, 7), "timestamp": started + i},
+                "dropoff": {"lat": DROPOFF[0], "lng": DROPOFF[1]},
+                "eta_seconds": int((1 - t) * 1500),
+                "updated_at": started + i,
+            },
+        })
+    return updates
+
+
+def measure(name: str, payloads: list, encode_us: float) -> dict:
+    sizes = [len(p) for p in payloads]
+    wire = [s + ws_header_size(s) for s in sizes]
+    return {
+        "name": name,
+        "payload": statistics.fmean(sizes),
+        "wire": statistics.fmean(wire),
+        "total": sum(wire),
+        "encode_us": encode_us,
+    }
+
+
+def timed(fn, items) -> tuple:
+    started = time.perf_counter()
+    out = [fn(item) for item in items]
+    return out, (time.perf_counter() - started) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs compact binary tracking frame sizes")
+    parser.add_argument("--updates", type=int, default=1500, help="Location updates in the delivery")
+    parser.add_argument("--watchers", type=int, default=1, help="Websocket clients watching the delivery")
+    parser.add_argument("--deflate", action="store_true", help="Also report per-message DEFLATE sizes")
+    args = parser.parse_args()
+
+    updates = synthetic_updates(args.updates)
+    json_frames, json_us = timed(json.dumps, updates)
+    compact_frames, compact_us = timed(lambda u: encode_location_frame(u["data"]), updates)
+
+    # The compact frame must round-trip everything a client renders
+    for update, frame in zip(updates, compact_frames):
+        decoded = decode_location_frame(frame)
+        loc = update["data"]["current_location"]
+        assert decoded["status"] == update["data"]["status"]
+        assert abs(decoded["current_location"]["lat"] - loc["lat"]) < 1e-7
+        assert abs(decoded["current_location"]["lng"] - loc["lng"]) < 1e-7
+
+    rows = [
+        measure("json", [f.encode() for f in json_frames], json_us),
+        measure("compact", compact_frames, compact_us),
+    ]
+    if args.deflate:
+        deflate = lambda data: zlib.compress(data, 6)[2:-4]  # raw DEFLATE, as permessage-deflate sends
+        rows.append(measure("json+deflate", [deflate(f.encode()) for f in json_frames], json_us))
+        rows.append(measure("compact+deflate", [deflate(f) for f in compact_frames], compact_us))
+
+    print(f"{args.updates} updates x {args.watchers} watcher(s); compact frame is {FRAME_SIZE} bytes\n")
+    print(f"{'format':<18}{'payload B':>11}{'wire B':>10}{'per delivery':>15}{'encode µs':>12}")
+    baseline = rows[0]["total"]
+    for row in rows:
+        total = row["total"] * args.watchers
+        print(f"{row['name']:<18}{row['payload']:>11.1f}{row['wire']:>10.1f}"
+              f"{total / 1024:>12.1f} KiB{row['encode_us']:>12.2f}"
+              + ("" if row is rows[0] else f"   ({row['total'] / baseline * 100:.1f}% of json)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+ANOMAAH Delivery Platform — Tracking WebSocket Fan-out Load Test
+══════════════════════════════════════════════════════════════════
+Opens many concurrent websocket subscribers spread round-robin over several
+tracking_service workers/replicas, posts rider updates through a different
+replica than most watchers are connected to, and reports how many
+subscribers received each update and the delivery latency percentiles.
+With a shared backplane (TRACKING_STORE_URL/TRACKING_PUBSUB_URL=redis://...)
+every subscriber should receive every update whichever replica it is on.
+
+Start several replicas first. Updates move the rider ~1 m, so turn the
+location coalescer off or most of them are (correctly) never broadcast:
+  export TRACKING_STORE_URL=redis://localhost:6379/0 TRACKING_MIN_DISPLACEMENT_M=0 TRACKING_MAX_BROADCAST_HZ=0
+  uvicorn main:app --port 8301 &
+  uvicorn main:app --port 8302 &
+  uvicorn main:app --port 8303 &
+
+Usage:
+  python3 loadtest_tracking_ws.py --token <rider JWT> \\
+      --urls http://localhost:8301,http://localhost:8302,http://localhost:8303 \\
+      --subscribers 10000 --sessions 100 --updates 20
+
+10k sockets from one client process needs `ulimit -n` above 10k.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+import websockets
+
+from benchmark_db_concurrency import percentile
+
+BASE_LAT, BASE_LNG = 5.6037, -0.1870  # Accra
+LAT_STEP = 1e-5                        # each update moves the rider by one step
+
+
+def ws_url(http_url: str, tracking_id: str) -> str:
+    return http_url.replace("http", "ws", 1).rstrip("/") + f"/ws/tracking/{tracking_id}"
+
+
+async def subscriber(url: str, sent_at: dict, received: dict, latencies: list,
+                     ready: asyncio.Event, done: asyncio.Event, counters: dict,
+                     connect_sem: asyncio.Semaphore):
+    """Watch one tracking session, recording arrival latency of each update."""
+    try:
+        async with connect_sem:
+            ws = await websockets.connect(url, open_timeout=60, max_queue=None)
+            await ws.recv()  # initial_state
+        async with ws:
+            counters["connected"] += 1
+            if counters["connected"] + counters["failed"] == counters["target"]:
+                ready.set()
+            while not done.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.perf_counter()
+                msg = json.loads(raw)
+                if msg.get("type") != "location_update":
+                    continue
+                loc = msg["data"].get("current_location") or {}
+                seq = round((loc.get("lat", BASE_LAT) - BASE_LAT) / LAT_STEP)
+                key = (msg["data"]["tracking_id"], seq)
+                if key in sent_at:
+                    received[key] += 1
+                    latencies.append((now - sent_at[key]) * 1000)
+    except Exception:
+        counters["failed"] += 1
+        if counters["connected"] + counters["failed"] == counters["target"]:
+            ready.set()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Cross-replica websocket fan-out load test")
+    parser.add_argument("--urls", default="http://localhost:8300",
+                        help="Comma-separated tracking_service base URLs (one per worker/replica)")
+    parser.add_argument("--token", required=True, help="Rider (or superadmin) JWT for start/update")
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=100, help="Tracking sessions the subscribers are spread over")
+    parser.add_argument("--updates", type=int, default=20, help="Updates posted per session")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between update rounds")
+    parser.add_argument("--connect-concurrency", type=int, default=500)
+    args = parser.parse_args()
+
+    urls = [u.strip().rstrip("/") for u in args.urls.split(",") if u.strip()]
+    headers = {"Authorization": f"Bearer {args.token}"}
+    limits = httpx.Limits(max_connections=100)
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30.0) as client:
+        tracking_ids = []
+        for i in range(args.sessions):
+            r = await client.post(f"{urls[i % len(urls)]}/tracking/start", json={
+                "order_id": f"loadtest-{i}", "rider_id": f"loadtest-rider-{i}",
+                "dropoff_lat": BASE_LAT + 0.05, "dropoff_lng": BASE_LNG + 0.05
+            })
+            r.raise_for_status()
+            tracking_ids.append(r.json()["tracking_id"])
+        print(f"Started {len(tracking_ids)} tracking sessions on {len(urls)} replicas")
+
+        sent_at, received, latencies = {}, defaultdict(int), []
+        counters = {"connected": 0, "failed": 0, "target": args.subscribers}
+        ready, done = asyncio.Event(), asyncio.Event()
+        connect_sem = asyncio.Semaphore(args.connect_concurrency)
+
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(subscriber(
+                ws_url(urls[n % len(urls)], tracking_ids[n % len(tracking_ids)]),
+                sent_at, received, latencies, ready, done, counters, connect_sem
+            ))
+            for n in range(args.subscribers)
+        ]
+        await ready.wait()
+        print(f"{counters['connected']} subscribers connected ({counters['failed']} failed) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        # Watchers of session i sit on every replica; its updates go through replica i+1
+        expected = defaultdict(int)
+        for n in range(args.subscribers):
+            expected[tracking_ids[n % len(tracking_ids)]] += 1
+
+        errors = 0
+        for seq in range(1, args.updates + 1):
+            async def post(i, tracking_id):
+                nonlocal errors
+                sent_at[(tracking_id, seq)] = time.perf_counter()
+                try:
+                    r = await client.post(f"{urls[(i + 1) % len(urls)]}/tracking/update/{tracking_id}", json={
+                        "lat": BASE_LAT + seq * LAT_STEP, "lng": BASE_LNG
+                    })
+                except httpx.HTTPError:
+                    # e.g. a keep-alive connection the server closed while subscribers connected
+                    errors += 1
+                    del sent_at[(tracking_id, seq)]
+                    return
+                if r.status_code >= 400:
+                    errors += 1
+            await asyncio.gather(*(post(i, t) for i, t in enumerate(tracking_ids)))
+            await asyncio.sleep(args.interval)
+
+        await asyncio.sleep(2.0)  # let stragglers arrive
+        done.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    want = sum(expected[t] for t, _ in sent_at)
+    got = sum(received.values())
+    print(f"\nUpdates posted: {len(sent_at)} ({errors} errors)")
+    print(f"Deliveries:     {got}/{want} ({got / want * 100 if want else 0:.2f}%)")
+    if latencies:
+        print(f"Latency:        p50 {percentile(latencies, 50):.1f} ms   p95 {percentile(latencies, 95):.1f} ms   "
+              f"p99 {percentile(latencies, 99):.1f} ms   mean {statistics.fmean(latencies):.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
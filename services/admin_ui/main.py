@@ -1,17 +1,19 @@
 import os
 import time
+import asyncio
 import json
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional
 from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, RedirectResponse
-import httpx
+from shared.http import http_client, sync_http_client, setup_http_clients
 
 # For demo: mock data sources (replace with real service calls in production)
 
 app = FastAPI(title="Admin UI")
+setup_http_clients(app)
 
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 
@@ -32,7 +34,7 @@ def proxy_get(request: Request, target_url: str):
     if token:
         headers["Authorization"] = f"Bearer {token}"
     try:
-        with httpx.Client(timeout=15.0) as client:
+        with sync_http_client(timeout=15.0) as client:
             r = client.get(target_url, headers=headers, params=dict(request.query_params))
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -51,7 +53,7 @@ async def proxy_post(request: Request, target_url: str, body=None):
     except Exception:
         body = None
     try:
-        with httpx.Client(timeout=15.0) as client:
+        with sync_http_client(timeout=15.0) as client:
             if body:
                 r = client.post(target_url, headers=headers, json=body)
             else:
@@ -141,7 +143,7 @@ def api_login(payload: dict, response: Response):
     if not username or not password:
         raise HTTPException(status_code=400, detail="username and password required")
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/token", json={"username": username, "password": password})
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -176,8 +178,8 @@ def company_rider_earnings(request: Request):
     PAYMENT_SERVICE_URL = os.environ.get("PAYMENT_SERVICE_URL", "http://localhost:8200")
     # Fetch all transactions and payouts for this company
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r1 = client.get(f"{PAYMENT_SERVICE_URL}/transactions")
+        with sync_http_client(timeout=10.0) as client:
+            r1 = client.get(f"{PAYMENT_SERVICE_URL}/transactions", params={"company_id": company_id, "limit": 500})
             r2 = client.get(f"{PAYMENT_SERVICE_URL}/admin/payouts", params={"company_id": company_id})
             r3 = client.get(f"{PAYMENT_SERVICE_URL}/companies/{company_id}/balance")
     except Exception as e:
@@ -213,7 +215,7 @@ def company_enroll_rider(payload: dict, request: Request):
 
     # Get company info from /me
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             me_r = client.get(f"{AUTH_SERVICE_URL}/me", headers=headers)
             if me_r.status_code != 200:
                 raise HTTPException(status_code=401, detail="Auth failed")
@@ -228,7 +230,7 @@ def company_enroll_rider(payload: dict, request: Request):
 
     # Get the company record to find company.id
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             cr = client.get(f"{AUTH_SERVICE_URL}/company/commission", headers=headers)
             company_id = cr.json().get("company_id") if cr.status_code == 200 else None
     except Exception:
@@ -262,7 +264,7 @@ def company_enroll_rider(payload: dict, request: Request):
     }
 
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/register", json=reg_body)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -286,7 +288,7 @@ def company_list_riders(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{AUTH_SERVICE_URL}/company/riders", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -302,7 +304,7 @@ def company_suspend_rider(user_id: str, request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/users/{user_id}/suspend", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -317,7 +319,7 @@ def company_ban_rider(user_id: str, request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/users/{user_id}/ban", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -332,7 +334,7 @@ def company_reactivate_rider(user_id: str, request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/users/{user_id}/reactivate", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -348,7 +350,7 @@ def company_get_commission(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{AUTH_SERVICE_URL}/company/commission", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -363,7 +365,7 @@ def company_update_commission(payload: dict, request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/company/commission", headers=headers, json=payload)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -383,7 +385,7 @@ def company_revenue(request: Request):
 
     result = {"balance": 0, "total_revenue": 0, "total_payouts": 0, "payments": [], "payouts": [], "commission_pct": 15.0}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             # Get company info for company_id
             cr = client.get(f"{AUTH_SERVICE_URL}/company/commission", headers=headers)
             company_id = ""
@@ -399,7 +401,7 @@ def company_revenue(request: Request):
                     result["balance"] = br.json().get("balance", 0)
 
             # Transactions
-            tr = client.get(f"{PAYMENT_SERVICE_URL}/transactions")
+            tr = client.get(f"{PAYMENT_SERVICE_URL}/transactions", params={"company_id": company_id} if company_id else None)
             if tr.status_code == 200:
                 txs = tr.json().get("transactions", [])
                 result["payments"] = txs[:50]
@@ -414,11 +416,7 @@ def company_revenue(request: Request):
                     result["total_payouts"] = sum(p.get("amount", 0) for p in payouts if p.get("status") == "COMPLETED")
 
             # Also get delivered orders revenue from order service
-            or_r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
-            if or_r.status_code == 200:
-                orders = or_r.json() if isinstance(or_r.json(), list) else []
-                delivered = [o for o in orders if o.get("status") == "DELIVERED"]
-                result["total_revenue"] = round(sum(o.get("price_ghs", 0) for o in delivered), 2)
+            result["total_revenue"] = _get_order_analytics(client, headers).get("total_revenue", 0)
     except Exception:
         pass
     return result
@@ -438,7 +436,7 @@ def company_withdraw(payload: dict, request: Request):
 
     # Get company_id
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             cr = client.get(f"{AUTH_SERVICE_URL}/company/commission", headers=headers)
             company_id = cr.json().get("company_id") if cr.status_code == 200 else None
     except Exception:
@@ -451,7 +449,7 @@ def company_withdraw(payload: dict, request: Request):
 
     payout_body = {"company_id": company_id, "amount": float(amount), "schedule": schedule}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{PAYMENT_SERVICE_URL}/payouts/request", json=payout_body)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -468,7 +466,7 @@ def company_send_message(user_id: str, payload: dict, request: Request):
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     body = {"rider_user_id": user_id, "message": payload.get("message", ""), "is_alert": payload.get("is_alert", False)}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/company/messages/send", headers=headers, json=body)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -483,7 +481,7 @@ def company_get_messages(user_id: str, request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{AUTH_SERVICE_URL}/company/messages/{user_id}", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -501,7 +499,7 @@ def company_rider_tracking(rider_id: str, request: Request):
     headers = {"Authorization": f"Bearer {token}"}
     tracking_url = os.environ.get("TRACKING_SERVICE_URL", "http://localhost:8300")
     try:
-        with httpx.Client(timeout=5.0) as client:
+        with sync_http_client(timeout=5.0) as client:
             r = client.get(f"{tracking_url}/tracking/rider/{rider_id}", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -510,18 +508,75 @@ def company_rider_tracking(rider_id: str, request: Request):
 
 
 # --- Company dashboard endpoint (legacy) ---
+DASHBOARD_FANOUT_LIMIT = int(os.environ.get("DASHBOARD_FANOUT_LIMIT", "10"))  # max in-flight per-rider calls
+MAX_BULK_RIDERS = 500  # per-request cap of the review/status/tracking bulk endpoints
+
+
+async def _fetch_per_rider(client, rider_ids, url_for, extract, headers=None, timeout=5.0):
+    """Fallback fan-out: one GET per rider, at most DASHBOARD_FANOUT_LIMIT in flight."""
+    sem = asyncio.Semaphore(DASHBOARD_FANOUT_LIMIT)
+    results = {}
+
+    async def one(rider_id):
+        async with sem:
+            try:
+                r = await client.get(url_for(rider_id), headers=headers, timeout=timeout)
+                if r.status_code == 200:
+                    results[rider_id] = extract(r.json())
+            except Exception:
+                pass
+
+    await asyncio.gather(*(one(rider_id) for rider_id in rider_ids))
+    return results
+
+
+async def _fetch_bulk(client, bulk_url, rider_ids, extract, fallback, headers=None, timeout=5.0):
+    """
+    POST to a service's bulk endpoint in batches of MAX_BULK_RIDERS, at most
+    DASHBOARD_FANOUT_LIMIT in flight; falls back to the per-rider fan-out if
+    that service predates the bulk endpoint.
+    """
+    if not rider_ids:
+        return {}
+    sem = asyncio.Semaphore(DASHBOARD_FANOUT_LIMIT)
+    no_bulk_endpoint = False
+
+    async def batch(ids):
+        nonlocal no_bulk_endpoint
+        async with sem:
+            try:
+                r = await client.post(bulk_url, json={"rider_ids": ids}, headers=headers, timeout=timeout)
+            except Exception:
+                return {}
+        if r.status_code == 200:
+            return extract(r.json())
+        if r.status_code in (404, 405):
+            no_bulk_endpoint = True
+        return {}
+
+    batches = await asyncio.gather(*(
+        batch(rider_ids[i:i + MAX_BULK_RIDERS]) for i in range(0, len(rider_ids), MAX_BULK_RIDERS)
+    ))
+    if no_bulk_endpoint:
+        return await fallback()
+    results = {}
+    for found in batches:
+        results.update(found)
+    return results
+
+
 @app.get("/api/company/dashboard")
-def company_dashboard(request: Request):
+async def company_dashboard(request: Request):
     # For demo, get company_id from query param or cookie (in production, use JWT or session)
     company_id = request.query_params.get("company_id") or request.cookies.get("company_id") or "company-123"
     ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
-    TRACKING_SERVICE_URL = os.environ.get("TRACKING_SERVICE_URL", "http://localhost:8600")
+    TRACKING_SERVICE_URL = os.environ.get("TRACKING_SERVICE_URL", "http://localhost:8300")
     REVIEW_SERVICE_URL = os.environ.get("REVIEW_SERVICE_URL", "http://localhost:8700")
     RIDER_STATUS_URL = os.environ.get("RIDER_STATUS_URL", "http://localhost:8800")
+    client = http_client(timeout=10.0)
     # Fetch company orders
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(f"{ORDER_SERVICE_URL}/orders/tenant", headers={"Authorization": "Bearer company_admin-token"})
+        r = await client.get(f"{ORDER_SERVICE_URL}/orders/tenant", headers={"Authorization": "Bearer company_admin-token"})
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Order service: {e}")
     if r.status_code != 200:
@@ -549,56 +604,71 @@ def company_dashboard(request: Request):
             elif o.get("status") == "ASSIGNED":
                 rider_stats[rider]["active"] += 1
             rider_stats[rider]["total"] += 1
-    # Fetch reviews for all riders
-    rider_reviews = {}
-    if REVIEW_SERVICE_URL:
-        for rider_id in rider_stats:
-            try:
-                with httpx.Client(timeout=5.0) as client:
-                    r = client.get(f"{REVIEW_SERVICE_URL}/reviews/rider/{rider_id}")
-                    if r.status_code == 200:
-                        data = r.json()
-                        rider_reviews[rider_id] = data.get("reviews", [])
-            except Exception:
-                pass
-    # Calculate average rating per rider
+    rider_ids = list(rider_stats)
+    active_riders = [r for r, s in rider_stats.items() if s["active"] > 0]
+    token = get_token_from_request(request)
+    auth_headers = {"Authorization": f"Bearer {token}"} if token else None
+
+    def _rating_summary(data):
+        reviews = data.get("reviews", [])
+        return {
+            "average_rating": round(sum(x.get("rating", 0) for x in reviews) / len(reviews), 2) if reviews else 0.0,
+            "total_reviews": len(reviews),
+        }
+
+    # Ratings, statuses and live locations: one bulk call per service, all in parallel
+    async def fetch_ratings():
+        if not REVIEW_SERVICE_URL:
+            return {}
+        return await _fetch_bulk(
+            client, f"{REVIEW_SERVICE_URL}/riders/ratings/bulk", rider_ids,
+            lambda data: data.get("ratings", {}),
+            lambda: _fetch_per_rider(
+                client, rider_ids, lambda rid: f"{REVIEW_SERVICE_URL}/riders/{rid}/reviews?per_page=50",
+                _rating_summary
+            )
+        )
+
+    async def fetch_statuses():
+        if not RIDER_STATUS_URL:
+            return {}
+        return await _fetch_bulk(
+            client, f"{RIDER_STATUS_URL}/status/bulk", rider_ids,
+            lambda data: {s["rider_id"]: s.get("status", "offline") for s in data.get("statuses", [])},
+            lambda: _fetch_per_rider(
+                client, rider_ids, lambda rid: f"{RIDER_STATUS_URL}/status/{rid}",
+                lambda data: data.get("status", "offline"), timeout=3.0
+            ),
+            timeout=3.0
+        )
+
+    async def fetch_locations():
+        if not TRACKING_SERVICE_URL:
+            return {}
+        return await _fetch_bulk(
+            client, f"{TRACKING_SERVICE_URL}/tracking/riders/bulk", active_riders,
+            lambda data: {rid: s.get("current_location") for rid, s in data.get("sessions", {}).items()},
+            lambda: _fetch_per_rider(
+                client, active_riders, lambda rid: f"{TRACKING_SERVICE_URL}/tracking/rider/{rid}",
+                lambda data: data.get("current_location"), headers=auth_headers
+            ),
+            headers=auth_headers
+        )
+
+    rider_ratings, rider_statuses, live_locations = await asyncio.gather(
+        fetch_ratings(), fetch_statuses(), fetch_locations()
+    )
     for rider_id, stats in rider_stats.items():
-        reviews = rider_reviews.get(rider_id, [])
-        if reviews:
-            stats["avg_rating"] = round(sum(r.get("rating", 0) for r in reviews) / len(reviews), 2)
-            stats["num_ratings"] = len(reviews)
+        rating = rider_ratings.get(rider_id) or {}
+        if rating.get("total_reviews"):
+            stats["avg_rating"] = rating["average_rating"]
+            stats["num_ratings"] = rating["total_reviews"]
         else:
             stats["avg_rating"] = None
             stats["num_ratings"] = 0
         # On-time delivery rate
         stats["on_time_rate"] = round((stats["on_time"] / stats["delivered"] * 100) if stats["delivered"] else 0, 1)
-    # Fetch status for all riders
-    rider_statuses = {}
-    if RIDER_STATUS_URL:
-        for rider_id in rider_stats:
-            try:
-                with httpx.Client(timeout=3.0) as client:
-                    r = client.get(f"{RIDER_STATUS_URL}/status/{rider_id}")
-                    if r.status_code == 200:
-                        data = r.json()
-                        rider_statuses[rider_id] = data.get("status", "offline")
-            except Exception:
-                pass
-    for rider_id, stats in rider_stats.items():
         stats["status"] = rider_statuses.get(rider_id, "offline")
-    # Fetch live tracking for active riders
-    active_riders = [r for r, s in rider_stats.items() if s["active"] > 0]
-    live_locations = {}
-    if active_riders and TRACKING_SERVICE_URL:
-        for rider_id in active_riders:
-            try:
-                with httpx.Client(timeout=5.0) as client:
-                    r = client.get(f"{TRACKING_SERVICE_URL}/tracking/rider/{rider_id}")
-                    if r.status_code == 200:
-                        data = r.json()
-                        live_locations[rider_id] = data.get("last_location")
-            except Exception:
-                pass
     return {
         "company_id": company_id,
         "total_orders": len(company_orders),
@@ -615,25 +685,22 @@ def admin_orders_stats(request: Request):
     token = get_token_from_request(request)
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
+    headers = {"Authorization": f"Bearer {token}"}
     ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(f"{ORDER_SERVICE_URL}/orders/tenant", headers={"Authorization": "Bearer superadmin-token"})
+        with sync_http_client(timeout=10.0) as client:
+            summary = _get_order_analytics(client, headers)
+            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers, params={"limit": 10})
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
     if r.status_code != 200:
         raise HTTPException(status_code=r.status_code, detail=r.text)
-    orders = r.json() if isinstance(r.json(), list) else []
-    total_orders = len(orders)
-    assigned = sum(1 for o in orders if o.get("status") == "ASSIGNED")
-    delivered = sum(1 for o in orders if o.get("status") == "DELIVERED")
-    pending = sum(1 for o in orders if o.get("status") in ("OFFERED", "PENDING", "OFFERING"))
-    recent = sorted(orders, key=lambda o: o.get("created_at", 0), reverse=True)[:10]
+    recent = r.json() if isinstance(r.json(), list) else []
     return {
-        "total_orders": total_orders,
-        "assigned_orders": assigned,
-        "delivered_orders": delivered,
-        "pending_orders": pending,
+        "total_orders": summary.get("total_orders", 0),
+        "assigned_orders": summary.get("assigned_orders", 0),
+        "delivered_orders": summary.get("delivered_orders", 0),
+        "pending_orders": summary.get("pending_orders", 0),
         "recent_orders": recent,
     }
 
@@ -645,7 +712,7 @@ def admin_alerts(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     PAYMENT_SERVICE_URL = os.environ.get("PAYMENT_SERVICE_URL", "http://localhost:8200")
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{PAYMENT_SERVICE_URL}/admin/alerts")
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -661,7 +728,7 @@ def admin_users(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{AUTH_SERVICE_URL}/users", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -673,26 +740,34 @@ def admin_users(request: Request):
 
 # --- Superadmin orders endpoint (for dashboard table) ---
 @app.get("/api/admin/orders")
-def admin_orders(request: Request):
-    """Fetch all orders from order service, return with stats."""
+def admin_orders(request: Request, cursor: Optional[str] = None):
+    """Fetch one page of orders (newest first) from order service, return with stats."""
     token = get_token_from_request(request)
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
+    params = {"limit": ADMIN_ORDERS_PAGE_SIZE}
+    if cursor:
+        params["cursor"] = cursor
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+        with sync_http_client(timeout=10.0) as client:
+            summary = _get_order_analytics(client, headers)
+            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers, params=params)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
     if r.status_code != 200:
         raise HTTPException(status_code=r.status_code, detail=r.text)
     orders = r.json() if isinstance(r.json(), list) else []
-    delivered = sum(1 for o in orders if o.get("status") == "DELIVERED")
-    revenue = round(sum(o.get("price_ghs", 0) for o in orders if o.get("status") == "DELIVERED"), 2)
-    # Sort by created_at descending
-    orders.sort(key=lambda o: o.get("created_at", ""), reverse=True)
-    return {"orders": orders, "delivered": delivered, "revenue": revenue}
+    return {
+        "orders": orders,
+        "next_cursor": r.headers.get("X-Next-Cursor"),
+        "total": summary.get("total_orders", 0),
+        "delivered": summary.get("delivered_orders", 0),
+        "revenue": summary.get("total_revenue", 0),
+    }
 
 
 # --- Superadmin riders endpoint ---
@@ -705,7 +780,7 @@ def admin_riders(request: Request):
     headers = {"Authorization": f"Bearer {token}"}
     RIDER_STATUS_URL = os.environ.get("RIDER_STATUS_URL", "http://localhost:8800")
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{AUTH_SERVICE_URL}/users", headers=headers)
             if r.status_code != 200:
                 return {"riders": []}
@@ -751,6 +826,35 @@ def admin_audit_log(request: Request):
         ]
     }
 
+# --- Order analytics (aggregated by order_service) ---
+BREAKDOWN_PERIODS = ("1h", "4h", "6h", "1d", "3d", "monthly")
+ADMIN_ORDERS_PAGE_SIZE = 100  # orders per page in admin/merchant order tables
+MERCHANT_RECENT_ORDERS = 10  # orders on the merchant dashboard; the rest page via /api/merchant/orders
+
+
+def _get_order_analytics(client, headers, params: Optional[dict] = None) -> dict:
+    """Counts, revenue and time windows from order_service's /analytics/summary."""
+    ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
+    r = client.get(f"{ORDER_SERVICE_URL}/analytics/summary", headers=headers, params=params)
+    if r.status_code != 200:
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    return r.json()
+
+
+def _status_count(summary: dict, *names) -> int:
+    """Orders in any of the given statuses, from an analytics summary."""
+    by_status = summary.get("by_status", {})
+    return sum(by_status.get(s, {}).get("count", 0) for s in names)
+
+
+def _window_breakdown(summary: dict, key: str, total) -> dict:
+    """{period: value} for one metric of the analytics windows, plus the total."""
+    windows = summary.get("windows", {})
+    result = {label: windows.get(label, {}).get(key, 0) for label in BREAKDOWN_PERIODS}
+    result["total"] = total
+    return result
+
+
 # --- Superadmin summary stats endpoint ---
 @app.get("/api/admin/summary")
 def admin_summary(request: Request):
@@ -761,7 +865,7 @@ def admin_summary(request: Request):
     summary = {"last_updated": int(time.time())}
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             # Get users from auth service
             try:
                 r = client.get(f"{AUTH_SERVICE_URL}/users", headers=headers)
@@ -777,17 +881,14 @@ def admin_summary(request: Request):
                 summary["active_merchants"] = 0
                 summary["total_riders"] = 0
                 summary["total_companies"] = 0
-            # Get order stats
-            ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
+            # Get order stats (aggregated server-side)
             try:
-                r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
-                if r.status_code == 200:
-                    orders = r.json() if isinstance(r.json(), list) else []
-                    summary["total_orders"] = len(orders)
-                    summary["delivered_orders"] = sum(1 for o in orders if o.get("status") == "DELIVERED")
-                    summary["cancelled_orders"] = sum(1 for o in orders if o.get("status") == "CANCELLED")
-                    summary["total_revenue"] = round(sum(o.get("price_ghs", 0) for o in orders if o.get("status") == "DELIVERED"), 2)
-                    summary["cancelled_revenue"] = round(sum(o.get("price_ghs", 0) for o in orders if o.get("status") == "CANCELLED"), 2)
+                stats = _get_order_analytics(client, headers)
+                summary["total_orders"] = stats["total_orders"]
+                summary["delivered_orders"] = stats["delivered_orders"]
+                summary["cancelled_orders"] = stats["cancelled_orders"]
+                summary["total_revenue"] = stats["total_revenue"]
+                summary["cancelled_revenue"] = stats["cancelled_revenue"]
             except Exception:
                 summary["total_orders"] = 0
                 summary["total_revenue"] = 0.0
@@ -815,26 +916,14 @@ def admin_orders_breakdown(request: Request):
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
-    ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+        with sync_http_client(timeout=10.0) as client:
+            summary = _get_order_analytics(client, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
-    orders = r.json() if isinstance(r.json(), list) else []
-    now = datetime.utcnow()
-    periods = {"1h": 1, "4h": 4, "6h": 6, "1d": 24, "3d": 72, "monthly": 720}
-    result = {}
-    for label, hours in periods.items():
-        cutoff = now - timedelta(hours=hours)
-        cutoff_str = cutoff.isoformat()
-        count = sum(1 for o in orders if (o.get("created_at") or "") >= cutoff_str)
-        result[label] = count
-    result["total"] = len(orders)
-    return result
-
+    return _window_breakdown(summary, "orders", summary.get("total_orders", 0))
 
 # --- Time-breakdown endpoint for delivered orders ---
 @app.get("/api/admin/delivered/breakdown")
@@ -844,27 +933,14 @@ def admin_delivered_breakdown(request: Request):
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
-    ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+        with sync_http_client(timeout=10.0) as client:
+            summary = _get_order_analytics(client, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
-    orders = r.json() if isinstance(r.json(), list) else []
-    delivered = [o for o in orders if o.get("status") == "DELIVERED"]
-    now = datetime.utcnow()
-    periods = {"1h": 1, "4h": 4, "6h": 6, "1d": 24, "3d": 72, "monthly": 720}
-    result = {}
-    for label, hours in periods.items():
-        cutoff = now - timedelta(hours=hours)
-        cutoff_str = cutoff.isoformat()
-        count = sum(1 for o in delivered if (o.get("delivered_at") or o.get("created_at") or "") >= cutoff_str)
-        result[label] = count
-    result["total"] = len(delivered)
-    return result
-
+    return _window_breakdown(summary, "delivered", summary.get("delivered_orders", 0))
 
 # --- Time-breakdown endpoint for revenue ---
 @app.get("/api/admin/revenue/breakdown")
@@ -874,27 +950,14 @@ def admin_revenue_breakdown(request: Request):
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
-    ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+        with sync_http_client(timeout=10.0) as client:
+            summary = _get_order_analytics(client, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
-    orders = r.json() if isinstance(r.json(), list) else []
-    delivered = [o for o in orders if o.get("status") == "DELIVERED"]
-    now = datetime.utcnow()
-    periods = {"1h": 1, "4h": 4, "6h": 6, "1d": 24, "3d": 72, "monthly": 720}
-    result = {}
-    for label, hours in periods.items():
-        cutoff = now - timedelta(hours=hours)
-        cutoff_str = cutoff.isoformat()
-        rev = round(sum(o.get("price_ghs", 0) for o in delivered if (o.get("delivered_at") or o.get("created_at") or "") >= cutoff_str), 2)
-        result[label] = rev
-    result["total"] = round(sum(o.get("price_ghs", 0) for o in delivered), 2)
-    return result
-
+    return _window_breakdown(summary, "revenue", summary.get("total_revenue", 0))
 
 # --- Superadmin: Platform Financial Overview ---
 @app.get("/api/admin/financials")
@@ -914,25 +977,23 @@ def admin_financials(request: Request):
         "companies_summary": [],
     }
     try:
-        with httpx.Client(timeout=15.0) as client:
-            # Orders
+        with sync_http_client(timeout=15.0) as client:
+            # Orders: totals aggregated server-side, plus the 30 latest cancellations
             try:
-                r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+                stats = _get_order_analytics(client, headers)
+                result["total_revenue"] = stats["total_revenue"]
+                result["cancelled_orders"] = stats["cancelled_orders"]
+                result["cancelled_revenue_lost"] = stats["cancelled_revenue"]
+                r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers,
+                               params={"status": "CANCELLED", "limit": 30})
                 if r.status_code == 200:
-                    orders = r.json() if isinstance(r.json(), list) else []
-                    delivered = [o for o in orders if o.get("status") == "DELIVERED"]
-                    cancelled = [o for o in orders if o.get("status") == "CANCELLED"]
-                    result["total_revenue"] = round(sum(o.get("price_ghs", 0) for o in delivered), 2)
-                    result["cancelled_orders"] = len(cancelled)
-                    result["cancelled_revenue_lost"] = round(sum(o.get("price_ghs", 0) for o in cancelled), 2)
-                    cancelled.sort(key=lambda o: o.get("created_at", ""), reverse=True)
-                    result["cancelled"] = cancelled[:30]
+                    result["cancelled"] = r.json() if isinstance(r.json(), list) else []
             except Exception:
                 pass
 
             # Transactions from payment service
             try:
-                tr = client.get(f"{PAYMENT_SERVICE_URL}/transactions")
+                tr = client.get(f"{PAYMENT_SERVICE_URL}/transactions", params={"limit": 50})
                 if tr.status_code == 200:
                     txs = tr.json().get("transactions", [])
                     result["transactions"] = txs[:50]
@@ -992,30 +1053,24 @@ def admin_cancelled_orders(request: Request):
     headers = {"Authorization": f"Bearer {token}"}
     ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+        with sync_http_client(timeout=10.0) as client:
+            summary = _get_order_analytics(client, headers)
+            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers,
+                           params={"status": "CANCELLED", "limit": 30})
+    except HTTPException:
+        return {"cancelled": [], "total": 0, "total_lost": 0}
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
     if r.status_code != 200:
         return {"cancelled": [], "total": 0, "total_lost": 0}
-    orders = r.json() if isinstance(r.json(), list) else []
-    cancelled = [o for o in orders if o.get("status") == "CANCELLED"]
-    now = datetime.utcnow()
-    periods = {"1h": 1, "4h": 4, "6h": 6, "1d": 24, "3d": 72, "monthly": 720}
-    breakdown = {}
-    for label, hours in periods.items():
-        cutoff = (now - timedelta(hours=hours)).isoformat()
-        breakdown[label] = sum(1 for o in cancelled if (o.get("created_at") or "") >= cutoff)
-    breakdown["total"] = len(cancelled)
-    cancelled.sort(key=lambda o: o.get("created_at", ""), reverse=True)
+    cancelled = r.json() if isinstance(r.json(), list) else []
     return {
-        "cancelled": cancelled[:30],
-        "total": len(cancelled),
-        "total_lost": round(sum(o.get("price_ghs", 0) for o in cancelled), 2),
-        "breakdown": breakdown,
+        "cancelled": cancelled,
+        "total": summary.get("cancelled_orders", 0),
+        "total_lost": summary.get("cancelled_revenue", 0),
+        "breakdown": _window_breakdown(summary, "cancelled", summary.get("cancelled_orders", 0)),
     }
 
-
 # --- Public Booking page route ---
 @app.get("/book")
 def booking_page():
@@ -1030,7 +1085,7 @@ BOOKING_SERVICE_URL = os.environ.get("BOOKING_SERVICE_URL", "http://localhost:81
 def api_book(payload: dict):
     """Proxy booking request to booking-service. Public endpoint — no auth required."""
     try:
-        with httpx.Client(timeout=15.0) as client:
+        with sync_http_client(timeout=15.0) as client:
             r = client.post(f"{BOOKING_SERVICE_URL}/book", json=payload)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Booking service unavailable: {e}")
@@ -1053,7 +1108,7 @@ def admin_rider_detail(rider_id: str, request: Request):
     ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
     detail = {"id": rider_id}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             # Get user info
             r = client.get(f"{AUTH_SERVICE_URL}/users", headers=headers)
             if r.status_code == 200:
@@ -1081,17 +1136,16 @@ def admin_rider_detail(rider_id: str, request: Request):
                 detail["status"] = "offline"
             # Get rider orders
             try:
-                r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+                summary = _get_order_analytics(client, headers, params={"rider_id": rider_id})
+                detail["total_orders"] = summary.get("total_orders", 0)
+                detail["completed_orders"] = summary.get("delivered_orders", 0)
+                detail["active_orders"] = _status_count(summary, "ASSIGNED", "IN_TRANSIT")
+                detail["total_revenue"] = summary.get("total_revenue", 0)
+                # Recent orders (last 5)
+                r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers,
+                               params={"rider_id": rider_id, "limit": 5})
                 if r.status_code == 200:
-                    orders = r.json() if isinstance(r.json(), list) else []
-                    rider_orders = [o for o in orders if o.get("assigned_rider_id") == rider_id]
-                    detail["total_orders"] = len(rider_orders)
-                    detail["completed_orders"] = sum(1 for o in rider_orders if o.get("status") == "DELIVERED")
-                    detail["active_orders"] = sum(1 for o in rider_orders if o.get("status") in ("ASSIGNED", "IN_TRANSIT"))
-                    detail["total_revenue"] = round(sum(o.get("price_ghs", 0) for o in rider_orders if o.get("status") == "DELIVERED"), 2)
-                    # Recent orders (last 5)
-                    rider_orders.sort(key=lambda o: o.get("created_at", ""), reverse=True)
-                    detail["recent_orders"] = rider_orders[:5]
+                    detail["recent_orders"] = r.json() if isinstance(r.json(), list) else []
             except Exception:
                 detail["total_orders"] = 0
                 detail["completed_orders"] = 0
@@ -1128,7 +1182,7 @@ def api_merchants_pending(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{AUTH_SERVICE_URL}/merchants/pending", headers=headers)
             if r.status_code == 200:
                 return r.json()
@@ -1145,7 +1199,7 @@ def api_companies_pending(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{AUTH_SERVICE_URL}/companies/pending", headers=headers)
             if r.status_code == 200:
                 return r.json()
@@ -1176,7 +1230,7 @@ async def api_merchant_edit(mid: str, payload: dict, request: Request):
         raise HTTPException(status_code=400, detail="No valid fields to update")
     # Example: forward to AUTH_SERVICE_URL/merchants/{mid}/edit
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/merchants/{mid}/edit", json=update)
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
@@ -1274,7 +1328,7 @@ def admin_enroll_company(payload: dict, request: Request):
         "contact_person": contact_person,
     }
     try:
-        with httpx.Client(timeout=15.0) as client:
+        with sync_http_client(timeout=15.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/register", json=reg_payload)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Auth service error: {e}")
@@ -1324,7 +1378,7 @@ def admin_enroll_merchant(payload: dict, request: Request):
         "momo_number": phone,
     }
     try:
-        with httpx.Client(timeout=15.0) as client:
+        with sync_http_client(timeout=15.0) as client:
             r = client.post(f"{AUTH_SERVICE_URL}/register", json=reg_payload)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Auth service error: {e}")
@@ -1396,7 +1450,7 @@ def company_dashboard_v2(request: Request):
               "completed_orders": 0, "total_revenue": 0, "balance": 0,
               "riders": [], "orders": []}
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             # Get current user info (company_admin)
             try:
                 r = client.get(f"{AUTH_SERVICE_URL}/me", headers=headers)
@@ -1435,15 +1489,14 @@ def company_dashboard_v2(request: Request):
                     pass
             # Get orders
             try:
-                r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+                summary = _get_order_analytics(client, headers)
+                result["total_orders"] = summary.get("total_orders", 0)
+                result["active_orders"] = _status_count(summary, "ASSIGNED", "IN_TRANSIT")
+                result["completed_orders"] = summary.get("delivered_orders", 0)
+                result["total_revenue"] = summary.get("total_revenue", 0)
+                r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers, params={"limit": 20})
                 if r.status_code == 200:
-                    orders = r.json() if isinstance(r.json(), list) else []
-                    result["total_orders"] = len(orders)
-                    result["active_orders"] = sum(1 for o in orders if o.get("status") in ("ASSIGNED", "IN_TRANSIT"))
-                    result["completed_orders"] = sum(1 for o in orders if o.get("status") == "DELIVERED")
-                    result["total_revenue"] = round(sum(o.get("price_ghs", 0) for o in orders if o.get("status") == "DELIVERED"), 2)
-                    orders.sort(key=lambda o: o.get("created_at", ""), reverse=True)
-                    result["orders"] = orders[:20]
+                    result["orders"] = r.json() if isinstance(r.json(), list) else []
             except Exception:
                 pass
     except Exception as e:
@@ -1473,7 +1526,7 @@ async def merchant_dashboard(request: Request):
         "orders": [],
     }
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             # Get user profile from auth service
             me = client.get(f"{AUTH_SERVICE_URL}/me", headers=headers)
             if me.status_code == 200:
@@ -1482,18 +1535,18 @@ async def merchant_dashboard(request: Request):
                 result["store_name"] = u.get("store_name", "")
                 result["store_address"] = u.get("store_address", "")
 
-            # Get merchant orders from order service
-            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+            # Get merchant order counts and the most recent orders
+            summary = _get_order_analytics(client, headers)
+            result["total_orders"] = summary.get("total_orders", 0)
+            result["pending"] = _status_count(summary, "PENDING")
+            result["assigned"] = _status_count(summary, "ASSIGNED")
+            result["in_transit"] = _status_count(summary, "IN_TRANSIT", "PICKED_UP")
+            result["delivered"] = _status_count(summary, "DELIVERED")
+            result["cancelled"] = _status_count(summary, "CANCELLED")
+            r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers,
+                           params={"limit": MERCHANT_RECENT_ORDERS})
             if r.status_code == 200:
-                orders = r.json() if isinstance(r.json(), list) else []
-                result["total_orders"] = len(orders)
-                result["pending"] = sum(1 for o in orders if o.get("status") == "PENDING")
-                result["assigned"] = sum(1 for o in orders if o.get("status") == "ASSIGNED")
-                result["in_transit"] = sum(1 for o in orders if o.get("status") in ("IN_TRANSIT", "PICKED_UP"))
-                result["delivered"] = sum(1 for o in orders if o.get("status") == "DELIVERED")
-                result["cancelled"] = sum(1 for o in orders if o.get("status") == "CANCELLED")
-                orders.sort(key=lambda o: o.get("created_at", ""), reverse=True)
-                result["orders"] = orders
+                result["orders"] = r.json() if isinstance(r.json(), list) else []
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
     return result
@@ -1517,7 +1570,7 @@ async def merchant_create_order(payload: dict, request: Request):
         "payment_method": "momo",
     }
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             pr = client.post(f"{PAYMENT_SERVICE_URL_LOCAL}/payments/initiate", headers=headers, json=pay_payload)
             if pr.status_code in (200, 201):
                 payment_id = pr.json().get("id") or pr.json().get("payment_id", "manual")
@@ -1554,10 +1607,12 @@ async def merchant_list_orders(request: Request):
     headers = {"Authorization": f"Bearer {token}"}
     ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8500")
     try:
-        with httpx.Client(timeout=10.0) as client:
+        with sync_http_client(timeout=10.0) as client:
             r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers,
                            params=dict(request.query_params))
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
-    return Response(content=r.content, status_code=r.status_code,
+    # Pass the pagination cursor through to the browser
+    extra = {"X-Next-Cursor": r.headers["X-Next-Cursor"]} if "X-Next-Cursor" in r.headers else None
+    return Response(content=r.content, status_code=r.status_code, headers=extra,
                     media_type=r.headers.get("content-type", "application/json"))
\ No newline at end of file
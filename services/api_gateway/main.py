@@ -1,9 +1,10 @@
 import os
 from fastapi import FastAPI, Request, Depends
-import httpx
 from shared.tenant import TenantMiddleware
+from shared.http import http_client, setup_http_clients
 
 app = FastAPI(title="API Gateway")
+setup_http_clients(app)
 
 BOOKING_URL = os.environ.get("BOOKING_SERVICE_URL", "http://localhost:8100")
 
@@ -35,6 +36,6 @@ async def health():
 @app.post("/book")
 async def book(request: Request):
     payload = await request.json()
-    async with httpx.AsyncClient() as client:
+    async with http_client() as client:
         r = await client.post(f"{BOOKING_URL}/book", json=payload)
         return r.json()
@@ -9,31 +9,35 @@ import sys
 from pathlib import Path
 from fastapi import FastAPI, HTTPException, status, Depends, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timedelta
 import logging
 import asyncio
-import httpx
 
 # Add parent directories to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine, Base
+from shared.database import get_db, get_async_db, engine, Base, SessionLocal
 from shared.models import Order, OrderStatus, Rider, RiderCompany
 from shared.auth import get_current_user, TokenPayload
 from shared.security import setup_security_middleware
+from shared.http import http_client, setup_http_clients
 from shared.assignment import (
     AssignmentEngine, AssignmentStrategy, RiderRecommender,
-    haversine_distance
+    BatchAssignmentSolver, haversine_distance
 )
+from shared.rider_stats import rebuild_rider_stats
+from shared.deadline_scheduler import DeadlineScheduler
 
 # Create tables on startup
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Automatic Rider Assignment Service")
 setup_security_middleware(app)
+setup_http_clients(app)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -41,6 +45,7 @@ logger = logging.getLogger(__name__)
 # Initialize assignment engine
 assignment_engine = AssignmentEngine(strategy=AssignmentStrategy.HYBRID)
 recommender = RiderRecommender(assignment_engine)
+batch_solver = BatchAssignmentSolver(assignment_engine)
 
 # Service URLs
 TRACKING_SERVICE_URL      = os.environ.get("TRACKING_SERVICE_URL",      "http://localhost:8300")
@@ -49,80 +54,157 @@ NOTIFICATION_SERVICE_URL  = os.environ.get("NOTIFICATION_SERVICE_URL",  "http://
 ACCEPTANCE_TIMEOUT_SECS   = 90   # seconds before we cascade to next rider
 MAX_ASSIGNMENT_ATTEMPTS   = 3    # after this, order returns to PENDING
 
-# ==================== Background: Acceptance Timeout Watcher ====================
+DEADLINE_RESYNC_SECS      = 60   # reconcile the deadline queue with the orders table
 
-async def acceptance_timeout_watcher():
+# ==================== Background: Acceptance Timeout Scheduler ====================
+
+def _claim_expired_order(db: Session, order: Order) -> bool:
+    """
+    Claim an expired order by clearing the deadline we read.
+
+    The UPDATE only matches while the order is still awaiting acceptance with
+    that same deadline, so when several replicas race exactly one sees a row.
+    """
+    claimed = db.query(Order).filter(
+        Order.id == order.id,
+        Order.status == OrderStatus.AWAITING_ACCEPTANCE,
+        Order.acceptance_deadline == order.acceptance_deadline
+    ).update({"acceptance_deadline": None}, synchronize_session=False)
+    return claimed == 1
+
+
+def _expire_acceptances(order_ids: List[str]) -> List[tuple]:
     """
-    Runs every 10 seconds.
-    Finds AWAITING_ACCEPTANCE orders whose deadline has passed and either:
+    Handle a batch of expired AWAITING_ACCEPTANCE orders in one transaction.
+    For each order whose deadline has really passed, either:
       - Cascades to the next best rider (up to MAX_ASSIGNMENT_ATTEMPTS), or
       - Resets to PENDING and logs if all attempts exhausted.
     Increments rider.miss_count for the rider who ignored the request.
+
+    Safe to run concurrently on several replicas: rows are selected with
+    FOR UPDATE SKIP LOCKED so replicas split the batch, and each order is
+    claimed with a compare-and-set on its deadline so an expiry is handled
+    exactly once even on databases without row locks.
+
+    Returns:
+        (order_id, new_deadline) for orders re-sent to another rider
     """
-    from shared.database import SessionLocal
-    while True:
-        await asyncio.sleep(10)
-        try:
-            db = SessionLocal()
-            now = datetime.utcnow()
-            expired = db.query(Order).filter(
-                Order.status == OrderStatus.AWAITING_ACCEPTANCE,
-                Order.acceptance_deadline <= now
-            ).all()
-
-            for order in expired:
-                ignoring_rider_id = order.assigned_rider_id
-
-                # Penalise the rider who ignored
-                if ignoring_rider_id:
-                    db.query(Rider).filter(Rider.id == ignoring_rider_id).update(
-                        {"miss_count": Rider.miss_count + 1}
-                    )
-                    logger.info(f"Rider {ignoring_rider_id[:8]} missed order {order.id[:8]} — miss_count +1")
-
-                if (order.assignment_attempts or 0) < MAX_ASSIGNMENT_ATTEMPTS:
-                    # Reset to PENDING briefly so find_best_rider can re-score
-                    # (exclude the ignoring rider by temporarily tagging)
-                    order.status               = OrderStatus.PENDING
-                    order.assigned_rider_id    = None
-                    order.acceptance_deadline  = None
-                    db.commit()
-
-                    # Try again — exclude the rider who ignored
-                    result = assignment_engine.find_best_rider(
-                        order.pickup_lat, order.pickup_lng, db,
-                        company_id=order.company_id,
-                        exclude_rider_id=ignoring_rider_id
-                    )
-                    if result:
-                        rider, score = result
-                        order.assigned_rider_id  = rider.id
-                        order.status             = OrderStatus.AWAITING_ACCEPTANCE
-                        order.acceptance_deadline = datetime.utcnow() + timedelta(seconds=ACCEPTANCE_TIMEOUT_SECS)
-                        order.assignment_attempts = (order.assignment_attempts or 0) + 1
-                        db.commit()
-                        logger.info(f"Order {order.id[:8]} re-sent to rider {rider.id[:8]} (attempt {order.assignment_attempts})")
-                    else:
-                        order.status              = OrderStatus.PENDING
-                        order.assignment_attempts = (order.assignment_attempts or 0) + 1
-                        db.commit()
-                        logger.warning(f"Order {order.id[:8]} — no riders available on attempt {order.assignment_attempts}")
+    db = SessionLocal()
+    rescheduled = []
+    try:
+        now = datetime.utcnow()
+        expired = db.query(Order).filter(
+            Order.id.in_(order_ids),
+            Order.status == OrderStatus.AWAITING_ACCEPTANCE,
+            Order.acceptance_deadline <= now
+        ).with_for_update(skip_locked=True).all()
+
+        for order in expired:
+            if not _claim_expired_order(db, order):
+                logger.debug(f"Order {order.id[:8]} expiry already handled by another replica")
+                continue
+            ignoring_rider_id = order.assigned_rider_id
+
+            # Penalise the rider who ignored
+            if ignoring_rider_id:
+                db.query(Rider).filter(Rider.id == ignoring_rider_id).update(
+                    {"miss_count": Rider.miss_count + 1}
+                )
+                logger.info(f"Rider {ignoring_rider_id[:8]} missed order {order.id[:8]} — miss_count +1")
+
+            if (order.assignment_attempts or 0) < MAX_ASSIGNMENT_ATTEMPTS:
+                # Reset to PENDING so find_best_rider re-scores against the freed load
+                order.status               = OrderStatus.PENDING
+                order.assigned_rider_id    = None
+                order.acceptance_deadline  = None
+                db.flush()
+
+                # Try again — exclude the rider who ignored
+                result = assignment_engine.find_best_rider(
+                    order.pickup_lat, order.pickup_lng, db,
+                    company_id=order.company_id,
+                    exclude_rider_id=ignoring_rider_id
+                )
+                if result:
+                    rider, score = result
+                    order.assigned_rider_id  = rider.id
+                    order.status             = OrderStatus.AWAITING_ACCEPTANCE
+                    order.acceptance_deadline = datetime.utcnow() + timedelta(seconds=ACCEPTANCE_TIMEOUT_SECS)
+                    order.assignment_attempts = (order.assignment_attempts or 0) + 1
+                    db.flush()
+                    rescheduled.append((order.id, order.acceptance_deadline))
+                    logger.info(f"Order {order.id[:8]} re-sent to rider {rider.id[:8]} (attempt {order.assignment_attempts})")
                 else:
-                    # All attempts exhausted — return to PENDING for admin/re-queue
                     order.status              = OrderStatus.PENDING
-                    order.assigned_rider_id   = None
-                    order.acceptance_deadline = None
-                    db.commit()
-                    logger.warning(f"Order {order.id[:8]} returned to PENDING — exhausted {MAX_ASSIGNMENT_ATTEMPTS} attempts")
+                    order.assignment_attempts = (order.assignment_attempts or 0) + 1
+                    db.flush()
+                    logger.warning(f"Order {order.id[:8]} — no riders available on attempt {order.assignment_attempts}")
+            else:
+                # All attempts exhausted — return to PENDING for admin/re-queue
+                order.status              = OrderStatus.PENDING
+                order.assigned_rider_id   = None
+                order.acceptance_deadline = None
+                db.flush()
+                logger.warning(f"Order {order.id[:8]} returned to PENDING — exhausted {MAX_ASSIGNMENT_ATTEMPTS} attempts")
+
+        db.commit()
+        return rescheduled
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
 
-            db.close()
+async def expire_acceptances(order_ids: List[str]):
+    """Scheduler handler: expire the batch off the event loop, then queue any new deadlines."""
+    rescheduled = await asyncio.to_thread(_expire_acceptances, order_ids)
+    for order_id, deadline in rescheduled:
+        acceptance_scheduler.schedule(order_id, deadline)
+
+
+# Fires exactly at each order's acceptance_deadline (replaces the 10s polling loop)
+acceptance_scheduler = DeadlineScheduler(expire_acceptances, name="acceptance-timeouts")
+
+
+def _load_acceptance_deadlines() -> dict:
+    """order_id -> acceptance_deadline for every AWAITING_ACCEPTANCE order."""
+    db = SessionLocal()
+    try:
+        return dict(db.query(Order.id, Order.acceptance_deadline).filter(
+            Order.status == OrderStatus.AWAITING_ACCEPTANCE,
+            Order.acceptance_deadline.isnot(None)
+        ).all())
+    finally:
+        db.close()
+
+
+async def acceptance_deadline_resync():
+    """
+    Load the deadline queue from the database on startup, then reconcile it
+    every DEADLINE_RESYNC_SECS so orders sent by other replicas or missed
+    after a handler error are still expired.
+    """
+    while True:
+        try:
+            deadlines = await asyncio.to_thread(_load_acceptance_deadlines)
+            for order_id, deadline in deadlines.items():
+                acceptance_scheduler.schedule(order_id, deadline)
         except Exception as e:
-            logger.error(f"Acceptance watcher error: {e}")
+            logger.error(f"Acceptance deadline resync error: {e}")
+        await asyncio.sleep(DEADLINE_RESYNC_SECS)
+
+
+def schedule_acceptance_deadline(order: Order):
+    """Queue an order that was just sent to a rider."""
+    if order.status == OrderStatus.AWAITING_ACCEPTANCE and order.acceptance_deadline:
+        acceptance_scheduler.schedule(order.id, order.acceptance_deadline)
 
 
 @app.on_event("startup")
 async def start_background_tasks():
-    asyncio.create_task(acceptance_timeout_watcher())
+    asyncio.create_task(acceptance_deadline_resync())
+    asyncio.create_task(acceptance_scheduler.run())
 
 # ==================== Pydantic Models ====================
 
@@ -201,8 +283,9 @@ async def auto_assign_order(
                 message=f"Order status is {order.status.value}, cannot auto-assign"
             )
         
-        # Perform assignment
-        success, message, details = assignment_engine.assign_order(
+        # Perform assignment (sync engine work runs off the event loop)
+        success, message, details = await asyncio.to_thread(
+            assignment_engine.assign_order,
             order_id=request.order_id,
             order_lat=request.order_lat,
             order_lng=request.order_lng,
@@ -212,14 +295,20 @@ async def auto_assign_order(
         )
         
         if success and details:
+            schedule_acceptance_deadline(order)
+            
             # Start tracking
             try:
-                async with httpx.AsyncClient() as client:
+                async with http_client() as client:
                     await client.post(
                         f"{TRACKING_SERVICE_URL}/tracking/start",
                         json={
                             "order_id": request.order_id,
-                            "rider_id": details["rider_id"]
+                            "rider_id": details["rider_id"],
+                            "pickup_lat": order.pickup_lat,
+                            "pickup_lng": order.pickup_lng,
+                            "dropoff_lat": order.dropoff_lat,
+                            "dropoff_lng": order.dropoff_lng
                         },
                         timeout=5.0
                     )
@@ -228,7 +317,7 @@ async def auto_assign_order(
             
             # Send notification
             try:
-                async with httpx.AsyncClient() as client:
+                async with http_client() as client:
                     merchant = order.merchant
                     if merchant and merchant.phone:
                         await client.post(
@@ -301,7 +390,8 @@ async def get_rider_recommendations(
             strat = AssignmentStrategy.HYBRID
         
         # Get recommendations
-        recommendations = recommender.get_recommendations(
+        recommendations = await asyncio.to_thread(
+            recommender.get_recommendations,
             order_lat=order.pickup_lat,
             order_lng=order.pickup_lng,
             db=db,
@@ -359,34 +449,38 @@ async def check_rider_availability(
             detail="Rider not found"
         )
     
-    is_available = assignment_engine.availability_checker.is_available(rider, db)
-    
-    # Get rider stats
-    from shared.models import RiderReview, Order
-    
-    avg_rating = db.query(func.avg(RiderReview.rating)).filter(
-        RiderReview.rider_id == rider_id
-    ).scalar() or 0
-    
-    active_orders = db.query(Order).filter(
-        Order.assigned_rider_id == rider_id,
-        Order.status.in_(['assigned', 'picked_up', 'in_transit'])
-    ).count()
-    
-    from sqlalchemy import func
-    avg_delivery_time = db.query(func.avg(Order.eta_min)).filter(
-        Order.assigned_rider_id == rider_id
-    ).scalar()
+    # One rider_stats lookup feeds both the availability check and the response
+    features = assignment_engine.feature_loader.load(db, [rider_id])[rider_id]
+    is_available = assignment_engine.availability_checker.is_available(rider, db, features=features)
     
     return {
         "rider_id": rider_id,
         "rider_name": rider.user.username if rider.user else "Unknown",
         "available": is_available,
-        "rating": round(avg_rating, 1),
-        "active_orders": active_orders,
-        "avg_delivery_time_min": avg_delivery_time
+        "rating": round(features.avg_rating or 0, 1),
+        "active_orders": features.active_orders,
+        "avg_delivery_time_min": features.avg_delivery_time
     }
 
+# ==================== Rider Stats Maintenance ====================
+
+@app.post("/admin/rider-stats/rebuild")
+async def rebuild_stats(
+    rider_id: Optional[str] = Query(None),
+    current_user: TokenPayload = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute rider_stats from reviews and orders (admin only)."""
+    
+    if current_user.role != "superadmin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin only"
+        )
+    
+    rebuilt = rebuild_rider_stats(db, [rider_id] if rider_id else None)
+    return {"ok": True, "riders_rebuilt": rebuilt}
+
 # ==================== Bulk Auto-Assignment ====================
 
 @app.post("/orders/batch-auto-assign")
@@ -399,7 +493,10 @@ async def batch_auto_assign(
     """
     Automatically assign multiple orders in bulk.
     
-    Useful for batch processing pending orders.
+    Useful for batch processing pending orders. All pending orders are
+    matched to riders in one optimal pass (Hungarian / min-cost matching);
+    the "optimization" block reports solve time and total cost against the
+    greedy one-order-at-a-time result.
     """
     
     if len(order_ids) > 100:
@@ -413,42 +510,60 @@ async def batch_auto_assign(
     except ValueError:
         strat = AssignmentStrategy.HYBRID
     
-    results = []
+    results_by_id = {}
     
+    # Load every order in one query; only PENDING ones go to the solver
+    orders_by_id = {
+        o.id: o for o in db.query(Order).filter(Order.id.in_(order_ids)).all()
+    }
+    pending = []
     for order_id in order_ids:
-        try:
-            order = db.query(Order).filter(Order.id == order_id).first()
-            if not order or order.status != OrderStatus.PENDING:
-                results.append({
-                    "order_id": order_id,
-                    "success": False,
-                    "message": "Order not found or not pending"
-                })
-                continue
-            
-            success, message, details = assignment_engine.assign_order(
-                order_id=order_id,
-                order_lat=order.pickup_lat,
-                order_lng=order.pickup_lng,
-                db=db,
-                company_id=order.company_id,
-                strategy=strat
-            )
-            
-            results.append({
-                "order_id": order_id,
-                "success": success,
-                "message": message,
-                "rider_id": details.get("rider_id") if details else None
-            })
-        
-        except Exception as e:
-            logger.error(f"Failed to assign {order_id}: {str(e)}")
-            results.append({
+        order = orders_by_id.get(order_id)
+        if not order or order.status != OrderStatus.PENDING:
+            results_by_id[order_id] = {
                 "order_id": order_id,
                 "success": False,
+                "message": "Order not found or not pending"
+            }
+        elif order_id not in results_by_id:
+            results_by_id[order_id] = None
+            pending.append(order)
+    
+    # Solve the whole batch as one min-cost matching instead of greedy per-order picks
+    report = None
+    try:
+        solved = batch_solver.assign_batch(pending, db, strategy=strat)
+        report = solved["report"]
+        for order in pending:
+            match = solved["assignments"].get(order.id)
+            if match:
+                rider, score = match
+                schedule_acceptance_deadline(order)
+                results_by_id[order.id] = {
+                    "order_id": order.id,
+                    "success": True,
+                    "message": "Order sent to rider — awaiting acceptance (90s)",
+                    "rider_id": rider.id,
+                    "distance_km": score.distance_km,
+                    "score": score.score
+                }
+            else:
+                results_by_id[order.id] = {
+                    "order_id": order.id,
+                    "success": False,
+                    "message": "No available riders found",
+                    "rider_id": None
+                }
+    except Exception as e:
+        logger.error(f"Batch assignment failed: {str(e)}")
+        for order in pending:
+            results_by_id[order.id] = {
+                "order_id": order.id,
+                "success": False,
                 "message": str(e)
-            })
+            }
+    
+    results = list(results_by_id.values())
     
     # Summary
     successful = sum(1 for r in results if r["success"])
@@ -457,26 +572,42 @@ async def batch_auto_assign(
         "total": len(results),
         "successful": successful,
         "failed": len(results) - successful,
-        "results": results
+        "results": results,
+        "optimization": report
     }
 
+# ==================== Acceptance Timeout Metrics ====================
+
+@app.get("/stats/acceptance-timeouts")
+async def get_acceptance_timeout_stats(
+    current_user: TokenPayload = Depends(get_current_user)
+):
+    """Deadline queue depth and how late expiries fire (lag) in this replica."""
+    return acceptance_scheduler.metrics()
+
 # ==================== Assignment Statistics ====================
 
 @app.get("/stats/assignment")
 async def get_assignment_stats(
     current_user: TokenPayload = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get assignment statistics."""
-    from sqlalchemy import func
+    from sqlalchemy import func, select
     
     # Orders assigned vs pending
-    total_pending = db.query(Order).filter(Order.status == OrderStatus.PENDING).count()
-    total_assigned = db.query(Order).filter(Order.status == OrderStatus.ASSIGNED).count()
+    total_pending, total_assigned = (await db.execute(
+        select(
+            func.count(Order.id).filter(Order.status == OrderStatus.PENDING),
+            func.count(Order.id).filter(Order.status == OrderStatus.ASSIGNED)
+        )
+    )).one()
     
     # Riders online
     from shared.models import Rider, RiderStatus
-    active_riders = db.query(Rider).filter(Rider.status == RiderStatus.ONLINE).count()
+    active_riders = (await db.execute(
+        select(func.count(Rider.id)).where(Rider.status == RiderStatus.ONLINE)
+    )).scalar_one()
     
     return {
         "pending_orders": total_pending,
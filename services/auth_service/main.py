@@ -8,6 +8,8 @@ import sys
 from pathlib import Path
 from fastapi import FastAPI, HTTPException, status, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel, EmailStr, validator
 from typing import Optional
 import logging
@@ -16,7 +18,7 @@ import logging
 sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine, Base
+from shared.database import get_db, get_async_db, engine, Base
 from shared.models import User, Merchant, RiderCompany, Rider, UserRole, Message
 from shared.auth import (
     hash_password, verify_password, create_access_token, 
@@ -279,10 +281,10 @@ async def login(request: LoginRequest, db: Session = Depends(get_db), req: Reque
 @app.get("/me")
 async def get_current_user_info(
     current_user: TokenPayload = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user information."""
-    user = db.query(User).filter(User.id == current_user.user_id).first()
+    user = await db.get(User, current_user.user_id)
     
     if not user:
         raise HTTPException(
@@ -302,7 +304,9 @@ async def get_current_user_info(
 
     # Include merchant profile fields if user is a merchant
     if user.role == "merchant":
-        merchant = db.query(Merchant).filter(Merchant.user_id == user.id).first()
+        merchant = (await db.execute(
+            select(Merchant).where(Merchant.user_id == user.id)
+        )).scalars().first()
         if merchant:
             result["store_name"] = merchant.store_name
             result["store_address"] = merchant.store_address
@@ -572,14 +576,16 @@ async def auth_logout(current_user: TokenPayload = Depends(get_current_user)):
 @app.get("/auth/me")
 async def auth_me(
     current_user: TokenPayload = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current rider info (rider app)."""
-    user = db.query(User).filter(User.id == current_user.user_id).first()
+    user = await db.get(User, current_user.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    rider = db.query(Rider).filter(Rider.user_id == user.id).first()
+    rider = (await db.execute(
+        select(Rider).where(Rider.user_id == user.id)
+    )).scalars().first()
     rider_data = None
     if rider:
         rider_data = {
@@ -3,9 +3,10 @@ import time
 from typing import Optional
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import httpx
+from shared.http import http_client, setup_http_clients
 
 app = FastAPI(title="Booking Service")
+setup_http_clients(app)
 
 GOOGLE_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
 PAYMENT_SERVICE_URL = os.environ.get("PAYMENT_SERVICE_URL")
@@ -44,7 +45,7 @@ async def google_distance_eta(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
         "mode": "driving",
         "departure_time": "now",
     }
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    async with http_client(timeout=10.0) as client:
         r = await client.get(url, params=params)
         r.raise_for_status()
         data = r.json()
@@ -102,7 +103,7 @@ async def book(req: BookingRequest):
             },
         }
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_client(timeout=10.0) as client:
                 r = await client.post(f"{PAYMENT_SERVICE_URL}/payments/initiate", json=payload)
                 r.raise_for_status()
                 payment_payload = r.json()
@@ -136,7 +137,7 @@ async def notify_event(phone: str, event: str, order_id: Optional[str] = None):
         return {"ok": False, "reason": "no_notification_service"}
     payload = {"phone": phone, "event": event, "order_id": order_id}
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with http_client(timeout=5.0) as client:
             r = await client.post(f"{NOTIFICATION_SERVICE_URL}/notify/event", json=payload)
             r.raise_for_status()
             return r.json()
@@ -3,8 +3,10 @@ from typing import Optional, List, Dict
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 import httpx
+from shared.http import http_client, setup_http_clients
 
 app = FastAPI(title="Notification Service - Hubtel SMS")
+setup_http_clients(app)
 
 @app.get("/health")
 def health():
@@ -52,7 +54,7 @@ async def send_sms(req: SmsRequest):
         "Content": req.message,
     }
 
-    async with httpx.AsyncClient(auth=(HUBTEL_CLIENT_ID, HUBTEL_CLIENT_SECRET), timeout=10.0) as client:
+    async with http_client(auth=(HUBTEL_CLIENT_ID, HUBTEL_CLIENT_SECRET), timeout=10.0) as client:
         try:
             r = await client.post(HUBTEL_SMS_API, json=payload)
             r.raise_for_status()
@@ -69,7 +71,9 @@ async def notify_event(req: EventNotifyRequest):
     msg_map = {
         "order_placed": lambda o: f"Your order {o} has been placed. We'll notify you when a rider is assigned.",
         "rider_assigned": lambda o: f"A rider has been assigned to your order {o}. You will receive tracking link shortly.",
+        "arrived_at_pickup": lambda o: f"Your rider has arrived at the pickup for order {o}.",
         "pickup_confirmed": lambda o: f"Pickup confirmed for order {o}.",
+        "arrived_at_dropoff": lambda o: f"Your rider has arrived with order {o}.",
         "delivery_completed": lambda o: f"Delivery completed for order {o}. Thank you!",
         "tracking_link": lambda o: f"Track your order {o}: <link>",
     }
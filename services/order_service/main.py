@@ -7,35 +7,39 @@ PENDING → ASSIGNED → PICKED_UP → IN_TRANSIT → DELIVERED
                   ↘ CANCELLED (at any point before DELIVERED)
 """
 
+import base64
 import os
 import sys
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import FastAPI, HTTPException, status, Depends, Query, Response
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select, func, case, false, tuple_
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
-import httpx
 
 # Add parent directories to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine, Base
+from shared.database import get_db, get_async_db, get_async_engine, engine, Base
 from shared.models import (
     Order, OrderTracking, OrderStatus, User, Rider, RiderCompany,
     Payment, PaymentStatus
 )
 from shared.auth import get_current_user, TokenPayload, require_role
+import shared.rider_stats  # noqa: F401 — keeps rider_stats in step with order status changes
 from shared.security import setup_security_middleware, check_rate_limit, public_limiter, api_limiter, get_client_ip
+from shared.http import http_client, setup_http_clients
 
 # Create tables on startup
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Order & Assignment Service")
 setup_security_middleware(app)
+setup_http_clients(app)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -69,6 +73,12 @@ class UpdateOrderStatusRequest(BaseModel):
     status: str  # PICKED_UP, IN_TRANSIT, DELIVERED, CANCELLED
     notes: Optional[str] = None
 
+class OrderEventRequest(BaseModel):
+    event: str  # ARRIVED_AT_PICKUP, ARRIVED_AT_DROPOFF (tracking_service geofences)
+    at: Optional[int] = None  # epoch seconds of the fix that fired it
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+
 class OrderResponse(BaseModel):
     id: str
     status: str
@@ -174,7 +184,7 @@ async def create_order(
         auto_assign_success = False
         assigned_rider_id = None
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client() as client:
                 assignment_response = await client.post(
                     f"{TRACKING_SERVICE_URL.replace('8300', '8100')}/orders/auto-assign",
                     json={
@@ -201,7 +211,7 @@ async def create_order(
         
         # Send notification: Order placed
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client() as client:
                 user = db.query(User).filter(User.id == current_user.user_id).first()
                 if user:
                     await client.post(
@@ -297,12 +307,16 @@ async def assign_order(
         # Start tracking session
         tracking_link = None
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client() as client:
                 response = await client.post(
                     f"{TRACKING_SERVICE_URL}/tracking/start",
                     json={
                         "order_id": order_id,
-                        "rider_id": request.rider_id
+                        "rider_id": request.rider_id,
+                        "pickup_lat": order.pickup_lat,
+                        "pickup_lng": order.pickup_lng,
+                        "dropoff_lat": order.dropoff_lat,
+                        "dropoff_lng": order.dropoff_lng
                     },
                     timeout=5.0
                 )
@@ -323,7 +337,7 @@ async def assign_order(
         
         # Send notification: Rider assigned with tracking link
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client() as client:
                 merchant = db.query(User).filter(User.id == order.merchant_id).first()
                 if merchant and tracking_link:
                     await client.post(
@@ -368,13 +382,13 @@ async def assign_order(
 async def accept_order(
     order_id: str,
     current_user: TokenPayload = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Rider accepts an order that is AWAITING_ACCEPTANCE.
     Only the assigned rider can accept. Transitions to ASSIGNED.
     """
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
@@ -385,7 +399,9 @@ async def accept_order(
         )
 
     # Verify the accepting user is the assigned rider
-    rider = db.query(Rider).filter(Rider.user_id == current_user.user_id).first()
+    rider = (await db.execute(
+        select(Rider).where(Rider.user_id == current_user.user_id)
+    )).scalars().first()
     if not rider or order.assigned_rider_id != rider.id:
         raise HTTPException(
             status_code=403,
@@ -402,8 +418,7 @@ async def accept_order(
 
     order.status = OrderStatus.ASSIGNED
     order.acceptance_deadline = None
-    db.commit()
-    db.refresh(order)
+    await db.commit()
 
     return {
         "order_id": order.id,
@@ -476,7 +491,7 @@ async def update_order_status(
         
         # Send notification
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client() as client:
                 merchant = db.query(User).filter(User.id == order.merchant_id).first()
                 if merchant:
                     await client.post(
@@ -514,16 +529,114 @@ async def update_order_status(
             detail="Failed to update order status"
         )
 
+# ==================== Arrival Events ====================
+
+# Geofence event -> Order column holding its timestamp
+ORDER_EVENT_COLUMNS = {
+    "ARRIVED_AT_PICKUP": "arrived_pickup_at",
+    "ARRIVED_AT_DROPOFF": "arrived_dropoff_at",
+}
+
+# Allowed clock skew for arrival times reported by riders' devices
+ORDER_EVENT_MAX_FUTURE_SECONDS = 300
+
+@app.post("/orders/{order_id}/events")
+async def record_order_event(
+    order_id: str,
+    request: OrderEventRequest,
+    current_user: TokenPayload = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Record a rider arrival detected by tracking_service's geofences.
+    
+    Arrivals don't change the order status; they timestamp the order (the
+    first report wins, so retries and other replicas are harmless) and
+    notify the merchant.
+    """
+    column = ORDER_EVENT_COLUMNS.get(request.event.upper())
+    if column is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid event. Allowed: {list(ORDER_EVENT_COLUMNS)}"
+        )
+    
+    # `at` is the rider device's fix timestamp; reject milliseconds and other nonsense
+    at = datetime.utcnow()
+    if request.at is not None:
+        max_at = int((at - datetime(1970, 1, 1)).total_seconds()) + ORDER_EVENT_MAX_FUTURE_SECONDS
+        if not 0 < request.at <= max_at:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid 'at': expected epoch seconds, not in the future"
+            )
+        at = datetime(1970, 1, 1) + timedelta(seconds=request.at)
+    
+    order = db.query(Order).filter(Order.id == order_id).first()
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
+    
+    # Same rule as status updates: only the assigned rider or admin
+    if current_user.role != "superadmin":
+        rider_rec = db.query(Rider).filter(Rider.user_id == current_user.user_id).first()
+        if not rider_rec or order.assigned_rider_id != rider_rec.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only the assigned rider or admin can report arrivals"
+            )
+    
+    recorded = getattr(order, column) is None
+    if recorded:
+        try:
+            setattr(order, column, at)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Arrival event failed: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to record arrival"
+            )
+        logger.info(f"Order {order_id}: {request.event.upper()} at {at.isoformat()}")
+        
+        try:
+            async with http_client() as client:
+                merchant = db.query(User).filter(User.id == order.merchant_id).first()
+                if merchant:
+                    await client.post(
+                        f"{NOTIFICATION_SERVICE_URL}/notify/event",
+                        json={
+                            "phone": merchant.phone,
+                            "event": request.event.lower(),
+                            "order_id": order_id
+                        },
+                        timeout=5.0
+                    )
+        except Exception as e:
+            logger.warning(f"Failed to send arrival notification: {str(e)}")
+    
+    return {
+        "order_id": order_id,
+        "event": request.event.upper(),
+        "recorded": recorded,
+        "at": getattr(order, column)
+    }
+
 # ==================== Get Order ====================
 
 @app.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: str,
     current_user: TokenPayload = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get order details."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = (await db.execute(
+        select(Order).options(selectinload(Order.tracking)).where(Order.id == order_id)
+    )).scalar_one_or_none()
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -547,61 +660,274 @@ async def get_order(
 
 # ==================== List Orders ====================
 
-@app.get("/orders")
-async def list_orders(
-    status: Optional[str] = None,
-    current_user: TokenPayload = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """List orders for current user (merchant, rider, or admin)."""
-    query = db.query(Order)
+async def _order_scope(db: AsyncSession, current_user: TokenPayload) -> Optional[list]:
+    """
+    WHERE conditions limiting orders to what the current user may see.
     
-    # Filter by user role
+    Returns:
+        List of conditions (empty for superadmin), or None if the user's
+        merchant/rider profile doesn't exist and they can see nothing
+    """
     if current_user.role == "merchant":
         # orders.merchant_id = merchants.id (FK), look up profile first
         from shared.models import Merchant as _Merchant
-        merchant_rec = db.query(_Merchant).filter(_Merchant.user_id == current_user.user_id).first()
-        if merchant_rec:
-            query = query.filter(Order.merchant_id == merchant_rec.id)
-        else:
-            return []
+        merchant_id = (await db.execute(
+            select(_Merchant.id).where(_Merchant.user_id == current_user.user_id)
+        )).scalars().first()
+        return [Order.merchant_id == merchant_id] if merchant_id else None
     elif current_user.role == "rider":
-        rider_rec = db.query(Rider).filter(Rider.user_id == current_user.user_id).first()
-        if rider_rec:
-            query = query.filter(Order.assigned_rider_id == rider_rec.id)
-        else:
-            return []
+        rider_id = (await db.execute(
+            select(Rider.id).where(Rider.user_id == current_user.user_id)
+        )).scalars().first()
+        return [Order.assigned_rider_id == rider_id] if rider_id else None
     elif current_user.role == "company_admin":
-        query = query.filter(Order.company_id == current_user.company_id)
+        return [Order.company_id == current_user.company_id]
     # superadmin can see all orders
+    return []
+
+# Page size for GET /orders when no limit is given, and the hard cap
+ORDERS_PAGE_DEFAULT = 100
+ORDERS_PAGE_MAX = 500
+
+# Projectable OrderResponse fields -> columns (tracking_link comes from the join)
+ORDER_LIST_FIELDS = {
+    "id": Order.id,
+    "status": Order.status,
+    "pickup_address": Order.pickup_address,
+    "dropoff_address": Order.dropoff_address,
+    "distance_km": Order.distance_km,
+    "eta_min": Order.eta_min,
+    "price_ghs": Order.price_ghs,
+    "assigned_rider_id": Order.assigned_rider_id,
+    "created_at": Order.created_at,
+    "assigned_at": Order.assigned_at,
+    "delivered_at": Order.delivered_at,
+    "tracking_link": OrderTracking.tracking_link,
+}
+
+def _encode_order_cursor(created_at: datetime, order_id: str) -> str:
+    """Opaque cursor for the (created_at, id) position of the last order on a page."""
+    raw = f"{created_at.isoformat()}|{order_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_order_cursor(cursor: str):
+    """Inverse of _encode_order_cursor; raises 400 on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, order_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), order_id
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def _parse_order_fields(fields: Optional[str]) -> List[str]:
+    """Requested projection (all fields if none given), in OrderResponse order."""
+    if not fields:
+        return list(ORDER_LIST_FIELDS)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - ORDER_LIST_FIELDS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return [f for f in ORDER_LIST_FIELDS if f in requested]
+
+@app.get("/orders")
+async def list_orders(
+    response: Response,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(ORDERS_PAGE_DEFAULT, ge=1, le=ORDERS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    rider_id: Optional[str] = None,
+    current_user: TokenPayload = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List orders for current user (merchant, rider, or admin), newest first.
     
-    # Filter by status
-    if status:
-        try:
-            status_enum = OrderStatus[status.upper()]
-            query = query.filter(Order.status == status_enum)
-        except KeyError:
-            pass
-    
-    orders = query.order_by(Order.created_at.desc()).all()
-    
-    return [
-        OrderResponse(
-            id=o.id,
-            status=o.status.value,
-            pickup_address=o.pickup_address,
-            dropoff_address=o.dropoff_address,
-            distance_km=o.distance_km,
-            eta_min=o.eta_min,
-            price_ghs=o.price_ghs,
-            assigned_rider_id=o.assigned_rider_id,
-            created_at=o.created_at,
-            assigned_at=o.assigned_at,
-            delivered_at=o.delivered_at,
-            tracking_link=o.tracking.tracking_link if o.tracking else None
-        )
-        for o in orders
-    ]
+    Pages are keyed on (created_at, id): pass the X-Next-Cursor header of one
+    response as `cursor` to get the next page; the header is absent on the
+    last page. `fields` is a comma-separated subset of the OrderResponse
+    fields to return (default: all of them). `status` takes one status or a
+    comma-separated list; `rider_id` narrows the list to one rider's orders.
+    """
+    names = _parse_order_fields(fields)
+    scope = await _order_scope(db, current_user)
+    if scope is None:
+        return []
+    
+    # Cursor columns ride along with the projection; tracking is joined only if asked for
+    query = select(
+        *(ORDER_LIST_FIELDS[name].label(name) for name in names),
+        Order.created_at.label("_cursor_created_at"),
+        Order.id.label("_cursor_id")
+    ).where(*scope)
+    if "tracking_link" in names:
+        query = query.outerjoin(OrderTracking, OrderTracking.order_id == Order.id)
+    
+    # Filter by status (comma-separated; unknown names are ignored)
+    if status_filter:
+        statuses = [
+            OrderStatus[name] for name in (s.strip().upper() for s in status_filter.split(","))
+            if name in OrderStatus.__members__
+        ]
+        if statuses:
+            query = query.where(Order.status.in_(statuses))
+    if rider_id:
+        query = query.where(Order.assigned_rider_id == rider_id)
+    if cursor:
+        query = query.where(tuple_(Order.created_at, Order.id) < _decode_order_cursor(cursor))
+    
+    # One extra row tells us whether there is a next page
+    query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).mappings().all()
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = _encode_order_cursor(
+            last["_cursor_created_at"], last["_cursor_id"]
+        )
+    
+    orders = []
+    for row in rows:
+        order = {name: row[name] for name in names}
+        if "status" in order:
+            order["status"] = order["status"].value
+        orders.append(order)
+    return orders
+
+# ==================== Analytics ====================
+
+# Rolling windows used by the admin dashboards (label -> hours)
+ANALYTICS_WINDOWS = {"1h": 1, "4h": 4, "6h": 6, "1d": 24, "3d": 72, "monthly": 720}
+ANALYTICS_BUCKETS = ("hour", "day", "week", "month")
+
+def _time_bucket(column, bucket: str, dialect: str):
+    """Truncate a timestamp column to a bucket: date_trunc on Postgres, strftime on SQLite."""
+    if dialect == "sqlite":
+        if bucket == "week":
+            # Monday of the ISO week
+            return func.date(column, "weekday 0", "-6 days")
+        fmt = {"hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d", "month": "%Y-%m-01"}[bucket]
+        return func.strftime(fmt, column)
+    return func.date_trunc(bucket, column)
+
+def _money(value) -> float:
+    return round(float(value or 0), 2)
+
+@app.get("/analytics/summary")
+async def analytics_summary(
+    rider_id: Optional[str] = None,
+    current_user: TokenPayload = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Order counts and revenue computed in SQL, scoped to the caller's orders.
+    
+    Revenue is the sum of price_ghs over DELIVERED orders; cancelled_revenue
+    over CANCELLED ones. Windows count orders created (delivered orders by
+    delivered_at) in the last N hours. `rider_id` narrows everything to one
+    rider's orders.
+    """
+    scope = await _order_scope(db, current_user)
+    if scope is None:
+        scope = [false()]
+    elif rider_id:
+        scope.append(Order.assigned_rider_id == rider_id)
+    
+    by_status = {s.value: {"count": 0, "revenue": 0.0} for s in OrderStatus}
+    for order_status, count, revenue in (await db.execute(
+        select(Order.status, func.count(Order.id), func.sum(Order.price_ghs))
+        .where(*scope).group_by(Order.status)
+    )).all():
+        by_status[order_status.value] = {"count": count, "revenue": _money(revenue)}
+    
+    # All windows in one pass: conditional aggregates per window
+    now = datetime.utcnow()
+    delivered_ts = func.coalesce(Order.delivered_at, Order.created_at)
+    is_delivered = Order.status == OrderStatus.DELIVERED
+    is_cancelled = Order.status == OrderStatus.CANCELLED
+    columns = []
+    for hours in ANALYTICS_WINDOWS.values():
+        cutoff = now - timedelta(hours=hours)
+        columns += [
+            func.count(case((Order.created_at >= cutoff, 1))),
+            func.count(case((and_(is_delivered, delivered_ts >= cutoff), 1))),
+            func.count(case((and_(is_cancelled, Order.created_at >= cutoff), 1))),
+            func.sum(case((and_(is_delivered, delivered_ts >= cutoff), Order.price_ghs))),
+        ]
+    row = (await db.execute(select(*columns).where(*scope))).one()
+    windows = {}
+    for i, label in enumerate(ANALYTICS_WINDOWS):
+        orders, delivered, cancelled, revenue = row[i * 4:(i + 1) * 4]
+        windows[label] = {
+            "orders": orders,
+            "delivered": delivered,
+            "cancelled": cancelled,
+            "revenue": _money(revenue),
+        }
+    
+    return {
+        "total_orders": sum(v["count"] for v in by_status.values()),
+        "pending_orders": by_status["PENDING"]["count"] + by_status["AWAITING_ACCEPTANCE"]["count"],
+        "assigned_orders": by_status["ASSIGNED"]["count"],
+        "delivered_orders": by_status["DELIVERED"]["count"],
+        "cancelled_orders": by_status["CANCELLED"]["count"],
+        "total_revenue": by_status["DELIVERED"]["revenue"],
+        "cancelled_revenue": by_status["CANCELLED"]["revenue"],
+        "by_status": by_status,
+        "windows": windows,
+        "generated_at": now,
+    }
+
+@app.get("/analytics/timeseries")
+async def analytics_timeseries(
+    bucket: str = Query("day"),
+    days: int = Query(30, ge=1, le=366),
+    current_user: TokenPayload = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Orders, deliveries, cancellations and revenue per time bucket (by created_at)."""
+    if bucket not in ANALYTICS_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"bucket must be one of: {', '.join(ANALYTICS_BUCKETS)}"
+        )
+    scope = await _order_scope(db, current_user)
+    if scope is None:
+        return {"bucket": bucket, "days": days, "series": []}
+    
+    dialect = get_async_engine().dialect.name
+    period = _time_bucket(Order.created_at, bucket, dialect).label("period")
+    is_delivered = Order.status == OrderStatus.DELIVERED
+    rows = (await db.execute(
+        select(
+            period,
+            func.count(Order.id),
+            func.count(case((is_delivered, 1))),
+            func.count(case((Order.status == OrderStatus.CANCELLED, 1))),
+            func.sum(case((is_delivered, Order.price_ghs))),
+        )
+        .where(*scope, Order.created_at >= datetime.utcnow() - timedelta(days=days))
+        .group_by(period).order_by(period)
+    )).all()
+    
+    return {
+        "bucket": bucket,
+        "days": days,
+        "series": [
+            {
+                "period": p.isoformat() if hasattr(p, "isoformat") else str(p),
+                "orders": orders,
+                "delivered": delivered,
+                "cancelled": cancelled,
+                "revenue": _money(revenue),
+            }
+            for p, orders, delivered, cancelled, revenue in rows
+        ],
+    }
 
 # ==================== Order Cancellation ====================
 
@@ -689,7 +1015,7 @@ async def cancel_order(
         payment = db.query(Payment).filter(Payment.id == order.payment_id).first()
         if payment:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with http_client(timeout=10.0) as client:
                     refund_response = await client.post(
                         f"{PAYMENT_SERVICE_URL}/payments/refund",
                         json={
@@ -710,7 +1036,7 @@ async def cancel_order(
         
         # Notify merchant
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with http_client(timeout=5.0) as client:
                 await client.post(
                     f"{NOTIFICATION_SERVICE_URL}/notify/email",
                     json={
@@ -726,7 +1052,7 @@ async def cancel_order(
         # Notify rider if assigned
         if order.assigned_rider_id:
             try:
-                async with httpx.AsyncClient(timeout=5.0) as client:
+                async with http_client(timeout=5.0) as client:
                     await client.post(
                         f"{NOTIFICATION_SERVICE_URL}/notify/sms",
                         json={
@@ -829,7 +1155,7 @@ async def retry_refund(
         
         payment = db.query(Payment).filter(Payment.id == order.payment_id).first()
         if payment:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_client(timeout=10.0) as client:
                 await client.post(
                     f"{PAYMENT_SERVICE_URL}/payments/refund",
                     json={
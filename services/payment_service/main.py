@@ -1,4 +1,3 @@
-import threading
 import os
 import sys
 import uuid
@@ -6,10 +5,9 @@ import time
 import asyncio
 from pathlib import Path
 from fastapi import FastAPI, Request, HTTPException, Header, Depends, status
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import jwt
 from pydantic import BaseModel
-import httpx
 import hmac
 import hashlib
 import json
@@ -21,14 +19,21 @@ from sqlalchemy.orm import Session
 sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine, Base
-from shared.models import Payment, PaymentStatus
+from shared.database import get_db, engine, Base, SessionLocal
+from shared.models import Payment, PaymentStatus, PaymentIntent, Payout, PaymentEvent, LedgerEntry, RiderCompany
+from shared import ledger
+from shared.ledger import (
+    ACCOUNT_PAYOUTS_IN_FLIGHT, ACCOUNT_PLATFORM_FEES, ACCOUNT_PROVIDER, ACCOUNT_UNALLOCATED, company_account
+)
 from shared.webhooks import verify_hubtel_webhook, webhook_audit, WebhookEvent
+from shared.http import http_client, setup_http_clients
+from shared.deadline_scheduler import DeadlineScheduler
 
 # Create tables on startup
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Payment Service")
+setup_http_clients(app)
 
 @app.get("/health")
 def health():
@@ -38,16 +43,14 @@ def health():
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# In-memory alert log (thread-safe)
-ALERT_LOG = []
-ALERT_LOCK = threading.Lock()
-
 def log_alert(level, msg):
-    now = int(time.time())
-    with ALERT_LOCK:
-        ALERT_LOG.append({"ts": now, "level": level, "msg": msg})
-        if len(ALERT_LOG) > 100:
-            ALERT_LOG.pop(0)
+    """Record an operator alert (newest shown by /admin/alerts)."""
+    try:
+        with SessionLocal() as db:
+            db.add(PaymentEvent(kind="alert", level=level, message=msg))
+            db.commit()
+    except Exception as e:
+        logger.error(f"Could not record alert [{level}] {msg}: {e}")
 
 PLATFORM_FEE_GHS = float(os.environ.get("PLATFORM_FEE_GHS", "3"))
 
@@ -118,16 +121,75 @@ def get_current_user(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="invalid token")
     return {"user_id": data.get("sub"), "role": data.get("role"), "company_id": data.get("company_id")}
 
-# In-memory store for MVP
-payouts = {}
-# In-memory store for MVP
-payments = {}
-payouts = {}
-# simple in-memory ledger: company_id -> available balance (in GHS integer units)
-company_balances = {}
+# Payments, payouts and balances live in the database: payment_intents,
+# payouts and the double-entry ledger (shared/ledger.py). Amounts are GHS
+# integer units.
+PAYOUT_SCHEDULE_SECONDS = {"immediate": 0, "3day": 3 * 24 * 3600, "weekly": 7 * 24 * 3600}
+PAYOUT_OPEN_STATUSES = ("REQUESTED", "RETRY_SCHEDULED")
+# Provider statuses that settle a payout; anything else is recorded and ignored
+PAYOUT_SUCCESS_STATUSES = ("COMPLETED", "SUCCESS")
+PAYOUT_FAILURE_STATUSES = ("FAILED", "DECLINED", "REVERSED")
+PAYOUT_CONCURRENCY = int(os.environ.get("PAYOUT_CONCURRENCY", "8"))        # Hubtel payout calls in flight
+PAYOUT_RESYNC_SECONDS = int(os.environ.get("PAYOUT_RESYNC_SECONDS", "60"))  # reconcile the queue with the payouts table
+
+# Company-account ledger entries as /transactions reports them
+TRANSACTION_TYPES = {"payment": "credit", "payout_hold": "debit", "payout_release": "refund", "payout_refund": "refund"}
+
 
-# simple transaction log for auditing (in-memory for MVP)
-transactions = []
+def _epoch(dt: Optional[datetime]) -> Optional[int]:
+    """Naive UTC datetime (as stored) to epoch seconds."""
+    return int((dt - datetime(1970, 1, 1)).total_seconds()) if dt else None
+
+
+def _payment_dict(p: PaymentIntent) -> dict:
+    return {
+        "id": p.id,
+        "status": p.status,
+        "amount": p.amount,
+        "currency": p.currency,
+        "phone": p.phone,
+        "metadata": p.meta or {},
+        "platform_fee": p.platform_fee,
+        "merchant_amount": p.merchant_amount,
+        "hubtel_ref": p.hubtel_ref,
+        "reference": p.reference,
+    }
+
+
+def _payout_dict(po: Payout) -> dict:
+    return {
+        "id": po.id,
+        "company_id": po.company_id,
+        "amount": int(po.amount),
+        "schedule": po.schedule,
+        "status": po.status,
+        "created_at": _epoch(po.created_at),
+        "next_run": po.next_run,
+        "retries": po.retries or 0,
+        "reason": po.reason,
+        "processed_at": _epoch(po.processed_at),
+        "hubtel_ref": po.hubtel_ref,
+        "last_retry_at": po.last_retry_at,
+        "cancelled_at": _epoch(po.cancelled_at),
+    }
+
+
+def _transaction_dict(e: LedgerEntry) -> dict:
+    return {
+        "id": e.id,
+        "type": TRANSACTION_TYPES.get(e.entry_type, e.entry_type),
+        "company_id": e.account.split(":", 1)[1],
+        "amount": abs(e.amount),
+        "payment_id": e.payment_id,
+        "payout_id": e.payout_id,
+        "hubtel_ref": e.ref,
+        "ts": _epoch(e.created_at),
+    }
+
+
+def _first_run(po: Payout) -> int:
+    """When a payout is first due under its schedule."""
+    return _epoch(po.created_at) + PAYOUT_SCHEDULE_SECONDS.get(po.schedule or "immediate", 0)
 
 
 class InitiateRequest(BaseModel):
@@ -143,6 +205,24 @@ class PayoutRequest(BaseModel):
     schedule: str  # immediate|3day|weekly
 
 
+# Handlers that also call other services keep their database work in these
+# helpers and run them with asyncio.to_thread, so a slow query or a row lock
+# never stalls the event loop.
+
+def _create_intent(intent: PaymentIntent):
+    with SessionLocal() as db:
+        db.add(intent)
+        db.commit()
+
+
+def _mark_pending_customer(payment_id: str, hubtel_ref: Optional[str]):
+    with SessionLocal() as db:
+        intent = db.get(PaymentIntent, payment_id)
+        intent.status = "PENDING_CUSTOMER"
+        intent.hubtel_ref = hubtel_ref
+        db.commit()
+
+
 @app.post("/payments/initiate")
 async def initiate(req: InitiateRequest):
     payment_id = str(uuid.uuid4())
@@ -153,7 +233,7 @@ async def initiate(req: InitiateRequest):
     # if phone not provided but merchant_id available, try to fetch merchant momo
     if (not req.phone) and req.metadata and req.metadata.get("merchant_id") and os.environ.get("AUTH_SERVICE_URL"):
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with http_client(timeout=5.0) as client:
                 r = await client.get(f"{os.environ.get('AUTH_SERVICE_URL')}/merchants/{req.metadata.get('merchant_id')}")
                 if r.status_code == 200:
                     jr = r.json()
@@ -163,17 +243,19 @@ async def initiate(req: InitiateRequest):
         except Exception:
             pass
 
-    # ── Record payment in memory first ─────────────────────────────────────
-    payments[payment_id] = {
-        "id": payment_id,
-        "status": "CREATED",
-        "amount": req.amount,
-        "currency": req.currency,
-        "phone": req.phone,
-        "metadata": req.metadata,
-        "platform_fee": platform_fee,
-        "merchant_amount": merchant_amount,
-    }
+    # ── Record payment first ───────────────────────────────────────────────
+    intent_status = "CREATED"
+    await asyncio.to_thread(_create_intent, PaymentIntent(
+        id=payment_id,
+        status=intent_status,
+        amount=req.amount,
+        currency=req.currency,
+        phone=req.phone,
+        meta=req.metadata,
+        company_id=(req.metadata or {}).get("company_id"),
+        platform_fee=platform_fee,
+        merchant_amount=merchant_amount,
+    ))
 
     # ── Call real Hubtel Receive Money API (if credentials configured) ──────
     # Falls back to mock_pay URL when running locally without live credentials.
@@ -201,7 +283,7 @@ async def initiate(req: InitiateRequest):
             }
 
             logger.info(f"Hubtel Receive Money → {phone_233} {channel} GHS {amount_str}")
-            async with httpx.AsyncClient(
+            async with http_client(
                 auth=(HUBTEL_PAYMENT_CLIENT_ID, HUBTEL_PAYMENT_CLIENT_SECRET),
                 timeout=20.0
             ) as client:
@@ -213,8 +295,8 @@ async def initiate(req: InitiateRequest):
                 # Hubtel accepted — MoMo prompt sent to customer
                 hubtel_ref   = hr_data.get("Data", {}).get("TransactionId") or hr_data.get("TransactionId")
                 checkout_url = hr_data.get("Data", {}).get("CheckoutUrl")
-                payments[payment_id]["status"]     = "PENDING_CUSTOMER"
-                payments[payment_id]["hubtel_ref"] = hubtel_ref
+                intent_status = "PENDING_CUSTOMER"
+                await asyncio.to_thread(_mark_pending_customer, payment_id, hubtel_ref)
                 if checkout_url:
                     payment_url = checkout_url
                 logger.info(f"Hubtel MoMo prompt sent: ref={hubtel_ref} url={payment_url}")
@@ -222,28 +304,28 @@ async def initiate(req: InitiateRequest):
                 # Hubtel rejected — log and stay in mock mode for dev graceful fallback
                 err = hr_data.get("Message") or hr_data.get("message") or hr.text[:200]
                 logger.warning(f"Hubtel rejected: {hr.status_code} — {err}")
-                log_alert("WARNING", f"Hubtel initiate failed for {payment_id}: {err}")
+                await asyncio.to_thread(log_alert, "WARNING", f"Hubtel initiate failed for {payment_id}: {err}")
 
         except Exception as e:
             logger.error(f"Hubtel initiate error: {e}")
-            log_alert("ERROR", f"Hubtel initiate exception: {e}")
+            await asyncio.to_thread(log_alert, "ERROR", f"Hubtel initiate exception: {e}")
             # Non-fatal — customer can still use mock_pay in dev / we return mock URL
 
     return {
         "payment_id":  payment_id,
         "payment_url": payment_url,
         "hubtel_ref":  hubtel_ref,
-        "status":      payments[payment_id]["status"],
+        "status":      intent_status,
     }
 
 
 @app.get("/payments/mock_pay/{payment_id}")
-async def mock_pay(payment_id: str):
+def mock_pay(payment_id: str, db: Session = Depends(get_db)):
     """Simple page simulation for local testing: this endpoint simulates a successful Hubtel payment
     by returning instructions and a test notify link (`/payments/mock_notify/{payment_id}`) that will
     call the webhook endpoint to mark the payment as PAID.
     """
-    if payment_id not in payments:
+    if not db.get(PaymentIntent, payment_id):
         raise HTTPException(status_code=404, detail="payment not found")
 
     notify_url = f"/payments/mock_notify/{payment_id}"
@@ -255,23 +337,38 @@ async def mock_pay(payment_id: str):
     }
 
 
+def _set_intent_status(payment_id: str, status: str) -> bool:
+    """Returns False if there is no such payment."""
+    with SessionLocal() as db:
+        intent = db.get(PaymentIntent, payment_id)
+        if not intent:
+            return False
+        intent.status = status
+        db.commit()
+        return True
+
+
+def _intent_status(payment_id: str) -> Optional[str]:
+    with SessionLocal() as db:
+        intent = db.get(PaymentIntent, payment_id)
+        return intent.status if intent else None
+
+
 @app.post("/payments/mock_notify/{payment_id}")
 async def mock_notify(payment_id: str, request: Request):
     """Simulate Hubtel's callback to our `/payments/callback` endpoint.
     This helper is only for local/dev testing.
     """
-    if payment_id not in payments:
-        raise HTTPException(status_code=404, detail="payment not found")
-
     # Mark the payment as PAID locally (best-effort for local/dev testing)
-    payments[payment_id]["status"] = "PAID"
+    if not await asyncio.to_thread(_set_intent_status, payment_id, "PAID"):
+        raise HTTPException(status_code=404, detail="payment not found")
 
     # Build a fake callback payload (Hubtel sends its own shape; adapt as needed)
     callback_payload = {"payment_id": payment_id, "status": "PAID"}
 
     # Call our own callback endpoint to process the payment (best-effort)
     try:
-        async with httpx.AsyncClient() as client:
+        async with http_client() as client:
             cb_port = os.environ.get("API_PORT", "8200")
             cb_url = f"http://localhost:{cb_port}/payments/callback"
             await client.post(cb_url, json=callback_payload, timeout=5.0)
@@ -279,7 +376,40 @@ async def mock_notify(payment_id: str, request: Request):
         # Swallow exceptions in dev mode; status has been set above
         pass
 
-    return {"notified": True, "status": payments[payment_id]["status"]}
+    return {"notified": True, "status": await asyncio.to_thread(_intent_status, payment_id)}
+
+
+def _apply_callback(payment_id: str, status: str) -> Tuple[bool, Optional[dict]]:
+    """
+    Record a payment callback. The first PAID callback moves the payment to
+    ESCROW and credits the company account; repeats change nothing.
+
+    Returns:
+        (found, payment as _payment_dict if this callback credited it)
+    """
+    with SessionLocal() as db:
+        intent = db.query(PaymentIntent).filter(PaymentIntent.id == payment_id).with_for_update().first()
+        if not intent:
+            return False, None
+        # Accept only PAID for now
+        if status != "PAID":
+            intent.status = status
+            db.commit()
+            return True, None
+        if intent.status in ("ESCROW", "RELEASED"):
+            # Repeated callback; the payment was credited the first time
+            return True, None
+        p = _payment_dict(intent)
+        intent.status = "ESCROW"
+        # credit merchant (rider company) escrow balance; the platform keeps its fee
+        credit_account = company_account(intent.company_id) if intent.company_id else ACCOUNT_UNALLOCATED
+        ledger.post(db, "payment", [
+            (ACCOUNT_PROVIDER, -intent.amount),
+            (credit_account, intent.merchant_amount),
+            (ACCOUNT_PLATFORM_FEES, intent.platform_fee),
+        ], payment_id=payment_id, ref=intent.hubtel_ref)
+        db.commit()
+        return True, p
 
 
 @app.post("/payments/callback")
@@ -292,31 +422,17 @@ async def callback(payload: dict):
     if not payment_id or not status:
         raise HTTPException(status_code=400, detail="invalid payload")
 
-    p = payments.get(payment_id)
-    if not p:
+    found, p = await asyncio.to_thread(_apply_callback, payment_id, status)
+    if not found:
         raise HTTPException(status_code=404, detail="payment not found")
 
-    # Accept only PAID for now
-    if status == "PAID":
-        p["status"] = "ESCROW"
-        # credit merchant (rider company) escrow balance
-        merchant_amount = p.get("merchant_amount", 0)
-        company_id = p.get("metadata", {}).get("company_id")
-        if company_id:
-            company_balances[company_id] = company_balances.get(company_id, 0) + merchant_amount
-            transactions.append({
-                "type": "credit",
-                "company_id": company_id,
-                "amount": merchant_amount,
-                "payment_id": payment_id,
-                "ts": int(time.time()),
-            })
+    if p:
         # In a full flow, notify Order Service (create order) or update DB here.
         # Notify user that payment is received (order placed)
         try:
             phone = p.get("phone")
             if NOTIFICATION_SERVICE_URL and phone:
-                async with httpx.AsyncClient(timeout=5.0) as client:
+                async with http_client(timeout=5.0) as client:
                     await client.post(f"{NOTIFICATION_SERVICE_URL}/notify/event", json={"phone": phone, "event": "order_placed", "order_id": payment_id})
         except Exception:
             pass
@@ -331,21 +447,54 @@ async def callback(payload: dict):
                     "phone": p.get("phone"),
                     "metadata": p.get("metadata", {}),
                 }
-                async with httpx.AsyncClient(timeout=5.0) as client:
+                async with http_client(timeout=5.0) as client:
                     await client.post(f"{ORDER_SERVICE_URL}/orders/create", json=payload)
         except Exception:
             pass
 
-        return {"ok": True}
-
-    p["status"] = status
     return {"ok": True}
 
 
 # ==================== Webhook Verification ====================
 
+def _apply_payment_webhook(payment_id: str, webhook_status: str, reference: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Apply a payment webhook's status to the payment (or MVP payment intent).
+
+    Returns:
+        (found, phone to notify of a completed payment)
+    """
+    with SessionLocal() as db:
+        # Try PostgreSQL first, fall back to MVP store
+        payment = db.query(Payment).filter(Payment.id == payment_id).first()
+        intent = None if payment else db.get(PaymentIntent, payment_id)
+        if not payment and not intent:
+            return False, None
+
+        phone = None
+        if webhook_status in ['COMPLETED', 'SUCCESS', 'PAID']:
+            if payment:  # PostgreSQL
+                payment.status = PaymentStatus.COMPLETED
+                payment.hubtel_payment_id = reference or payment.hubtel_payment_id
+                payment.completed_at = datetime.utcnow()
+                phone = payment.phone
+            else:  # MVP
+                intent.status = 'PAID'
+                intent.reference = reference
+                phone = intent.phone
+            db.commit()
+        elif webhook_status in ['FAILED', 'DECLINED']:
+            if payment:  # PostgreSQL
+                payment.status = PaymentStatus.FAILED
+                payment.hubtel_payment_id = reference or payment.hubtel_payment_id
+            else:  # MVP
+                intent.status = 'FAILED'
+            db.commit()
+        return True, phone
+
+
 @app.post("/payments/webhook")
-async def payment_webhook(request: Request, db: Session = Depends(get_db)):
+async def payment_webhook(request: Request):
     """
     Handle incoming payment webhook from Hubtel with signature verification.
     
@@ -413,13 +562,9 @@ async def payment_webhook(request: Request, db: Session = Depends(get_db)):
                 detail="Missing payment_id"
             )
         
-        # Try PostgreSQL first, fall back to MVP store
-        payment = db.query(Payment).filter(Payment.id == payment_id).first()
+        found, phone = await asyncio.to_thread(_apply_payment_webhook, payment_id, webhook_status, reference)
         
-        if not payment and payment_id in payments:
-            # Legacy MVP payment
-            payment_data = payments[payment_id]
-        elif not payment:
+        if not found:
             webhook_audit.log(
                 provider="hubtel",
                 event_type="payment",
@@ -431,24 +576,13 @@ async def payment_webhook(request: Request, db: Session = Depends(get_db)):
                 detail="Payment not found"
             )
         
-        # Update payment status based on webhook status
         if webhook_status in ['COMPLETED', 'SUCCESS', 'PAID']:
-            if payment:  # PostgreSQL
-                payment.status = PaymentStatus.COMPLETED
-                payment.hubtel_payment_id = reference or payment.hubtel_payment_id
-                payment.completed_at = datetime.utcnow()
-                db.commit()
-            else:  # MVP
-                payments[payment_id]['status'] = 'PAID'
-                payments[payment_id]['reference'] = reference
-            
             event_type = "payment.completed"
             
             # Notify notification service
             try:
-                phone = payment.user.phone if payment else payment_data.get('phone')
                 if os.environ.get("NOTIFICATION_SERVICE_URL") and phone:
-                    async with httpx.AsyncClient(timeout=5.0) as client:
+                    async with http_client(timeout=5.0) as client:
                         await client.post(
                             f"{os.environ.get('NOTIFICATION_SERVICE_URL')}/notify/event",
                             json={
@@ -462,13 +596,6 @@ async def payment_webhook(request: Request, db: Session = Depends(get_db)):
                 logger.warning(f"Failed to send notification: {str(e)}")
         
         elif webhook_status in ['FAILED', 'DECLINED']:
-            if payment:  # PostgreSQL
-                payment.status = PaymentStatus.FAILED
-                payment.hubtel_payment_id = reference or payment.hubtel_payment_id
-                db.commit()
-            else:  # MVP
-                payments[payment_id]['status'] = 'FAILED'
-            
             event_type = "payment.failed"
         
         else:
@@ -498,7 +625,6 @@ async def payment_webhook(request: Request, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
         webhook_audit.log(
             provider="hubtel",
             event_type="payment",
@@ -539,140 +665,330 @@ async def get_webhook_logs(user = Depends(get_current_user)):
 
 
 @app.post("/payments/release/{payment_id}")
-async def release_payment(payment_id: str):
-    p = payments.get(payment_id)
+def release_payment(payment_id: str, db: Session = Depends(get_db)):
+    p = db.get(PaymentIntent, payment_id)
     if not p:
         raise HTTPException(status_code=404, detail="payment not found")
-    if p["status"] != "ESCROW":
+    if p.status != "ESCROW":
         raise HTTPException(status_code=400, detail="payment not in escrow")
-    p["status"] = "RELEASED"
-    # In real system, credit the rider company account
-    # For MVP, just mark as released
+    p.status = "RELEASED"
+    db.commit()
+    # The company account was credited when the payment cleared escrow;
+    # releasing only marks the order as settled
     return {"ok": True}
 
 
+def _create_payout(req: PayoutRequest) -> Optional[Tuple[str, int]]:
+    """
+    Insert a REQUESTED payout.
+
+    Returns:
+        (payout_id, next_run), or None if the company doesn't exist
+    """
+    with SessionLocal() as db:
+        if not db.get(RiderCompany, req.company_id):
+            return None
+        po = Payout(
+            id=str(uuid.uuid4()),
+            company_id=req.company_id,
+            amount=req.amount,
+            schedule=req.schedule,
+            status="REQUESTED",
+            retries=0,
+            created_at=datetime.utcnow(),
+        )
+        po.next_run = _first_run(po)
+        db.add(po)
+        db.commit()
+        return po.id, po.next_run
+
+
 @app.post("/payouts/request")
 async def request_payout(req: PayoutRequest):
-    payout_id = str(uuid.uuid4())
-    payouts[payout_id] = {
-        "id": payout_id,
-        "company_id": req.company_id,
-        "amount": req.amount,
-        "schedule": req.schedule,
-        "status": "REQUESTED",
-        "created_at": int(time.time()),
-    }
-    # In real system, schedule the payout
+    if req.amount <= 0:
+        raise HTTPException(status_code=400, detail="amount must be positive")
+    created = await asyncio.to_thread(_create_payout, req)
+    if not created:
+        raise HTTPException(status_code=404, detail="company not found")
+    # The scheduler lives on the event loop, so queue the payout from here
+    payout_id, next_run = created
+    schedule_payout(payout_id, next_run)
     return {"payout_id": payout_id, "status": "REQUESTED"}
 
 
 @app.get("/payouts/{payout_id}")
-async def get_payout(payout_id: str):
-    p = payouts.get(payout_id)
-    if not p:
+def get_payout(payout_id: str, db: Session = Depends(get_db)):
+    po = db.get(Payout, payout_id)
+    if not po:
         log_alert("error", f"Payout not found: {payout_id}")
         raise HTTPException(status_code=404, detail="payout not found")
-    return p
+    return _payout_dict(po)
 
 
 @app.get("/companies/{company_id}/balance")
-async def company_balance(company_id: str):
-    return {"company_id": company_id, "balance": company_balances.get(company_id, 0)}
+def company_balance(company_id: str, db: Session = Depends(get_db)):
+    return {"company_id": company_id, "balance": ledger.balance(db, company_account(company_id))}
 
 
-async def _payout_worker():
-    """Background worker that processes scheduled payouts from `payouts`.
-    Schedules: immediate, 3day, weekly
+async def _send_hubtel_payout(payout_id: str, company_id: str, amount: int):
+    """POST a payout to Hubtel. Returns (sent, hubtel_ref)."""
+    try:
+        async with http_client(timeout=10.0) as client:
+            # simple payout payload; adapt for Hubtel's API
+            pay_payload = {
+                "amount": amount,
+                "currency": "GHS",
+                "beneficiary": {"company_id": company_id},
+                "metadata": {"payout_id": payout_id},
+            }
+            headers = {"Authorization": f"Bearer {HUBTEL_PAYOUT_API_KEY}"}
+            r = await client.post(HUBTEL_PAYOUT_URL, json=pay_payload, headers=headers)
+            if r.status_code in (200, 201):
+                jr = r.json()
+                # Hubtel may return an id/reference we can store
+                return True, jr.get("reference") or jr.get("id")
+    except Exception as e:
+        logger.warning(f"Hubtel payout {payout_id} error: {e}")
+    return False, None
+
+
+def _claim_payout(payout_id: str, configured: bool) -> Optional[Tuple[str, int]]:
     """
-    schedule_seconds = {"immediate": 0, "3day": 3 * 24 * 3600, "weekly": 7 * 24 * 3600}
-    while True:
+    Claim a due payout (status PROCESSING) and, when Hubtel is configured,
+    move its amount from the company account to payouts in flight in the
+    same transaction, so two workers can neither send it twice nor overdraw
+    the company between them.
+
+    Returns:
+        (company_id, amount), or None if it isn't ours to send
+    """
+    with SessionLocal() as db:
+        po = db.query(Payout).filter(Payout.id == payout_id).with_for_update().first()
+        if not po or po.status not in PAYOUT_OPEN_STATUSES or (po.next_run or 0) > int(time.time()):
+            return None  # picked up by another worker, or rescheduled
+        cid, amt = po.company_id, int(po.amount)
+        account = company_account(cid)
+        try:
+            if configured:
+                ledger.post(db, "payout_hold", [(account, -amt), (ACCOUNT_PAYOUTS_IN_FLIGHT, amt)],
+                            payout_id=payout_id, require_funds=account)
+            elif ledger.balance(db, account) < amt:
+                raise ledger.InsufficientFunds(f"{account} below {amt}")
+        except ledger.InsufficientFunds:
+            po.status = "FAILED"
+            po.reason = "insufficient_balance"
+            po.processed_at = datetime.utcnow()
+            db.commit()
+            log_alert("error", f"Payout {payout_id} failed: insufficient balance (company={cid}, amt={amt})")
+            return None
+        po.status = "PROCESSING"
+        db.commit()
+        return cid, amt
+
+
+def _record_send(payout_id: str, cid: str, amt: int, configured: bool, sent: bool,
+                 hubtel_ref: Optional[str]) -> Optional[int]:
+    """
+    Move the held amount on to the provider, or back to the company and
+    schedule a retry.
+
+    Returns:
+        next_run of the scheduled retry, if any
+    """
+    alert, retry_at = None, None
+    with SessionLocal() as db:
+        po = db.query(Payout).filter(Payout.id == payout_id).with_for_update().first()
+        if po.status != "PROCESSING":
+            return None  # already settled by the payout webhook or an admin reconcile
         now = int(time.time())
-        for pid, po in list(payouts.items()):
-            # Only process requested or retry-scheduled payouts
-            if po.get("status") not in ("REQUESTED", "RETRY_SCHEDULED"):
-                continue
-            # support scheduled payout windows and retries
-            sched = po.get("schedule") or "immediate"
-            offset = schedule_seconds.get(sched, 0)
-            next_run = po.get("next_run") or (po.get("created_at", 0) + offset)
-            if next_run > now:
-                continue
-            # attempt to process
-            cid = po.get("company_id")
-            amt = int(po.get("amount", 0))
-            bal = company_balances.get(cid, 0)
-            if bal >= amt:
-                # attempt Hubtel payout if configured
-                sent = False
-                hubtel_ref = None
-                if HUBTEL_PAYOUT_URL and HUBTEL_PAYOUT_API_KEY:
-                    try:
-                        async with httpx.AsyncClient(timeout=10.0) as client:
-                            # simple payout payload; adapt for Hubtel's API
-                            pay_payload = {
-                                "amount": amt,
-                                "currency": "GHS",
-                                "beneficiary": {"company_id": cid},
-                                "metadata": {"payout_id": pid},
-                            }
-                            headers = {"Authorization": f"Bearer {HUBTEL_PAYOUT_API_KEY}"}
-                            r = await client.post(HUBTEL_PAYOUT_URL, json=pay_payload, headers=headers)
-                            if r.status_code in (200, 201):
-                                jr = r.json()
-                                # Hubtel may return an id/reference we can store
-                                hubtel_ref = jr.get("reference") or jr.get("id")
-                                sent = True
-                    except Exception:
-                        sent = False
-
-                if sent:
-                    # debit balance and mark sent; final confirmation may come via webhook
-                    company_balances[cid] = bal - amt
-                    po["status"] = "SENT"
-                    po["processed_at"] = now
-                    po["hubtel_ref"] = hubtel_ref
-                    po["retries"] = po.get("retries", 0)
-                    transactions.append({
-                        "type": "debit",
-                        "company_id": cid,
-                        "amount": amt,
-                        "payout_id": pid,
-                        "ts": now,
-                        "hubtel_ref": hubtel_ref,
-                    })
-                else:
-                    # schedule retry with exponential backoff (do not debit)
-                    po["retries"] = po.get("retries", 0) + 1
-                    retry_count = po["retries"]
-                    # backoff: 60s, 300s, 1800s, then mark failed after 5 tries
-                    backoff = {1: 60, 2: 300, 3: 1800, 4: 3600, 5: 7200}.get(retry_count, 7200)
-                    if retry_count >= 5:
-                        po["status"] = "FAILED"
-                        po["reason"] = "hubtel_error_or_not_configured"
-                        po["processed_at"] = now
-                        log_alert("error", f"Payout {pid} failed after retries (company={cid}, amt={amt})")
-                    else:
-                        po["status"] = "RETRY_SCHEDULED"
-                        po["next_run"] = now + backoff
-                        po["reason"] = "hubtel_error_scheduled_retry"
-                        po["last_retry_at"] = now
-                        log_alert("warning", f"Payout {pid} scheduled retry {retry_count} (company={cid}, amt={amt})")
+        if sent:
+            # mark sent; final confirmation may come via webhook
+            ledger.post(db, "payout_sent", [(ACCOUNT_PAYOUTS_IN_FLIGHT, -amt), (ACCOUNT_PROVIDER, amt)],
+                        payout_id=payout_id, ref=hubtel_ref)
+            po.status = "SENT"
+            po.processed_at = datetime.utcnow()
+            po.hubtel_ref = hubtel_ref
+        else:
+            if configured:
+                ledger.post(db, "payout_release", [(ACCOUNT_PAYOUTS_IN_FLIGHT, -amt), (company_account(cid), amt)],
+                            payout_id=payout_id)
+            # schedule retry with exponential backoff
+            po.retries = (po.retries or 0) + 1
+            retry_count = po.retries
+            # backoff: 60s, 300s, 1800s, then mark failed after 5 tries
+            backoff = {1: 60, 2: 300, 3: 1800, 4: 3600, 5: 7200}.get(retry_count, 7200)
+            if retry_count >= 5:
+                po.status = "FAILED"
+                po.reason = "hubtel_error_or_not_configured"
+                po.processed_at = datetime.utcnow()
+                alert = ("error", f"Payout {payout_id} failed after retries (company={cid}, amt={amt})")
             else:
-                po["status"] = "FAILED"
-                po["reason"] = "insufficient_balance"
-                po["processed_at"] = now
-                log_alert("error", f"Payout {pid} failed: insufficient balance (company={cid}, amt={amt})")
-        await asyncio.sleep(30)
+                po.status = "RETRY_SCHEDULED"
+                po.next_run = retry_at = now + backoff
+                po.reason = "hubtel_error_scheduled_retry"
+                po.last_retry_at = now
+                alert = ("warning", f"Payout {payout_id} scheduled retry {retry_count} (company={cid}, amt={amt})")
+        db.commit()
+    if alert:
+        log_alert(*alert)
+    return retry_at
+
+
+async def _process_payout(payout_id: str):
+    """Send one due payout: claim and hold, call Hubtel outside any transaction, record the result."""
+    configured = bool(HUBTEL_PAYOUT_URL and HUBTEL_PAYOUT_API_KEY)
+    claimed = await asyncio.to_thread(_claim_payout, payout_id, configured)
+    if not claimed:
+        return
+    cid, amt = claimed
+
+    # attempt Hubtel payout if configured
+    sent, hubtel_ref = await _send_hubtel_payout(payout_id, cid, amt) if configured else (False, None)
+
+    retry_at = await asyncio.to_thread(_record_send, payout_id, cid, amt, configured, sent, hubtel_ref)
+    if retry_at:
+        schedule_payout(payout_id, retry_at)
+
+
+# ==================== Payout Scheduling ====================
+
+# Payouts being sent by this replica (claimed or waiting for a slot); holding
+# the task keeps it from being garbage-collected mid-send
+_payouts_in_progress: Dict[str, asyncio.Task] = {}
+_payout_slots = asyncio.Semaphore(PAYOUT_CONCURRENCY)
+
+
+async def _run_payout(payout_id: str):
+    try:
+        async with _payout_slots:
+            await _process_payout(payout_id)
+    except Exception as e:
+        logger.error(f"Payout {payout_id} processing error: {e}")
+
+
+async def process_due_payouts(payout_ids: List[str]):
+    """Scheduler handler: send the due batch, at most PAYOUT_CONCURRENCY Hubtel calls at a time.
+
+    Each payout runs as its own task so a slow Hubtel call doesn't hold up
+    payouts that fall due while it's in flight.
+    """
+    for payout_id in payout_ids:
+        if payout_id not in _payouts_in_progress:
+            task = asyncio.create_task(_run_payout(payout_id))
+            _payouts_in_progress[payout_id] = task
+            task.add_done_callback(lambda _, pid=payout_id: _payouts_in_progress.pop(pid, None))
+
+
+# Fires exactly at each payout's next_run (replaces the 30s scan of every payout)
+payout_scheduler = DeadlineScheduler(process_due_payouts, name="payouts")
+
+
+def schedule_payout(payout_id: str, next_run: int):
+    """Queue a payout to be sent at next_run (epoch seconds)."""
+    payout_scheduler.schedule(payout_id, datetime.utcfromtimestamp(next_run))
+
+
+def _load_payout_deadlines(horizon: int) -> dict:
+    """payout_id -> next_run for open payouts due before `horizon` (via ix_payouts_status_next_run)."""
+    with SessionLocal() as db:
+        return dict(db.query(Payout.id, Payout.next_run).filter(
+            Payout.status.in_(PAYOUT_OPEN_STATUSES),
+            Payout.next_run <= horizon
+        ).all())
+
+
+async def payout_deadline_resync():
+    """
+    Queue payouts falling due before the next resync, every
+    PAYOUT_RESYNC_SECONDS, so payouts requested on other replicas, loaded
+    at startup or missed after an error are still sent. Only that window of
+    open payouts is read, whatever the payout history.
+    """
+    while True:
+        try:
+            horizon = int(time.time()) + PAYOUT_RESYNC_SECONDS
+            deadlines = await asyncio.to_thread(_load_payout_deadlines, horizon)
+            for payout_id, next_run in deadlines.items():
+                schedule_payout(payout_id, next_run)
+        except Exception as e:
+            logger.error(f"Payout deadline resync error: {e}")
+        await asyncio.sleep(PAYOUT_RESYNC_SECONDS)
+
+
+@app.get("/admin/payouts/scheduler")
+async def payout_scheduler_stats(user=Depends(get_current_user)):
+    """Payout queue depth, firing lag and sends in progress in this replica."""
+    if user.get("role") != "superadmin":
+        raise HTTPException(status_code=403, detail="forbidden")
+    return {
+        **payout_scheduler.metrics(),
+        "in_progress": len(_payouts_in_progress),
+        "concurrency": PAYOUT_CONCURRENCY,
+    }
+
+
 # --- Admin alerts endpoint ---
 @app.get("/admin/alerts")
-def get_admin_alerts():
-    with ALERT_LOCK:
-        return {"alerts": list(ALERT_LOG)[-20:][::-1]}  # last 20, newest first
+def get_admin_alerts(db: Session = Depends(get_db)):
+    alerts = db.query(PaymentEvent).filter(PaymentEvent.kind == "alert").order_by(PaymentEvent.id.desc()).limit(20)
+    return {"alerts": [{"ts": _epoch(a.created_at), "level": a.level, "msg": a.message} for a in alerts]}  # last 20, newest first
 
 
 @app.on_event("startup")
 async def start_payout_worker():
-    asyncio.create_task(_payout_worker())
+    asyncio.create_task(payout_deadline_resync())
+    asyncio.create_task(payout_scheduler.run())
+
+
+def _settle_payout(db: Session, po: Payout, status: str, hubtel_ref: Optional[str]) -> bool:
+    """
+    Apply a provider's final status to a payout, moving held or sent money to match.
+
+    Only PAYOUT_SUCCESS_STATUSES and PAYOUT_FAILURE_STATUSES are final; any
+    other status (PENDING, PROCESSING, a typo) leaves the payout and the
+    ledger untouched, so an in-flight payout is never released on a guess.
+
+    Returns:
+        Whether the payout was settled
+    """
+    if status not in PAYOUT_SUCCESS_STATUSES and status not in PAYOUT_FAILURE_STATUSES:
+        logger.info(f"Payout {po.id}: non-final status {status!r} recorded, payout left {po.status}")
+        return False
+    amt = int(po.amount)
+    held = ledger.payout_in_flight(db, po.id)
+    if status in PAYOUT_SUCCESS_STATUSES:
+        if held:
+            # confirmed before the worker recorded the send
+            ledger.post(db, "payout_sent", [(ACCOUNT_PAYOUTS_IN_FLIGHT, -held), (ACCOUNT_PROVIDER, held)],
+                        payout_id=po.id, ref=hubtel_ref)
+        po.status = "COMPLETED"
+    else:
+        # failed: give the company its money back if it had left the account
+        if held:
+            ledger.post(db, "payout_release", [(ACCOUNT_PAYOUTS_IN_FLIGHT, -held), (company_account(po.company_id), held)],
+                        payout_id=po.id)
+        elif po.status == "SENT":
+            ledger.post(db, "payout_refund", [(ACCOUNT_PROVIDER, -amt), (company_account(po.company_id), amt)],
+                        payout_id=po.id, ref=hubtel_ref)
+        po.status = "FAILED"
+    po.hubtel_ref = hubtel_ref
+    po.processed_at = datetime.utcnow()
+    return True
+
+
+def _record_payout_webhook(payout_id: str, status: str, hubtel_ref: Optional[str], body: dict) -> bool:
+    """Settle the payout on a final status and log the webhook. Returns False if there is no such payout."""
+    with SessionLocal() as db:
+        po = db.query(Payout).filter(Payout.id == payout_id).with_for_update().first()
+        if not po:
+            return False
+
+        # reconcile final statuses; others are only recorded below
+        _settle_payout(db, po, status, hubtel_ref)
+        # record webhook event for audit
+        db.add(PaymentEvent(kind="webhook", payout_id=payout_id, status=status, hubtel_ref=hubtel_ref, data=body))
+        db.commit()
+        return True
 
 
 @app.post("/payouts/webhook")
@@ -704,130 +1020,119 @@ async def payouts_webhook(payload: dict, request: Request):
     hubtel_ref = body.get("hubtel_ref") or body.get("reference") or body.get("transaction_id") or body.get("id")
     if not payout_id or not status:
         raise HTTPException(status_code=400, detail="payout_id and status required")
-    po = payouts.get(payout_id)
-    if not po:
+    if not await asyncio.to_thread(_record_payout_webhook, payout_id, status, hubtel_ref, body):
         raise HTTPException(status_code=404, detail="payout not found")
 
-    now = int(time.time())
-    # reconcile statuses
-    if status.upper() in ("COMPLETED", "SUCCESS"):
-        po["status"] = "COMPLETED"
-        po["hubtel_ref"] = hubtel_ref
-        po["processed_at"] = now
-    else:
-        # failed: try to refund ledger if we had debited earlier
-        prev_status = po.get("status")
-        po["status"] = "FAILED"
-        po["hubtel_ref"] = hubtel_ref
-        po["processed_at"] = now
-        # if we previously debited balance on send, refund
-        if prev_status == "SENT":
-            cid = po.get("company_id")
-            amt = int(po.get("amount", 0))
-            company_balances[cid] = company_balances.get(cid, 0) + amt
-            transactions.append({
-                "type": "refund",
-                "company_id": cid,
-                "amount": amt,
-                "payout_id": payout_id,
-                "ts": now,
-            })
-    # record webhook event for audit
-    transactions.append({
-        "type": "webhook",
-        "payout_id": payout_id,
-        "status": status,
-        "hubtel_ref": hubtel_ref,
-        "raw": body,
-        "ts": now,
-    })
-
     return {"ok": True}
 
 
 @app.get("/transactions")
-async def list_transactions():
-    return {"transactions": transactions}
+def list_transactions(company_id: Optional[str] = None, before: Optional[int] = None, limit: int = 100,
+                      db: Session = Depends(get_db)):
+    """Company ledger entries (payment credits, payout debits, refunds), newest first.
+    Pass the returned `next_before` as `before` for the next page.
+    """
+    limit = max(1, min(limit, 500))
+    rows = ledger.entries(
+        db,
+        account=company_account(company_id) if company_id else None,
+        account_prefix=None if company_id else "company:",
+        before=before,
+        limit=limit,
+    )
+    return {
+        "transactions": [_transaction_dict(e) for e in rows],
+        "next_before": rows[-1].id if len(rows) == limit else None,
+    }
 
 
 @app.get("/admin/payouts")
-async def admin_list_payouts(status: Optional[str] = None, company_id: Optional[str] = None, limit: int = 50, offset: int = 0, user=Depends(get_current_user)):
+def admin_list_payouts(status: Optional[str] = None, company_id: Optional[str] = None, limit: int = 50, offset: int = 0, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if user.get("role") != "superadmin":
         raise HTTPException(status_code=403, detail="forbidden")
-    res = [p for p in payouts.values()]
+    query = db.query(Payout)
     if status:
-        res = [p for p in res if p.get("status") == status]
+        query = query.filter(Payout.status == status)
     if company_id:
-        res = [p for p in res if p.get("company_id") == company_id]
-    return {"payouts": res[offset:offset+limit]}
+        query = query.filter(Payout.company_id == company_id)
+    res = query.order_by(Payout.created_at.desc()).offset(offset).limit(limit)
+    return {"payouts": [_payout_dict(p) for p in res]}
+
+
+def _reset_payout(payout_id: str) -> dict:
+    """
+    Put a payout back to REQUESTED with a fresh schedule.
+
+    Returns:
+        The payout as _payout_dict
+
+    Raises:
+        HTTPException: 404 if there is no such payout, 409 while it is being sent
+    """
+    with SessionLocal() as db:
+        po = db.query(Payout).filter(Payout.id == payout_id).with_for_update().first()
+        if not po:
+            raise HTTPException(status_code=404, detail="payout not found")
+        if po.status == "PROCESSING":
+            raise HTTPException(status_code=409, detail="payout is being sent; reconcile it instead")
+        # reset status to REQUESTED and clear scheduling
+        po.status = "REQUESTED"
+        po.next_run = _first_run(po)
+        po.retries = 0
+        po.reason = None
+        po.processed_at = None
+        db.commit()
+        return _payout_dict(po)
 
 
 @app.post("/admin/payouts/{payout_id}/retry")
 async def admin_retry_payout(payout_id: str, user=Depends(get_current_user)):
     if user.get("role") != "superadmin":
         raise HTTPException(status_code=403, detail="forbidden")
-    po = payouts.get(payout_id)
-    if not po:
-        raise HTTPException(status_code=404, detail="payout not found")
-    # reset status to REQUESTED and clear scheduling
-    po["status"] = "REQUESTED"
-    po.pop("next_run", None)
-    po["retries"] = 0
-    po["reason"] = None
-    po["processed_at"] = None
-    return {"ok": True, "payout": po}
+    payout = await asyncio.to_thread(_reset_payout, payout_id)
+    schedule_payout(payout_id, payout["next_run"])
+    return {"ok": True, "payout": payout}
 
 
 @app.post("/admin/payouts/{payout_id}/cancel")
-async def admin_cancel_payout(payout_id: str, user=Depends(get_current_user)):
+def admin_cancel_payout(payout_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if user.get("role") != "superadmin":
         raise HTTPException(status_code=403, detail="forbidden")
-    po = payouts.get(payout_id)
+    po = db.query(Payout).filter(Payout.id == payout_id).with_for_update().first()
     if not po:
         raise HTTPException(status_code=404, detail="payout not found")
-    prev = po.get("status")
-    po["status"] = "CANCELLED"
-    po["cancelled_at"] = int(time.time())
+    if po.status == "PROCESSING":
+        raise HTTPException(status_code=409, detail="payout is being sent; reconcile it instead")
+    prev = po.status
+    po.status = "CANCELLED"
+    po.cancelled_at = datetime.utcnow()
     # if we debited ledger earlier (SENT), refund
     if prev == "SENT":
-        cid = po.get("company_id")
-        amt = int(po.get("amount", 0))
-        company_balances[cid] = company_balances.get(cid, 0) + amt
-        transactions.append({"type": "refund", "company_id": cid, "amount": amt, "payout_id": payout_id, "ts": int(time.time())})
-    return {"ok": True, "payout": po}
+        amt = int(po.amount)
+        ledger.post(db, "payout_refund", [(ACCOUNT_PROVIDER, -amt), (company_account(po.company_id), amt)],
+                    payout_id=payout_id)
+    db.commit()
+    return {"ok": True, "payout": _payout_dict(po)}
 
 
 @app.post("/admin/payouts/{payout_id}/reconcile")
-async def admin_reconcile(payout_id: str, payload: dict, user=Depends(get_current_user)):
+def admin_reconcile(payout_id: str, payload: dict, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if user.get("role") != "superadmin":
         raise HTTPException(status_code=403, detail="forbidden")
     # reuse webhook reconcile logic
     status = (payload.get("status") or "").upper()
     hubtel_ref = payload.get("hubtel_ref")
-    po = payouts.get(payout_id)
+    po = db.query(Payout).filter(Payout.id == payout_id).with_for_update().first()
     if not po:
         raise HTTPException(status_code=404, detail="payout not found")
-    now = int(time.time())
-    if status in ("COMPLETED", "SUCCESS"):
-        po["status"] = "COMPLETED"
-        po["hubtel_ref"] = hubtel_ref
-        po["processed_at"] = now
-    else:
-        prev_status = po.get("status")
-        po["status"] = "FAILED"
-        po["hubtel_ref"] = hubtel_ref
-        po["processed_at"] = now
-        if prev_status == "SENT":
-            cid = po.get("company_id")
-            amt = int(po.get("amount", 0))
-            company_balances[cid] = company_balances.get(cid, 0) + amt
-            transactions.append({"type": "refund", "company_id": cid, "amount": amt, "payout_id": payout_id, "ts": now})
-    transactions.append({"type": "reconcile", "payout_id": payout_id, "status": status, "hubtel_ref": hubtel_ref, "ts": now})
-    return {"ok": True, "payout": po}
+    settled = _settle_payout(db, po, status, hubtel_ref)
+    db.add(PaymentEvent(kind="reconcile", payout_id=payout_id, status=status, hubtel_ref=hubtel_ref))
+    db.commit()
+    return {"ok": True, "settled": settled, "payout": _payout_dict(po)}
 
 
 @app.get("/admin/reconciliation/export")
-async def admin_export_reconciliation(user=Depends(get_current_user)):
+def admin_export_reconciliation(user=Depends(get_current_user), db: Session = Depends(get_db)):
     if user.get("role") != "superadmin":
         raise HTTPException(status_code=403, detail="forbidden")
     # simple CSV export of payouts
@@ -835,25 +1140,31 @@ async def admin_export_reconciliation(user=Depends(get_current_user)):
     buf = io.StringIO()
     w = csv.writer(buf)
     w.writerow(["payout_id","company_id","amount","status","created_at","processed_at","hubtel_ref","retries"])
-    for p in payouts.values():
+    for po in db.query(Payout).order_by(Payout.created_at).yield_per(1000):
+        p = _payout_dict(po)
         w.writerow([p.get("id"), p.get("company_id"), p.get("amount"), p.get("status"), p.get("created_at"), p.get("processed_at"), p.get("hubtel_ref"), p.get("retries", 0)])
     return {"csv": buf.getvalue()}
 
 
 @app.get("/admin/webhooks/log")
-async def admin_webhook_log(user=Depends(get_current_user)):
+def admin_webhook_log(limit: int = 100, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if user.get("role") != "superadmin":
         raise HTTPException(status_code=403, detail="forbidden")
-    logs = [t for t in transactions if t.get("type") == "webhook"]
+    events = db.query(PaymentEvent).filter(PaymentEvent.kind == "webhook").order_by(PaymentEvent.id.desc()).limit(max(1, min(limit, 500)))
+    logs = [
+        {"type": "webhook", "payout_id": e.payout_id, "status": e.status, "hubtel_ref": e.hubtel_ref,
+         "raw": e.data, "ts": _epoch(e.created_at)}
+        for e in events
+    ]
     return {"webhooks": logs}
 
 
 @app.get("/payments/status/{payment_id}")
-async def get_payment_status(payment_id: str):
-    p = payments.get(payment_id)
+def get_payment_status(payment_id: str, db: Session = Depends(get_db)):
+    p = db.get(PaymentIntent, payment_id)
     if not p:
         raise HTTPException(status_code=404, detail="payment not found")
-    return p
+    return _payment_dict(p)
 
 # ==================== Refund Processing ====================
 
@@ -872,8 +1183,33 @@ class RefundResponse(BaseModel):
     refund_reference: Optional[str] = None
     error: Optional[str] = None
 
+def _refund_target(payment_id: str) -> Optional[dict]:
+    """The fields a refund needs from a payment, or None if there is no such payment."""
+    with SessionLocal() as db:
+        payment = db.query(Payment).filter(Payment.id == payment_id).first()
+        if not payment:
+            return None
+        return {
+            "status": payment.status,
+            "amount": payment.amount,
+            "payment_method": payment.payment_method,
+            "hubtel_payment_id": payment.hubtel_payment_id,
+        }
+
+
+def _record_refund(request: RefundRequest, refund_id: str, refund_status: str,
+                   refund_reference: Optional[str], error: Optional[str]):
+    with SessionLocal() as db:
+        db.add(PaymentEvent(
+            kind="refund", payment_id=request.payment_id, status=refund_status, hubtel_ref=refund_reference,
+            amount=request.refund_amount,
+            data={"refund_id": refund_id, "reason": request.reason, "order_id": request.order_id, "error": error}
+        ))
+        db.commit()
+
+
 @app.post("/payments/refund", response_model=RefundResponse)
-async def refund_payment(request: RefundRequest, db: Session = Depends(get_db)):
+async def refund_payment(request: RefundRequest):
     """
     Process a refund for a completed payment.
     
@@ -882,18 +1218,18 @@ async def refund_payment(request: RefundRequest, db: Session = Depends(get_db)):
     - Falls back to logging for unsupported providers
     """
     
-    payment = db.query(Payment).filter(Payment.id == request.payment_id).first()
+    payment = await asyncio.to_thread(_refund_target, request.payment_id)
     if not payment:
         logger.warning(f"Refund requested for non-existent payment: {request.payment_id}")
         raise HTTPException(status_code=404, detail="Payment not found")
     
-    if payment.status != PaymentStatus.COMPLETED:
+    if payment["status"] != PaymentStatus.COMPLETED:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot refund payment with status {payment.status.value}"
+            detail=f"Cannot refund payment with status {payment['status'].value}"
         )
     
-    if request.refund_amount <= 0 or request.refund_amount > payment.amount:
+    if request.refund_amount <= 0 or request.refund_amount > payment["amount"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid refund amount"
@@ -903,19 +1239,19 @@ async def refund_payment(request: RefundRequest, db: Session = Depends(get_db)):
         refund_id = str(uuid.uuid4())
         
         # Determine provider from payment_method field
-        provider = (payment.payment_method or "hubtel").lower()
+        provider = (payment["payment_method"] or "hubtel").lower()
         refund_reference = None
         refund_status = "pending"
         error = None
         
-        if payment.hubtel_payment_id:
+        if payment["hubtel_payment_id"]:
             try:
                 # Call Hubtel refund API
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with http_client(timeout=10.0) as client:
                     refund_response = await client.post(
                         "https://api.hubtel.com/v1/pay/refund",
                         json={
-                            "transactionId": payment.hubtel_payment_id,
+                            "transactionId": payment["hubtel_payment_id"],
                             "amount": request.refund_amount,
                             "reason": request.reason
                         },
@@ -941,10 +1277,13 @@ async def refund_payment(request: RefundRequest, db: Session = Depends(get_db)):
         else:
             refund_status = "failed"
             error = "Missing Hubtel payment reference for refund"
-            logger.warning(f"Cannot refund: provider={provider}, hubtel_payment_id={payment.hubtel_payment_id}")
+            logger.warning(f"Cannot refund: provider={provider}, hubtel_payment_id={payment['hubtel_payment_id']}")
         
         # Store refund record
-        log_alert("info", f"Refund {refund_id}: {refund_status} ({request.refund_amount} GHS from {provider})")
+        await asyncio.to_thread(_record_refund, request, refund_id, refund_status, refund_reference, error)
+        await asyncio.to_thread(
+            log_alert, "info", f"Refund {refund_id}: {refund_status} ({request.refund_amount} GHS from {provider})"
+        )
         
         return RefundResponse(
             payment_id=request.payment_id,
@@ -964,17 +1303,19 @@ async def refund_payment(request: RefundRequest, db: Session = Depends(get_db)):
 # ==================== Get Refund Status ====================
 
 @app.get("/payments/{payment_id}/refund-status")
-async def get_refund_status(payment_id: str, db: Session = Depends(get_db)):
+def get_refund_status(payment_id: str, db: Session = Depends(get_db)):
     """Get refund status for a payment."""
     
     payment = db.query(Payment).filter(Payment.id == payment_id).first()
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
-    # Check refund logs
-    refund_logs = [t for t in transactions if t.get("type") == "refund" and t.get("payment_id") == payment_id]
+    # Check refund records
+    latest_refund = db.query(PaymentEvent).filter(
+        PaymentEvent.kind == "refund", PaymentEvent.payment_id == payment_id
+    ).order_by(PaymentEvent.id.desc()).first()
     
-    if not refund_logs:
+    if not latest_refund:
         return {
             "payment_id": payment_id,
             "refund_status": "none",
@@ -982,12 +1323,10 @@ async def get_refund_status(payment_id: str, db: Session = Depends(get_db)):
             "message": "No refunds for this payment"
         }
     
-    latest_refund = max(refund_logs, key=lambda x: x.get("ts", 0))
-    
     return {
         "payment_id": payment_id,
-        "refund_status": latest_refund.get("status", "unknown"),
-        "refund_amount": latest_refund.get("amount", 0),
-        "refund_reference": latest_refund.get("refund_id"),
-        "processed_at": latest_refund.get("processed_at")
+        "refund_status": latest_refund.status or "unknown",
+        "refund_amount": latest_refund.amount or 0,
+        "refund_reference": latest_refund.hubtel_ref or (latest_refund.data or {}).get("refund_id"),
+        "processed_at": _epoch(latest_refund.created_at)
     }
@@ -9,8 +9,9 @@ import os
 import sys
 from pathlib import Path
 from fastapi import FastAPI, HTTPException, status, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, desc, func, select, case
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List
 from datetime import datetime, timedelta
@@ -21,11 +22,12 @@ import logging
 sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine, Base
+from shared.database import get_db, get_async_db, engine, Base
 from shared.models import (
-    RiderReview, Order, OrderStatus, Rider, User, UserRole, Merchant
+    RiderReview, RiderStats, Order, OrderStatus, Rider, User, UserRole, Merchant
 )
 from shared.auth import get_current_user, TokenPayload
+import shared.rider_stats  # noqa: F401 — keeps rider_stats in step with review changes
 from shared.security import setup_security_middleware, sanitize_string
 
 # Create tables on startup
@@ -37,6 +39,8 @@ setup_security_middleware(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MAX_BULK_RIDERS = 500
+
 # ==================== Pydantic Models ====================
 
 class ReviewFilter(str, Enum):
@@ -101,6 +105,10 @@ class RiderRatingStatsResponse(BaseModel):
     response_time_avg_min: float  # Avg response time to assignments
     delivery_speed_avg_min: float  # Avg delivery time
 
+class BulkRiderRatingRequest(BaseModel):
+    """Rider IDs to fetch rating summaries for."""
+    rider_ids: List[str]
+
 class ReviewListResponse(BaseModel):
     """List of reviews with pagination."""
     reviews: List[ReviewResponse]
@@ -209,30 +217,46 @@ async def create_review(
             detail="Failed to create review"
         )
 
+# ==================== Async Read Helpers ====================
+
+async def _get_rider_with_user(db: AsyncSession, rider_id: str) -> Optional[Rider]:
+    """Rider with its user loaded (AsyncSession can't lazy-load rider.user)."""
+    return (await db.execute(
+        select(Rider).options(selectinload(Rider.user)).where(Rider.id == rider_id)
+    )).scalar_one_or_none()
+
+async def _rating_totals(db: AsyncSession, rider_id: str):
+    """(total reviews, average rating) from rider_stats, aggregating if the row is missing."""
+    stats = await db.get(RiderStats, rider_id)
+    if stats is not None:
+        return stats.num_ratings, stats.avg_rating or 0
+    total_reviews, avg_rating = (await db.execute(
+        select(func.count(RiderReview.id), func.avg(RiderReview.rating))
+        .where(RiderReview.rider_id == rider_id)
+    )).one()
+    return total_reviews, float(avg_rating or 0)
+
 # ==================== Get Reviews ====================
 
 @app.get("/riders/{rider_id}/rating", response_model=RiderRatingResponse)
 async def get_rider_rating(
     rider_id: str,
     recent_limit: int = Query(5, ge=1, le=20),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get rider's rating summary."""
     
     # Get rider
-    rider = db.query(Rider).filter(Rider.id == rider_id).first()
+    rider = await _get_rider_with_user(db, rider_id)
     if not rider:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Rider not found"
         )
     
-    # Get all reviews
-    reviews = db.query(RiderReview).filter(
-        RiderReview.rider_id == rider_id
-    ).all()
+    total_reviews, avg_rating = await _rating_totals(db, rider_id)
     
-    if not reviews:
+    if not total_reviews:
         return RiderRatingResponse(
             rider_id=rider_id,
             rider_name=rider.user.username if rider.user else "Unknown",
@@ -242,21 +266,20 @@ async def get_rider_rating(
             recent_reviews=[]
         )
     
-    # Calculate stats
-    ratings = [r.rating for r in reviews]
-    avg_rating = sum(ratings) / len(ratings) if ratings else 0
-    
     # Breakdown
-    breakdown = {
-        "1": len([r for r in reviews if r.rating == 1]),
-        "2": len([r for r in reviews if r.rating == 2]),
-        "3": len([r for r in reviews if r.rating == 3]),
-        "4": len([r for r in reviews if r.rating == 4]),
-        "5": len([r for r in reviews if r.rating == 5])
-    }
+    breakdown = {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0}
+    for rating, count in (await db.execute(
+        select(RiderReview.rating, func.count(RiderReview.id))
+        .where(RiderReview.rider_id == rider_id)
+        .group_by(RiderReview.rating)
+    )).all():
+        breakdown[str(rating)] = count
     
     # Recent reviews
-    recent = sorted(reviews, key=lambda r: r.created_at, reverse=True)[:recent_limit]
+    recent = (await db.execute(
+        select(RiderReview).where(RiderReview.rider_id == rider_id)
+        .order_by(desc(RiderReview.created_at)).limit(recent_limit)
+    )).scalars().all()
     recent_responses = [
         ReviewResponse(
             id=r.id,
@@ -274,22 +297,69 @@ async def get_rider_rating(
         rider_id=rider_id,
         rider_name=rider.user.username if rider.user else "Unknown",
         average_rating=round(avg_rating, 2),
-        total_reviews=len(reviews),
+        total_reviews=total_reviews,
         rating_breakdown=breakdown,
         recent_reviews=recent_responses
     )
 
+# ==================== Bulk Rider Ratings ====================
+
+@app.post("/riders/ratings/bulk")
+async def get_bulk_rider_ratings(
+    request: BulkRiderRatingRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Average rating and review count for many riders in one call."""
+    
+    if len(request.rider_ids) > MAX_BULK_RIDERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_RIDERS} rider_ids per request"
+        )
+    
+    ratings = {
+        rider_id: {"average_rating": 0.0, "total_reviews": 0}
+        for rider_id in request.rider_ids
+    }
+    if not ratings:
+        return {"ratings": ratings}
+    
+    # rider_stats first; aggregate reviews only for riders without a row
+    stats_rows = (await db.execute(
+        select(RiderStats).where(RiderStats.rider_id.in_(request.rider_ids))
+    )).scalars().all()
+    for row in stats_rows:
+        ratings[row.rider_id] = {
+            "average_rating": round(row.avg_rating or 0, 2),
+            "total_reviews": row.num_ratings
+        }
+    
+    have_stats = {row.rider_id for row in stats_rows}
+    missing = [rider_id for rider_id in ratings if rider_id not in have_stats]
+    if missing:
+        for rider_id, count, avg in (await db.execute(
+            select(RiderReview.rider_id, func.count(RiderReview.id), func.avg(RiderReview.rating))
+            .where(RiderReview.rider_id.in_(missing))
+            .group_by(RiderReview.rider_id)
+        )).all():
+            ratings[rider_id] = {
+                "average_rating": round(float(avg or 0), 2),
+                "total_reviews": count
+            }
+    
+    return {"ratings": ratings}
+
 # ==================== Get Rider Rating Stats ====================
 
 @app.get("/riders/{rider_id}/rating/stats", response_model=RiderRatingStatsResponse)
 async def get_rider_rating_stats(
     rider_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get detailed rider rating statistics."""
     
     # Get rider
-    rider = db.query(Rider).filter(Rider.id == rider_id).first()
+    rider = await _get_rider_with_user(db, rider_id)
     if not rider:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -301,51 +371,47 @@ async def get_rider_rating_stats(
     week_ago = now - timedelta(days=7)
     month_ago = now - timedelta(days=30)
     
-    all_reviews = db.query(RiderReview).filter(
-        RiderReview.rider_id == rider_id
-    ).all()
-    
-    week_reviews = [r for r in all_reviews if r.created_at >= week_ago]
-    month_reviews = [r for r in all_reviews if r.created_at >= month_ago]
-    
-    # Calculate averages
-    avg_all = sum(r.rating for r in all_reviews) / len(all_reviews) if all_reviews else 0
-    avg_month = sum(r.rating for r in month_reviews) / len(month_reviews) if month_reviews else 0
-    avg_week = sum(r.rating for r in week_reviews) / len(week_reviews) if week_reviews else 0
-    
-    # Completion rate
-    assigned_orders = db.query(Order).filter(
-        Order.assigned_rider_id == rider_id
-    ).count()
-    delivered_orders = db.query(Order).filter(
-        and_(
-            Order.assigned_rider_id == rider_id,
-            Order.status == OrderStatus.DELIVERED
-        )
-    ).count()
+    # All-time figures from rider_stats; windowed averages via SQL
+    total_reviews, avg_all = await _rating_totals(db, rider_id)
+    
+    avg_month, avg_week = (await db.execute(
+        select(
+            func.avg(case((RiderReview.created_at >= month_ago, RiderReview.rating))),
+            func.avg(case((RiderReview.created_at >= week_ago, RiderReview.rating)))
+        ).where(RiderReview.rider_id == rider_id)
+    )).one()
+    avg_month = float(avg_month or 0)
+    avg_week = float(avg_week or 0)
+    
+    # Completion rate, response time and delivery speed from one pass over
+    # the rider's order timestamps
+    order_rows = (await db.execute(
+        select(Order.status, Order.assigned_at, Order.picked_up_at, Order.delivered_at)
+        .where(Order.assigned_rider_id == rider_id)
+    )).all()
+    assigned_orders = len(order_rows)
+    delivered_orders = sum(1 for row in order_rows if row.status == OrderStatus.DELIVERED)
     completion_rate = (delivered_orders / assigned_orders * 100) if assigned_orders > 0 else 0
     
     # Response time (from assignment to pickup)
-    response_times = []
-    for order in db.query(Order).filter(Order.assigned_rider_id == rider_id).all():
-        if order.assigned_at and order.picked_up_at:
-            delta = (order.picked_up_at - order.assigned_at).total_seconds() / 60
-            response_times.append(delta)
+    response_times = [
+        (row.picked_up_at - row.assigned_at).total_seconds() / 60
+        for row in order_rows if row.assigned_at and row.picked_up_at
+    ]
     avg_response_time = sum(response_times) / len(response_times) if response_times else 0
     
     # Delivery speed (from pickup to delivery)
-    delivery_times = []
-    for order in db.query(Order).filter(Order.assigned_rider_id == rider_id).all():
-        if order.picked_up_at and order.delivered_at:
-            delta = (order.delivered_at - order.picked_up_at).total_seconds() / 60
-            delivery_times.append(delta)
+    delivery_times = [
+        (row.delivered_at - row.picked_up_at).total_seconds() / 60
+        for row in order_rows if row.picked_up_at and row.delivered_at
+    ]
     avg_delivery_time = sum(delivery_times) / len(delivery_times) if delivery_times else 0
     
     return RiderRatingStatsResponse(
         rider_id=rider_id,
         rider_name=rider.user.username if rider.user else "Unknown",
         average_rating=round(avg_all, 2),
-        total_reviews=len(all_reviews),
+        total_reviews=total_reviews,
         rating_trend={
             "week": round(avg_week, 2),
             "month": round(avg_month, 2),
@@ -364,12 +430,12 @@ async def list_rider_reviews(
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=50),
     filter: ReviewFilter = Query(ReviewFilter.ALL),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List all reviews for a rider with pagination."""
     
     # Get rider
-    rider = db.query(Rider).filter(Rider.id == rider_id).first()
+    rider = await db.get(Rider, rider_id)
     if not rider:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -377,22 +443,27 @@ async def list_rider_reviews(
         )
     
     # Build query
-    query = db.query(RiderReview).filter(RiderReview.rider_id == rider_id)
+    conditions = [RiderReview.rider_id == rider_id]
     
     # Apply filter
     if filter == ReviewFilter.POSITIVE:
-        query = query.filter(RiderReview.rating >= 4)
+        conditions.append(RiderReview.rating >= 4)
     elif filter == ReviewFilter.NEUTRAL:
-        query = query.filter(RiderReview.rating == 3)
+        conditions.append(RiderReview.rating == 3)
     elif filter == ReviewFilter.NEGATIVE:
-        query = query.filter(RiderReview.rating <= 2)
+        conditions.append(RiderReview.rating <= 2)
     
     # Get total count
-    total = query.count()
+    total = (await db.execute(
+        select(func.count(RiderReview.id)).where(*conditions)
+    )).scalar_one()
     
     # Paginate
     offset = (page - 1) * per_page
-    reviews = query.order_by(desc(RiderReview.created_at)).offset(offset).limit(per_page).all()
+    reviews = (await db.execute(
+        select(RiderReview).where(*conditions)
+        .order_by(desc(RiderReview.created_at)).offset(offset).limit(per_page)
+    )).scalars().all()
     
     review_responses = [
         ReviewResponse(
@@ -422,11 +493,11 @@ async def list_rider_reviews(
 @app.get("/reviews/{review_id}", response_model=ReviewResponse)
 async def get_review(
     review_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a single review by ID."""
     
-    review = db.query(RiderReview).filter(RiderReview.id == review_id).first()
+    review = await db.get(RiderReview, review_id)
     if not review:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
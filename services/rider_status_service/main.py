@@ -8,7 +8,7 @@ from pathlib import Path
 from fastapi import FastAPI, HTTPException, Depends
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 import logging
 
 # Add shared module to path
@@ -26,11 +26,16 @@ app = FastAPI(title="Rider Status Service")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MAX_BULK_RIDERS = 500
+
 class StatusUpdate(BaseModel):
     rider_id: str
     status: str  # online|offline|break
     set_by: str = "self"  # admin or self
 
+class BulkStatusRequest(BaseModel):
+    rider_ids: List[str]
+
 @app.get("/health")
 def health():
     return {"status": "ok", "service": "rider_status"}
@@ -67,6 +72,23 @@ def get_status(rider_id: str, db: Session = Depends(get_db)):
         "status": rider.status.value if hasattr(rider.status, 'value') else str(rider.status),
     }
 
+@app.post("/status/bulk")
+def get_bulk_status(req: BulkStatusRequest, db: Session = Depends(get_db)):
+    """Get statuses for many riders in one query (unknown riders are offline)."""
+    if len(req.rider_ids) > MAX_BULK_RIDERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_RIDERS} rider_ids per request")
+
+    found = {
+        rider_id: status.value if hasattr(status, 'value') else str(status)
+        for rider_id, status in db.query(Rider.id, Rider.status).filter(Rider.id.in_(req.rider_ids)).all()
+    } if req.rider_ids else {}
+    return {
+        "statuses": [
+            {"rider_id": rider_id, "status": found.get(rider_id, "offline")}
+            for rider_id in req.rider_ids
+        ]
+    }
+
 @app.get("/status/company/{company_id}")
 def get_company_status(company_id: str, db: Session = Depends(get_db)):
     """Get all rider statuses for a company."""
@@ -5,32 +5,45 @@ Provides live location tracking for deliveries with WebSocket connections
 for real-time updates, ETA calculation, and order status transitions.
 """
 
+import asyncio
 import os
 import sys
 import time
 import uuid
 import json
 import logging
+import heapq
 from pathlib import Path
-from typing import Optional, Dict, Set
+from typing import Optional, Dict, Set, List
 from datetime import datetime, timedelta
 from enum import Enum
-from collections import defaultdict
+from collections import defaultdict, deque
 
 from fastapi import FastAPI, HTTPException, status, Depends, WebSocket, WebSocketDisconnect, Header, Query
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, validator
 import jwt
-import httpx
 
 # Add parent directories to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from shared.auth import get_current_user, TokenPayload
+from shared.database import engine, Base
+from shared.models import TrackingPoint  # noqa: F401 - registers tracking_points for create_all
+from shared.auth import get_current_user, decode_token, TokenPayload
 from shared.security import setup_security_middleware
+from shared.http import http_client, setup_http_clients
+from shared.tracking_store import create_session_store
+from shared.pubsub import create_backplane
+from shared.tracking_frames import COMPACT_SUBPROTOCOL, encode_location_frame
+from shared.tracking_history import RouteRecorder, route_length_m, simplify_route
+from shared.eta import EtaEstimator, load_speed_profile
+from shared.geofence import GeofenceEngine
 from starlette.middleware.cors import CORSMiddleware
 
+# Create tables on startup (tracking_points)
+Base.metadata.create_all(bind=engine)
+
 app = FastAPI(title="Real-Time Tracking Service")
 
 # NOTE: We deliberately skip BaseHTTPMiddleware (SecurityHeadersMiddleware) here
@@ -43,6 +56,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+setup_http_clients(app)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -53,6 +67,33 @@ JWT_ALGO = "HS256"
 ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8400")
 NOTIFICATION_SERVICE_URL = os.environ.get("NOTIFICATION_SERVICE_URL", "http://localhost:8600")
 TRACKING_TTL_SECONDS = int(os.environ.get("TRACKING_TTL_SECONDS", 60 * 60 * 24))  # 24 hours
+MAX_BULK_RIDERS = 500
+# memory:// (single worker) or redis://host:6379/0 (shared by all replicas)
+TRACKING_STORE_URL = os.environ.get("TRACKING_STORE_URL", "memory://")
+# Session reaper: how often it runs, and the longest a watched session goes
+# without its expiry being re-read (another replica may have changed it)
+TRACKING_EVICT_INTERVAL_SECONDS = int(os.environ.get("TRACKING_EVICT_INTERVAL_SECONDS", "5"))
+TRACKING_REAP_RECHECK_SECONDS = int(os.environ.get("TRACKING_REAP_RECHECK_SECONDS", "300"))
+# Fan-out between replicas; defaults to the session store's Redis when there is one
+TRACKING_PUBSUB_URL = os.environ.get("TRACKING_PUBSUB_URL", TRACKING_STORE_URL)
+# Per-connection outbound buffering: frames queued per socket, and how long a
+# single send may block before the client is treated as stuck and disconnected
+WS_SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", "32"))
+WS_SEND_TIMEOUT_SECONDS = float(os.environ.get("WS_SEND_TIMEOUT_SECONDS", "10"))
+# Location frames per session: at most this many broadcasts per second, and
+# only once the rider has moved at least this far from the last broadcast fix
+TRACKING_MAX_BROADCAST_HZ = float(os.environ.get("TRACKING_MAX_BROADCAST_HZ", "1"))
+TRACKING_MIN_DISPLACEMENT_M = float(os.environ.get("TRACKING_MIN_DISPLACEMENT_M", "10"))
+# Location history: fixes buffered per session, flushed to tracking_points
+# every TRACKING_ROUTE_FLUSH_SECONDS or once TRACKING_ROUTE_FLUSH_BATCH are pending
+TRACKING_ROUTE_BUFFER_SIZE = int(os.environ.get("TRACKING_ROUTE_BUFFER_SIZE", "256"))
+TRACKING_ROUTE_FLUSH_SECONDS = float(os.environ.get("TRACKING_ROUTE_FLUSH_SECONDS", "5"))
+TRACKING_ROUTE_FLUSH_BATCH = int(os.environ.get("TRACKING_ROUTE_FLUSH_BATCH", "500"))
+# How often the hour-of-day speed profile is rebuilt from delivered orders
+ETA_PROFILE_REFRESH_SECONDS = int(os.environ.get("ETA_PROFILE_REFRESH_SECONDS", "3600"))
+
+# Application close code (4000-4999) sent to watchers when their session expires
+WS_CLOSE_SESSION_EXPIRED = 4410
 
 # ==================== Data Models ====================
 
@@ -69,6 +110,9 @@ class StartTrackingRequest(BaseModel):
     rider_id: str
     dropoff_lat: float = Field(..., ge=-90, le=90)
     dropoff_lng: float = Field(..., ge=-180, le=180)
+    # Optional for older clients; without it only dropoff arrival is detected
+    pickup_lat: Optional[float] = Field(None, ge=-90, le=90)
+    pickup_lng: Optional[float] = Field(None, ge=-180, le=180)
     phone: Optional[str] = None
 
 class LocationUpdate(BaseModel):
@@ -101,59 +145,512 @@ class TrackingResponse(BaseModel):
     dropoff: Dict
     eta_seconds: Optional[int]
     updated_at: int
+    arrivals: Optional[Dict] = None  # geofence event -> epoch seconds (None until it fires)
+
+class BulkRiderTrackingRequest(BaseModel):
+    """Rider IDs to look up active tracking for."""
+    rider_ids: List[str]
+
+class _Subscriber:
+    """
+    One websocket's outbound side: a bounded frame queue drained by its own
+    sender task, so a slow client only ever delays itself.
+    """
+    
+    def __init__(self, tracking_id: str, websocket: WebSocket, user_id: str, compact: bool = False):
+        self.tracking_id = tracking_id
+        self.websocket = websocket
+        self.user_id = user_id
+        self.compact = compact  # binary location frames (shared/tracking_frames.py)
+        # (enqueued_at, payload, is_location) — at most one location frame is queued
+        self.queue: deque = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.close_with: Optional[tuple] = None  # (code, reason) once the queue has drained
+        self.connected_at = time.monotonic()
+        
+        # Metrics
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+    
+    def offer(self, payload, is_location: bool):
+        """Queue a text (str) or binary (bytes) frame; a new location frame replaces a queued, unsent one."""
+        now = time.monotonic()
+        if is_location:
+            for i, (_, _, queued_location) in enumerate(self.queue):
+                if queued_location:
+                    # Keep the original enqueue time so lag reflects how stale the slot is
+                    self.queue[i] = (self.queue[i][0], payload, True)
+                    self.coalesced += 1
+                    return
+        if len(self.queue) >= WS_SEND_QUEUE_SIZE:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((now, payload, is_location))
+        self.wakeup.set()
+    
+    def metrics(self) -> dict:
+        return {
+            "tracking_id": self.tracking_id,
+            "user_id": self.user_id,
+            "protocol": "compact" if self.compact else "json",
+            "queue_depth": len(self.queue),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "connected_s": round(time.monotonic() - self.connected_at, 1)
+        }
 
 class ConnectionManager:
     """Manage WebSocket connections for real-time tracking."""
     
     def __init__(self):
-        # tracking_id -> set of connected websocket clients
-        self.active_connections: Dict[str, Set[WebSocket]] = defaultdict(set)
+        # tracking_id -> {websocket: subscriber}
+        self.active_connections: Dict[str, Dict[WebSocket, _Subscriber]] = defaultdict(dict)
         self.user_subscriptions: Dict[str, Set[str]] = defaultdict(set)  # user_id -> tracking_ids
+        self.slow_disconnects = 0
     
-    async def connect(self, tracking_id: str, websocket: WebSocket, user_id: str):
-        """Register a WebSocket connection."""
-        await websocket.accept()
-        self.active_connections[tracking_id].add(websocket)
+    async def connect(self, tracking_id: str, websocket: WebSocket, user_id: str,
+                      compact: bool = False, subprotocol: Optional[str] = None):
+        """Register a WebSocket connection and start its sender."""
+        await websocket.accept(subprotocol=subprotocol)
+        subscriber = _Subscriber(tracking_id, websocket, user_id, compact)
+        subscriber.task = asyncio.create_task(self._sender(subscriber))
+        self.active_connections[tracking_id][websocket] = subscriber
         self.user_subscriptions[user_id].add(tracking_id)
         logger.info(f"Client {user_id} connected to tracking {tracking_id}")
     
     def disconnect(self, tracking_id: str, websocket: WebSocket, user_id: str):
         """Unregister a WebSocket connection."""
-        self.active_connections[tracking_id].discard(websocket)
-        self.user_subscriptions[user_id].discard(tracking_id)
-        if not self.active_connections[tracking_id]:
+        subscriber = self.active_connections.get(tracking_id, {}).pop(websocket, None)
+        if subscriber is not None and subscriber.task is not None:
+            if subscriber.task is not asyncio.current_task():
+                subscriber.task.cancel()
+        if tracking_id in self.active_connections and not self.active_connections[tracking_id]:
             del self.active_connections[tracking_id]
+        self._unsubscribe_user(user_id, tracking_id)
         logger.info(f"Client {user_id} disconnected from tracking {tracking_id}")
     
-    async def broadcast(self, tracking_id: str, data: dict):
-        """Broadcast update to all connected clients."""
-        if tracking_id not in self.active_connections:
+    def _unsubscribe_user(self, user_id: str, tracking_id: str):
+        """Drop tracking_id from the user's subscriptions unless another of their sockets still watches it."""
+        subscribers = self.active_connections.get(tracking_id, {})
+        if any(sub.user_id == user_id for sub in subscribers.values()):
             return
+        tracking_ids = self.user_subscriptions.get(user_id)
+        if tracking_ids is not None:
+            tracking_ids.discard(tracking_id)
+            if not tracking_ids:
+                del self.user_subscriptions[user_id]
+    
+    async def close_tracking(self, tracking_id: str, code: int, reason: str) -> int:
+        """Close every local socket watching tracking_id; returns how many were closed."""
+        subscribers = self.active_connections.pop(tracking_id, {})
+        for subscriber in subscribers.values():
+            if subscriber.task is not None:
+                subscriber.task.cancel()
+            self._unsubscribe_user(subscriber.user_id, tracking_id)
         
-        disconnected = set()
-        for connection in self.active_connections[tracking_id]:
+        async def _close(websocket: WebSocket):
             try:
-                await connection.send_json(data)
-            except Exception as e:
-                logger.error(f"Error broadcasting: {e}")
-                disconnected.add(connection)
+                await asyncio.wait_for(websocket.close(code=code, reason=reason), timeout=1.0)
+            except Exception:
+                pass  # already gone
         
-        # Remove disconnected connections
-        for connection in disconnected:
-            self.active_connections[tracking_id].discard(connection)
+        await asyncio.gather(*(_close(websocket) for websocket in subscribers))
+        if subscribers:
+            logger.info(f"Closed {len(subscribers)} connection(s) to tracking {tracking_id}: {reason}")
+        return len(subscribers)
+    
+    async def close(self, tracking_id: str, websocket: WebSocket, user_id: str, code: int, reason: str):
+        """
+        Close one connection from its sender task once the frames already
+        queued for it (e.g. a final error) have gone out, so nothing writes
+        to the socket concurrently; then unregister it.
+        """
+        subscriber = self.active_connections.get(tracking_id, {}).get(websocket)
+        if subscriber is not None and subscriber.task is not None:
+            subscriber.close_with = (code, reason)
+            subscriber.wakeup.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(subscriber.task), timeout=WS_SEND_TIMEOUT_SECONDS + 1)
+            except Exception:
+                pass  # sender already gone, or stuck (disconnect cancels it)
+        self.disconnect(tracking_id, websocket, user_id)
+    
+    def send(self, tracking_id: str, websocket: WebSocket, data: dict):
+        """Queue a message for one connection, behind anything already queued."""
+        subscriber = self.active_connections.get(tracking_id, {}).get(websocket)
+        if subscriber is not None:
+            subscriber.offer(json.dumps(data), is_location=False)
+    
+    async def broadcast(self, tracking_id: str, data: dict):
+        """
+        Queue an update for every local client of tracking_id without waiting
+        on any of them. The payload is serialised once per protocol; each
+        client's sender task delivers it, coalescing location frames the
+        client hasn't taken yet.
+        """
+        subscribers = self.active_connections.get(tracking_id)
+        if not subscribers:
+            return
+        text = json.dumps(data)
+        is_location = data.get("type") == "location_update"
+        packed = None
+        for subscriber in subscribers.values():
+            if subscriber.compact and is_location:
+                if packed is None:
+                    packed = encode_location_frame(data["data"])
+                subscriber.offer(packed, True)
+            else:
+                subscriber.offer(text, is_location)
     
     async def broadcast_to_user(self, user_id: str, data: dict):
         """Broadcast to all trackings subscribed by a user."""
         for tracking_id in self.user_subscriptions.get(user_id, set()):
             await self.broadcast(tracking_id, data)
+    
+    async def _sender(self, subscriber: _Subscriber):
+        """Drain one connection's queue; disconnect it if a send stays stuck."""
+        websocket = subscriber.websocket
+        try:
+            while True:
+                await subscriber.wakeup.wait()
+                subscriber.wakeup.clear()
+                while subscriber.queue:
+                    enqueued_at, payload, _ = subscriber.queue.popleft()
+                    send = websocket.send_bytes(payload) if isinstance(payload, bytes) else websocket.send_text(payload)
+                    await asyncio.wait_for(send, timeout=WS_SEND_TIMEOUT_SECONDS)
+                    subscriber.sent += 1
+                    subscriber.last_lag_ms = (time.monotonic() - enqueued_at) * 1000
+                    subscriber.max_lag_ms = max(subscriber.max_lag_ms, subscriber.last_lag_ms)
+                if subscriber.close_with is not None:
+                    code, reason = subscriber.close_with
+                    try:
+                        await asyncio.wait_for(websocket.close(code=code, reason=reason), timeout=1.0)
+                    except Exception:
+                        pass  # already gone
+                    return
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.slow_disconnects += 1
+            logger.warning(
+                f"Disconnecting slow client {subscriber.user_id} from tracking {subscriber.tracking_id} "
+                f"(send blocked > {WS_SEND_TIMEOUT_SECONDS}s)"
+            )
+            self.disconnect(subscriber.tracking_id, websocket, subscriber.user_id)
+            try:
+                await asyncio.wait_for(websocket.close(code=1013, reason="Client too slow"), timeout=1.0)
+            except Exception:
+                pass
+        except Exception as e:
+            logger.error(f"Error sending to {subscriber.user_id} on tracking {subscriber.tracking_id}: {e}")
+            self.disconnect(subscriber.tracking_id, websocket, subscriber.user_id)
+    
+    def metrics(self) -> dict:
+        """Totals across connections, for /stats/tracking."""
+        subscribers = [sub for subs in self.active_connections.values() for sub in subs.values()]
+        return {
+            "connections": len(subscribers),
+            "subscribed_users": len(self.user_subscriptions),
+            "queued_frames": sum(len(sub.queue) for sub in subscribers),
+            "sent_total": sum(sub.sent for sub in subscribers),
+            "coalesced_total": sum(sub.coalesced for sub in subscribers),
+            "dropped_total": sum(sub.dropped for sub in subscribers),
+            "max_lag_ms": round(max((sub.max_lag_ms for sub in subscribers), default=0.0), 1),
+            "slow_disconnects": self.slow_disconnects
+        }
+    
+    def connection_metrics(self, limit: int) -> List[dict]:
+        """Per-connection metrics, laggiest first."""
+        subscribers = [sub for subs in self.active_connections.values() for sub in subs.values()]
+        subscribers.sort(key=lambda sub: (sub.last_lag_ms, len(sub.queue)), reverse=True)
+        return [sub.metrics() for sub in subscribers[:limit]]
 
 # ==================== Connection Manager ====================
 
 connection_manager = ConnectionManager()
 
-# ==================== In-Memory Storage ====================
+# Updates are published here and delivered to local sockets by every replica's
+# subscription (including the publisher's own), never broadcast directly
+backplane = create_backplane(TRACKING_PUBSUB_URL)
+
+async def _publish_update(tracking_id: str, message: dict):
+    """Send an update to the watchers of tracking_id on every replica."""
+    try:
+        await backplane.publish(tracking_id, message)
+    except Exception as e:
+        logger.error(f"Failed to publish update for {tracking_id}: {e}")
+
+# ==================== Session Store ====================
+
+session_store = create_session_store(TRACKING_STORE_URL)
+
+async def _load_session(tracking_id: str) -> Optional[dict]:
+    """Fetch a session from the store (status restored to OrderStatus)."""
+    session = await session_store.get(tracking_id)
+    if session is not None:
+        session["status"] = OrderStatus(session["status"])
+    return session
+
+async def _latest_active_for_riders(rider_ids: List[str]) -> Dict[str, dict]:
+    """rider_id -> most recently updated unexpired session, via the store's rider index."""
+    now = _now_ts()
+    latest = {}
+    for rider_id, sessions in (await session_store.sessions_for_riders(rider_ids)).items():
+        active = [s for s in sessions if now <= s["expires_at"]]
+        if active:
+            session = max(active, key=lambda s: s["updated_at"])
+            session["status"] = OrderStatus(session["status"])
+            latest[rider_id] = session
+    return latest
+
+# ==================== Session Reaper ====================
+
+class SessionReaper:
+    """
+    Ends the local side of expired sessions: closes their websockets with
+    WS_CLOSE_SESSION_EXPIRED and releases their route history ring, then
+    lets the store evict the session itself once its grace period is over.
+    
+    Sessions with local state are watched on a heap of (due, tracking_id)
+    holding at most one live entry per session, so each pass only looks at
+    sessions that are actually due. A due session is re-read from the store
+    first: if its expiry moved (DELIVERED, or an update on another replica)
+    it is simply watched again.
+    """
+    
+    def __init__(self, recheck_seconds: int):
+        self.recheck_seconds = recheck_seconds
+        self._heap: List[tuple] = []      # (due, tracking_id); superseded entries skipped lazily
+        self._due: Dict[str, int] = {}    # live heap entry per session
+        
+        # Metrics
+        self.expired_total = 0
+        self.sockets_closed_total = 0
+        self.evicted_total = 0
+        self.last_run_ms = 0.0
+    
+    def watch(self, tracking_id: str, expires_at: int):
+        """Make sure tracking_id is looked at once it expires (or within recheck_seconds)."""
+        due = min(expires_at, _now_ts() + self.recheck_seconds) + 1
+        current = self._due.get(tracking_id)
+        # A later entry is re-examined when the earlier one fires
+        if current is None or due < current:
+            self._due[tracking_id] = due
+            heapq.heappush(self._heap, (due, tracking_id))
+    
+    def _has_local_state(self, tracking_id: str) -> bool:
+        return tracking_id in connection_manager.active_connections or tracking_id in route_recorder.rings
+    
+    async def reap(self, now: Optional[int] = None) -> int:
+        """Expire due sessions and evict those past their grace period; returns sessions expired."""
+        started = time.perf_counter()
+        now = _now_ts() if now is None else now
+        try:
+            self.evicted_total += await session_store.evict_expired(now)
+        except Exception as e:
+            logger.error(f"Tracking session eviction error: {e}")
+        
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            due, tracking_id = heapq.heappop(self._heap)
+            if self._due.get(tracking_id) == due:
+                del self._due[tracking_id]
+                if self._has_local_state(tracking_id):
+                    due_ids.append(tracking_id)
+        
+        # Whole batch at once, so a backlog doesn't cost one event loop turn per session
+        sessions = await asyncio.gather(*(session_store.get(t) for t in due_ids), return_exceptions=True)
+        expired = []
+        for tracking_id, session in zip(due_ids, sessions):
+            if isinstance(session, Exception):
+                logger.error(f"Session reaper could not load {tracking_id}: {session}")
+                self.watch(tracking_id, now)
+            elif session is not None and now <= session["expires_at"]:
+                self.watch(tracking_id, session["expires_at"])
+            else:
+                expired.append(tracking_id)
+        
+        closed = await asyncio.gather(*(
+            connection_manager.close_tracking(t, WS_CLOSE_SESSION_EXPIRED, "Tracking session expired")
+            for t in expired
+        ))
+        for tracking_id in expired:
+            route_recorder.finish(tracking_id)
+        self.expired_total += len(expired)
+        self.sockets_closed_total += sum(closed)
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        return len(expired)
+    
+    def stats(self) -> dict:
+        return {
+            "watched_sessions": len(self._due),
+            "heap_entries": len(self._heap),
+            "expired_total": self.expired_total,
+            "sockets_closed_total": self.sockets_closed_total,
+            "evicted_total": self.evicted_total,
+            "last_run_ms": round(self.last_run_ms, 2)
+        }
+
+session_reaper = SessionReaper(TRACKING_REAP_RECHECK_SECONDS)
+
+async def reap_expired_sessions():
+    """Periodically close out expired sessions and evict those past their grace period."""
+    while True:
+        await asyncio.sleep(TRACKING_EVICT_INTERVAL_SECONDS)
+        try:
+            evicted_before = session_reaper.evicted_total
+            expired = await session_reaper.reap()
+            evicted = session_reaper.evicted_total - evicted_before
+            if expired or evicted:
+                logger.info(
+                    f"Session reaper: {expired} expired, {evicted} evicted, "
+                    f"{session_reaper.stats()['watched_sessions']} still watched"
+                )
+        except Exception as e:
+            logger.error(f"Session reaper error: {e}")
+
+# ==================== ETA Model ====================
+
+eta_estimator = EtaEstimator()
+
+async def refresh_eta_profile():
+    """Rebuild the hour-of-day speed profile from recent deliveries, now and periodically."""
+    while True:
+        try:
+            eta_estimator.profile = await load_speed_profile(route_factor=eta_estimator.route_factor)
+            logger.info(f"ETA speed profile loaded from {sum(eta_estimator.profile.samples)} deliveries")
+        except Exception as e:
+            logger.error(f"ETA speed profile refresh failed: {e}")
+        await asyncio.sleep(ETA_PROFILE_REFRESH_SECONDS)
+
+# ==================== Geofences ====================
+
+geofence_engine = GeofenceEngine()
+
+# Order-service arrival reports still in flight (held so they aren't garbage-collected)
+_arrival_reports: Set[asyncio.Task] = set()
+
+def _can_update(session: dict, user: Optional[TokenPayload]) -> bool:
+    """True if user is the session's rider or a superadmin."""
+    if user is None:
+        return False
+    # session["rider_user_id"] is users.id; session["rider_id"] is riders profile id
+    return (
+        user.user_id == session.get("rider_user_id")
+        or user.user_id == session.get("rider_id")  # fallback
+        or user.role in ("superadmin", "SUPERADMIN")
+    )
+
+def _check_geofences(session: dict) -> List[dict]:
+    """
+    Evaluate the session's current fix against its pickup/dropoff fences.
+    Call after the fix and any status change are applied, before the
+    session is saved (fence hit counts live on the session).
+    
+    Returns:
+        Arrival events fired by this fix
+    """
+    fix = session.get("current_location")
+    if not fix:
+        return []
+    return geofence_engine.evaluate(session, fix)
+
+async def _report_arrival(order_id: str, event: dict, authorization: Optional[str]):
+    """Record an arrival on the order (first report wins there)."""
+    try:
+        async with http_client(timeout=5.0) as client:
+            response = await client.post(
+                f"{ORDER_SERVICE_URL}/orders/{order_id}/events",
+                json=event,
+                headers={"Authorization": authorization} if authorization else None,
+                timeout=5.0
+            )
+        if not response.is_success:
+            logger.error(
+                f"Order service rejected {event['event']} for order {order_id}: "
+                f"{response.status_code} {response.text[:200]}"
+            )
+    except Exception as e:
+        logger.error(f"Failed to send {event['event']} to order service: {e}")
+
+async def _announce_arrivals(session: dict, events: List[dict], authorization: Optional[str] = None):
+    """
+    Tell watchers about arrivals, and report them to the order service in
+    the background so a slow order service doesn't hold up the location
+    update. Call after the session is saved.
+    """
+    for event in events:
+        logger.info(f"Order {session['order_id']}: {event['event']} at {event['at']}")
+        await _publish_update(session["tracking_id"], {
+            "type": "geofence_event",
+            "data": {
+                "tracking_id": session["tracking_id"],
+                "order_id": session["order_id"],
+                "event": event["event"],
+                "at": event["at"],
+                "location": {"lat": event["lat"], "lng": event["lng"]}
+            }
+        })
+        task = asyncio.create_task(_report_arrival(session["order_id"], event, authorization))
+        _arrival_reports.add(task)
+        task.add_done_callback(_arrival_reports.discard)
+
+# ==================== Location History ====================
+
+route_recorder = RouteRecorder(
+    capacity=TRACKING_ROUTE_BUFFER_SIZE,
+    batch_size=TRACKING_ROUTE_FLUSH_BATCH,
+    idle_seconds=TRACKING_TTL_SECONDS
+)
+_route_flush_due = asyncio.Event()
 
-tracking_sessions: Dict[str, dict] = {}
+def _record_fix(tracking_id: str, location: dict):
+    """Buffer a fix for the route history, waking the flusher when a batch is ready."""
+    if route_recorder.record(tracking_id, location["timestamp"], location["lat"], location["lng"]):
+        _route_flush_due.set()
+
+def _apply_fix(tracking_id: str, session: dict, update: "LocationUpdate"):
+    """Make a fix the session's current location, feeding the ETA model and route history."""
+    fix = {
+        "lat": update.lat,
+        "lng": update.lng,
+        "timestamp": update.timestamp or _now_ts()
+    }
+    session["eta"] = eta_estimator.observe(session.get("eta"), session.get("current_location"), fix)
+    session["current_location"] = fix
+    _record_fix(tracking_id, fix)
+    session_reaper.watch(tracking_id, session["expires_at"])
+
+async def flush_route_history():
+    """Periodically write buffered fixes to tracking_points."""
+    while True:
+        try:
+            await asyncio.wait_for(_route_flush_due.wait(), timeout=TRACKING_ROUTE_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _route_flush_due.clear()
+        await route_recorder.flush()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    logger.info(f"Tracking session store: {session_store.backend}, backplane: {backplane.backend}")
+    await backplane.start(connection_manager.broadcast)
+    asyncio.create_task(reap_expired_sessions())
+    asyncio.create_task(flush_route_history())
+    asyncio.create_task(refresh_eta_profile())
+
+@app.on_event("shutdown")
+async def close_session_store():
+    await route_recorder.flush()
+    await backplane.close()
+    await session_store.close()
 
 # ==================== Helper Functions ====================
 
@@ -176,13 +673,17 @@ def _haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> f
     
     return R * c
 
-def _calculate_eta(current_lat: float, current_lng: float, dropoff_lat: float, dropoff_lng: float) -> int:
-    """Calculate ETA in seconds assuming 30 km/h average speed."""
-    distance_km = _haversine_distance(current_lat, current_lng, dropoff_lat, dropoff_lng)
-    # 30 km/h = 0.5 km/min = 0.00833 km/sec
-    speed_km_per_sec = 30 / 3600
-    eta_seconds = int(distance_km / speed_km_per_sec) if speed_km_per_sec > 0 else 0
-    return max(60, eta_seconds)  # Minimum 60 seconds
+def _calculate_eta(current_lat: float, current_lng: float, dropoff_lat: float, dropoff_lng: float,
+                   eta_state: Optional[dict] = None, ts: Optional[int] = None) -> int:
+    """
+    Calculate ETA in seconds (see shared/eta.py).
+    
+    Blends the rider's observed speed (eta_state) with the hour-of-day
+    profile for ts, over the straight-line distance scaled to road distance.
+    """
+    return eta_estimator.estimate(
+        eta_state, current_lat, current_lng, dropoff_lat, dropoff_lng, ts or _now_ts()
+    )
 
 def _get_session_data(session: dict) -> dict:
     """Format session data for response."""
@@ -193,7 +694,10 @@ def _get_session_data(session: dict) -> dict:
     
     eta = None
     if lat is not None and lng is not None:
-        eta = _calculate_eta(lat, lng, dropoff.get("lat", 0), dropoff.get("lng", 0))
+        eta = _calculate_eta(
+            lat, lng, dropoff.get("lat", 0), dropoff.get("lng", 0),
+            session.get("eta"), current_loc.get("timestamp")
+        )
     
     return {
         "tracking_id": session["tracking_id"],
@@ -203,9 +707,109 @@ def _get_session_data(session: dict) -> dict:
         "current_location": session.get("current_location"),
         "dropoff": dropoff,
         "eta_seconds": eta,
-        "updated_at": session["updated_at"]
+        "updated_at": session["updated_at"],
+        "arrivals": {fence["event"]: fence["fired_at"] for fence in session.get("geofences") or []}
     }
 
+# ==================== Location Coalescing ====================
+
+class LocationCoalescer:
+    """
+    Decides which location fixes become websocket frames. Every fix is saved
+    to the session; a frame goes out at most once per min_interval per
+    session and only if the rider moved min_displacement_m since the last
+    frame. Fixes held back inside the interval are flushed as one trailing
+    frame carrying the latest position. Status changes always go out.
+    
+    The last broadcast time/position live in the session itself
+    (broadcast_at / broadcast_location), so replicas sharing a store
+    throttle together.
+    """
+    
+    def __init__(self, max_rate_hz: float, min_displacement_m: float):
+        self.min_interval = 1.0 / max_rate_hz if max_rate_hz > 0 else 0.0
+        self.min_displacement_m = min_displacement_m
+        self._pending: Dict[str, asyncio.Task] = {}  # tracking_id -> trailing flush
+        
+        # Metrics
+        self.fixes_total = 0
+        self.frames_total = 0
+        self.suppressed_total = 0
+        self.trailing_flushes = 0
+    
+    def _moved(self, session: dict) -> bool:
+        last = session.get("broadcast_location")
+        loc = session.get("current_location")
+        if not last or not loc:
+            return True
+        distance_m = _haversine_distance(last["lat"], last["lng"], loc["lat"], loc["lng"]) * 1000
+        return distance_m >= self.min_displacement_m
+    
+    def _mark_broadcast(self, session: dict, now: float):
+        loc = session.get("current_location") or {}
+        session["broadcast_at"] = now
+        session["broadcast_location"] = {"lat": loc.get("lat"), "lng": loc.get("lng")} if loc else None
+        self.frames_total += 1
+    
+    def admit(self, session: dict, status_changed: bool = False) -> bool:
+        """
+        Record a fix already applied to session; True if it should be broadcast now.
+        Call before saving the session, since a True result updates its broadcast fields.
+        """
+        self.fixes_total += 1
+        now = time.time()
+        last_at = session.get("broadcast_at")
+        
+        if status_changed or last_at is None:
+            self._mark_broadcast(session, now)
+            return True
+        if not self._moved(session):
+            self.suppressed_total += 1
+            return False
+        if now - last_at >= self.min_interval:
+            self._mark_broadcast(session, now)
+            return True
+        
+        self.suppressed_total += 1
+        self._schedule_flush(session["tracking_id"], last_at + self.min_interval - now)
+        return False
+    
+    def _schedule_flush(self, tracking_id: str, delay: float):
+        if tracking_id not in self._pending:
+            self._pending[tracking_id] = asyncio.create_task(self._flush_later(tracking_id, delay))
+    
+    async def _flush_later(self, tracking_id: str, delay: float):
+        """Broadcast the latest held-back fix once the interval has passed."""
+        try:
+            await asyncio.sleep(delay)
+            session = await _load_session(tracking_id)
+            if session is None or _now_ts() > session["expires_at"] or not self._moved(session):
+                return
+            self._mark_broadcast(session, time.time())
+            self.trailing_flushes += 1
+            await session_store.put(session)
+            await _publish_update(tracking_id, {
+                "type": "location_update",
+                "data": _get_session_data(session)
+            })
+        except Exception as e:
+            logger.error(f"Trailing location flush failed for {tracking_id}: {e}")
+        finally:
+            self._pending.pop(tracking_id, None)
+    
+    def stats(self) -> dict:
+        return {
+            "max_broadcast_hz": TRACKING_MAX_BROADCAST_HZ,
+            "min_displacement_m": self.min_displacement_m,
+            "fixes_total": self.fixes_total,
+            "frames_total": self.frames_total,
+            "suppressed_total": self.suppressed_total,
+            "trailing_flushes": self.trailing_flushes,
+            "pending_flushes": len(self._pending)
+        }
+
+location_coalescer = LocationCoalescer(TRACKING_MAX_BROADCAST_HZ, TRACKING_MIN_DISPLACEMENT_M)
+
 # ==================== Health Check ====================
 
 @app.get("/health")
@@ -239,15 +843,19 @@ async def start_tracking(
         "updated_at": _now_ts(),
         "expires_at": expires_at
     }
+    pickup = None
+    if request.pickup_lat is not None and request.pickup_lng is not None:
+        pickup = {"lat": request.pickup_lat, "lng": request.pickup_lng}
+    geofence_engine.register(session, pickup, session["dropoff"])
     
-    tracking_sessions[tracking_id] = session
+    await session_store.put(session)
     
     logger.info(f"Tracking started: {tracking_id} (order={request.order_id}, rider={request.rider_id})")
     
     # Notify via SMS if phone provided
     if request.phone and NOTIFICATION_SERVICE_URL:
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with http_client(timeout=5.0) as client:
                 await client.post(
                     f"{NOTIFICATION_SERVICE_URL}/notify/sms",
                     json={
@@ -267,11 +875,12 @@ async def start_tracking(
 async def update_tracking(
     tracking_id: str,
     update: LocationUpdate,
-    current_user: TokenPayload = Depends(get_current_user)
+    current_user: TokenPayload = Depends(get_current_user),
+    authorization: Optional[str] = Header(None)
 ):
     """Update location and optionally status for a tracking session."""
     
-    session = tracking_sessions.get(tracking_id)
+    session = await _load_session(tracking_id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -285,26 +894,17 @@ async def update_tracking(
         )
     
     # Verify authorization (rider or superadmin)
-    # session["rider_user_id"] is users.id; session["rider_id"] is riders profile id
-    authorized = (
-        current_user.user_id == session.get("rider_user_id")
-        or current_user.user_id == session.get("rider_id")  # fallback
-        or current_user.role in ("superadmin", "SUPERADMIN")
-    )
-    if not authorized:
+    if not _can_update(session, current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to update this tracking"
         )
     
     # Update location
-    session["current_location"] = {
-        "lat": update.lat,
-        "lng": update.lng,
-        "timestamp": update.timestamp or _now_ts()
-    }
+    _apply_fix(tracking_id, session, update)
     
     # Update status if provided
+    status_changed = bool(update.status) and update.status != session["status"]
     if update.status:
         old_status = session["status"]
         session["status"] = update.status
@@ -314,8 +914,11 @@ async def update_tracking(
         # Notify order service of status change
         if update.status == OrderStatus.DELIVERED:
             session["expires_at"] = _now_ts() + 3600  # Expire in 1 hour after delivery
+            session_reaper.watch(tracking_id, session["expires_at"])
+            if status_changed:
+                eta_estimator.observe_delivery(session.get("eta"), session["dropoff"]["lat"], session["dropoff"]["lng"])
             try:
-                async with httpx.AsyncClient(timeout=5.0) as client:
+                async with http_client(timeout=5.0) as client:
                     await client.put(
                         f"{ORDER_SERVICE_URL}/orders/{session['order_id']}/status",
                         json={"status": "DELIVERED"},
@@ -324,14 +927,19 @@ async def update_tracking(
             except Exception as e:
                 logger.error(f"Failed to update order service: {e}")
     
+    arrivals = _check_geofences(session)
     session["updated_at"] = _now_ts()
+    broadcast = location_coalescer.admit(session, status_changed)
+    await session_store.put(session)
+    await _announce_arrivals(session, arrivals, authorization)
     
-    # Broadcast to all connected clients
+    # Broadcast to all connected clients, on every replica (unless coalesced)
     response_data = _get_session_data(session)
-    await connection_manager.broadcast(tracking_id, {
-        "type": "location_update",
-        "data": response_data
-    })
+    if broadcast:
+        await _publish_update(tracking_id, {
+            "type": "location_update",
+            "data": response_data
+        })
     
     return response_data
 
@@ -341,7 +949,7 @@ async def update_tracking(
 async def get_tracking(tracking_id: str):
     """Get current tracking status (public endpoint)."""
     
-    session = tracking_sessions.get(tracking_id)
+    session = await _load_session(tracking_id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -366,33 +974,114 @@ async def get_rider_tracking(
     """Get current active tracking for a rider."""
     
     # Find latest active session for this rider
-    active_sessions = [
-        s for s in tracking_sessions.values()
-        if s["rider_id"] == rider_id and _now_ts() <= s["expires_at"]
-    ]
-    
-    if not active_sessions:
+    latest = (await _latest_active_for_riders([rider_id])).get(rider_id)
+    if latest is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No active tracking session for this rider"
         )
     
-    latest = max(active_sessions, key=lambda s: s["updated_at"])
     return _get_session_data(latest)
 
+@app.post("/tracking/riders/bulk")
+async def get_bulk_rider_tracking(
+    request: BulkRiderTrackingRequest,
+    current_user: TokenPayload = Depends(get_current_user)
+):
+    """Latest active tracking session for each rider (riders without one are omitted)."""
+    
+    if len(request.rider_ids) > MAX_BULK_RIDERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_RIDERS} rider_ids per request"
+        )
+    
+    latest = await _latest_active_for_riders(request.rider_ids)
+    
+    return {
+        "sessions": {rider_id: _get_session_data(s) for rider_id, s in latest.items()}
+    }
+
+@app.get("/tracking/order/{order_id}", response_model=TrackingResponse)
+async def get_order_tracking(
+    order_id: str,
+    current_user: TokenPayload = Depends(get_current_user)
+):
+    """Latest tracking session for an order."""
+    
+    session = await session_store.session_for_order(order_id)
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No tracking session for this order"
+        )
+    
+    session["status"] = OrderStatus(session["status"])
+    return _get_session_data(session)
+
+# ==================== Route History ====================
+
+@app.get("/tracking/{tracking_id}/route")
+async def get_tracking_route(
+    tracking_id: str,
+    tolerance_m: float = Query(5.0, ge=0, le=1000),
+    since: Optional[int] = Query(None, description="Only fixes at or after this epoch second")
+):
+    """
+    Route travelled so far as a downsampled polyline (public, like GET /tracking/{id}).
+
+    Query Parameters:
+    - tolerance_m: Douglas-Peucker tolerance; 0 returns every fix
+    - since: Return only the route from this time on
+
+    Fixes other replicas haven't flushed yet (at most TRACKING_ROUTE_FLUSH_SECONDS
+    old) are missing until their next flush.
+    """
+    session = await _load_session(tracking_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tracking session not found"
+        )
+    
+    try:
+        points = await route_recorder.route(tracking_id)
+    except Exception as e:
+        logger.error(f"Failed to load route for {tracking_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Route history unavailable"
+        )
+    if since is not None:
+        points = [p for p in points if p[0] >= since]
+    
+    simplified = simplify_route(points, tolerance_m)
+    return {
+        "tracking_id": tracking_id,
+        "status": session["status"].value,
+        "distance_m": round(route_length_m(points), 1),
+        "raw_points": len(points),
+        "tolerance_m": tolerance_m,
+        # [lat, lng, ts] per vertex, oldest first
+        "points": [[lat, lng, ts] for ts, lat, lng in simplified]
+    }
+
 # ==================== WebSocket Endpoint ====================
 
 @app.websocket("/ws/tracking/{tracking_id}")
 async def websocket_endpoint(
     tracking_id: str,
     websocket: WebSocket,
-    token: Optional[str] = Query(None)
+    token: Optional[str] = Query(None),
+    protocol: Optional[str] = Query(None)
 ):
     """
     WebSocket endpoint for real-time tracking updates.
     
     Query Parameters:
     - token: JWT token for authentication
+    - protocol: "compact" for binary location frames (same as requesting the
+      anomaah.compact.v1 subprotocol); initial_state, pong and errors stay JSON
     
     Message Types:
     - location_update: {lat, lng, status}
@@ -400,7 +1089,8 @@ async def websocket_endpoint(
     """
     
     # Verify tracking session exists
-    if tracking_id not in tracking_sessions:
+    session = await _load_session(tracking_id)
+    if session is None:
         await websocket.close(code=1008, reason="Tracking session not found")
         return
     
@@ -417,30 +1107,35 @@ async def websocket_endpoint(
             await websocket.close(code=1008, reason="Invalid token")
             return
     
-    # Accept connection
-    await connection_manager.connect(tracking_id, websocket, user_id)
+    # Platform identity behind the token (None for anonymous watchers)
+    rider = decode_token(token) if token else None
     
-    # Send initial state
-    session = tracking_sessions.get(tracking_id)
-    if session:
-        await websocket.send_json({
-            "type": "initial_state",
-            "data": _get_session_data(session)
-        })
+    # Accept connection, negotiating the compact frame protocol if asked for
+    subprotocol = COMPACT_SUBPROTOCOL if COMPACT_SUBPROTOCOL in websocket.scope.get("subprotocols", []) else None
+    compact = subprotocol is not None or protocol == "compact"
+    await connection_manager.connect(tracking_id, websocket, user_id, compact=compact, subprotocol=subprotocol)
+    session_reaper.watch(tracking_id, session["expires_at"])
+    
+    # Send initial state (queued, so it always precedes broadcast updates)
+    connection_manager.send(tracking_id, websocket, {
+        "type": "initial_state",
+        "data": _get_session_data(session)
+    })
     
     try:
         while True:
             data = await websocket.receive_json()
             
-            # Verify tracking still exists and hasn't expired
-            if tracking_id not in tracking_sessions:
-                await websocket.send_json({"type": "error", "message": "Tracking expired"})
-                break
-            
-            session = tracking_sessions.get(tracking_id)
-            if not session or _now_ts() > session["expires_at"]:
-                await websocket.send_json({"type": "error", "message": "Tracking session expired"})
-                break
+            # Verify tracking still exists and hasn't expired; the error is queued
+            # behind pending frames and the sender closes the socket after it
+            session = await _load_session(tracking_id)
+            if session is None or _now_ts() > session["expires_at"]:
+                message = "Tracking expired" if session is None else "Tracking session expired"
+                connection_manager.send(tracking_id, websocket, {"type": "error", "message": message})
+                await connection_manager.close(
+                    tracking_id, websocket, user_id, WS_CLOSE_SESSION_EXPIRED, "Tracking session expired"
+                )
+                return
             
             # Handle location update
             if data.get("type") == "location_update":
@@ -453,30 +1148,36 @@ async def websocket_endpoint(
                     )
                     
                     # Update session
-                    session["current_location"] = {
-                        "lat": update.lat,
-                        "lng": update.lng,
-                        "timestamp": update.timestamp or _now_ts()
-                    }
+                    _apply_fix(tracking_id, session, update)
                     
+                    status_changed = bool(update.status) and update.status != session["status"]
                     if update.status:
                         session["status"] = update.status
+                    if status_changed and update.status == OrderStatus.DELIVERED:
+                        eta_estimator.observe_delivery(session.get("eta"), session["dropoff"]["lat"], session["dropoff"]["lng"])
                     
+                    # Only the rider's own fixes can fire arrivals (and the order
+                    # service needs their token to record them)
+                    arrivals = _check_geofences(session) if _can_update(session, rider) else []
                     session["updated_at"] = _now_ts()
+                    broadcast = location_coalescer.admit(session, status_changed)
+                    await session_store.put(session)
+                    await _announce_arrivals(session, arrivals, f"Bearer {token}" if token else None)
                     
-                    # Broadcast to all subscribers
-                    await connection_manager.broadcast(tracking_id, {
-                        "type": "location_update",
-                        "data": _get_session_data(session)
-                    })
+                    # Broadcast to all subscribers, on every replica (unless coalesced)
+                    if broadcast:
+                        await _publish_update(tracking_id, {
+                            "type": "location_update",
+                            "data": _get_session_data(session)
+                        })
                 
                 except Exception as e:
                     logger.error(f"Error processing location update: {e}")
-                    await websocket.send_json({"type": "error", "message": str(e)})
+                    connection_manager.send(tracking_id, websocket, {"type": "error", "message": str(e)})
             
             # Handle ping (keep-alive)
             elif data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
+                connection_manager.send(tracking_id, websocket, {"type": "pong"})
     
     except WebSocketDisconnect:
         connection_manager.disconnect(tracking_id, websocket, user_id)
@@ -499,43 +1200,43 @@ async def get_tracking_stats(
             detail="Admin only"
         )
     
-    now = _now_ts()
-    active_sessions = [s for s in tracking_sessions.values() if now <= s["expires_at"]]
+    # Maintained incrementally by the store; no scan over sessions
+    counts = await session_store.counts()
     
     # Active connections
-    total_connections = sum(len(conns) for conns in connection_manager.active_connections.values())
-    
-    # Status distribution
-    status_counts = defaultdict(int)
-    for session in active_sessions:
-        status_counts[session["status"].value] += 1
-    
-    # Sessions by age
-    sessions_by_age = {
-        "last_5_min": 0,
-        "last_hour": 0,
-        "older": 0
-    }
-    
-    five_min_ago = now - 300
-    hour_ago = now - 3600
-    
-    for session in active_sessions:
-        updated = session["updated_at"]
-        if updated >= five_min_ago:
-            sessions_by_age["last_5_min"] += 1
-        elif updated >= hour_ago:
-            sessions_by_age["last_hour"] += 1
-        else:
-            sessions_by_age["older"] += 1
+    websocket_metrics = connection_manager.metrics()
+    total_connections = websocket_metrics["connections"]
     
     return {
-        "total_active_sessions": len(active_sessions),
+        "total_active_sessions": counts["active"],
         "total_websocket_connections": total_connections,
-        "status_distribution": dict(status_counts),
-        "sessions_by_recency": sessions_by_age
+        "status_distribution": counts["by_status"],
+        "sessions_by_recency": counts["by_recency"],
+        "websockets": websocket_metrics,
+        "location_coalescing": location_coalescer.stats(),
+        "store": session_store.stats(),
+        "backplane": backplane.stats(),
+        "route_history": route_recorder.stats(),
+        "reaper": session_reaper.stats(),
+        "eta": eta_estimator.stats(),
+        "geofences": geofence_engine.stats()
     }
 
+@app.get("/stats/tracking/connections")
+async def get_connection_stats(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: TokenPayload = Depends(get_current_user)
+):
+    """Per-connection queue depth, coalesced/dropped frames and send lag, laggiest first (admin only)."""
+    
+    if current_user.role != "superadmin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin only"
+        )
+    
+    return {"connections": connection_manager.connection_metrics(limit)}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8500)
@@ -6,13 +6,16 @@ to automatically assign orders to the best available rider.
 """
 
 import math
-from typing import List, Optional, Tuple
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
 from enum import Enum
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +78,357 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return R * c
 
 
+def haversine_distance_array(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> np.ndarray:
+    """
+    Vectorized haversine_distance from one point to many.
+    
+    Args:
+        lat, lon: Start coordinates (degrees)
+        lats, lons: Arrays of end coordinates (degrees)
+        
+    Returns:
+        Array of distances in kilometers
+    """
+    R = 6371.0
+    
+    lat1_rad = math.radians(lat)
+    lon1_rad = math.radians(lon)
+    lat2_rad = np.radians(np.asarray(lats, dtype=float))
+    lon2_rad = np.radians(np.asarray(lons, dtype=float))
+    
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+    
+    a = np.sin(dlat / 2)**2 + math.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
+    
+    return R * c
+
+
+# ==================== Spatial Index ====================
+
+class RiderSpatialIndex:
+    """
+    In-process grid index of ONLINE riders keyed on current_lat/current_lng.
+
+    Riders are bucketed into fixed-size lat/lng cells so a radius query only
+    visits the cells overlapping the search circle instead of the whole fleet.
+
+    The index is kept current two ways:
+      - SQLAlchemy mapper events on Rider capture status and location
+        changes this process flushes; they are applied when the session
+        commits and dropped if it rolls back.
+      - sync() reloads it from the riders table when it is older than
+        REFRESH_SECS, picking up changes written by other services
+        (e.g. rider_status_service).
+    """
+
+    # Cell size in degrees (~5.5 km of latitude)
+    CELL_DEG = 0.05
+
+    # Max age of the index before sync() reloads it from the database
+    REFRESH_SECS = 30
+
+    def __init__(self, cell_deg: float = CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._entries: Dict[str, Tuple[float, float, Optional[str]]] = {}  # rider_id -> (lat, lng, company_id)
+        self._lock = threading.RLock()
+        self._last_sync: Optional[float] = None
+        self._listeners_installed = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg)))
+
+    def upsert(self, rider_id: str, lat: float, lng: float, company_id: Optional[str] = None):
+        """Insert or move a rider in the index."""
+        with self._lock:
+            self.remove(rider_id)
+            self._entries[rider_id] = (lat, lng, company_id)
+            self._cells.setdefault(self._cell(lat, lng), set()).add(rider_id)
+
+    def remove(self, rider_id: str):
+        """Drop a rider from the index (no-op if absent)."""
+        with self._lock:
+            entry = self._entries.pop(rider_id, None)
+            if entry is None:
+                return
+            cell = self._cell(entry[0], entry[1])
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(rider_id)
+                if not bucket:
+                    del self._cells[cell]
+
+    @staticmethod
+    def _rider_state(rider) -> tuple:
+        return (rider.id, rider.status, rider.current_lat, rider.current_lng, rider.company_id)
+
+    def _apply_state(self, state: tuple):
+        """Index a (rider_id, status, lat, lng, company_id) snapshot: only if ONLINE with a location."""
+        from shared.models import RiderStatus
+
+        rider_id, rider_status, lat, lng, company_id = state
+        if rider_status == RiderStatus.ONLINE and lat is not None and lng is not None:
+            self.upsert(rider_id, lat, lng, company_id)
+        else:
+            self.remove(rider_id)
+
+    def update_from_rider(self, rider):
+        """Apply a Rider row's current state: indexed only if ONLINE with a location."""
+        self._apply_state(self._rider_state(rider))
+
+    def rebuild(self, db: Session):
+        """Reload the index from the riders table (ONLINE riders with a location)."""
+        from shared.models import Rider, RiderStatus
+
+        rows = db.query(
+            Rider.id, Rider.current_lat, Rider.current_lng, Rider.company_id
+        ).filter(
+            Rider.status == RiderStatus.ONLINE,
+            Rider.current_lat.isnot(None),
+            Rider.current_lng.isnot(None)
+        ).all()
+
+        with self._lock:
+            self._cells = {}
+            self._entries = {}
+            for rider_id, lat, lng, company_id in rows:
+                self.upsert(rider_id, lat, lng, company_id)
+            self._last_sync = time.monotonic()
+
+        logger.debug(f"Rider spatial index rebuilt with {len(rows)} online riders")
+
+    def sync(self, db: Session):
+        """Rebuild the index if it has never been loaded or is older than REFRESH_SECS."""
+        self._install_listeners()
+        if self._last_sync is None or time.monotonic() - self._last_sync > self.REFRESH_SECS:
+            self.rebuild(db)
+
+    def query_radius(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        company_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Find indexed riders within radius_km of a point.
+
+        Args:
+            lat, lng: Search centre (degrees)
+            radius_km: Search radius in kilometers
+            company_id: Restrict to riders of this company (optional)
+
+        Returns:
+            List of (rider_id, distance_km) sorted nearest first
+        """
+        # Degrees spanned by the radius; longitude cells shrink towards the poles
+        dlat = radius_km / 111.0
+        dlng = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        min_cell = self._cell(lat - dlat, lng - dlng)
+        max_cell = self._cell(lat + dlat, lng + dlng)
+
+        results = []
+        with self._lock:
+            for i in range(min_cell[0], max_cell[0] + 1):
+                for j in range(min_cell[1], max_cell[1] + 1):
+                    for rider_id in self._cells.get((i, j), ()):
+                        r_lat, r_lng, r_company = self._entries[rider_id]
+                        if company_id and r_company != company_id:
+                            continue
+                        distance = haversine_distance(lat, lng, r_lat, r_lng)
+                        if distance <= radius_km:
+                            results.append((rider_id, distance))
+
+        results.sort(key=lambda item: item[1])
+        return results
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int,
+        max_radius_km: float = 50.0,
+        company_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        k-nearest indexed riders, widening the search ring until k are found.
+
+        Returns:
+            Up to k (rider_id, distance_km) tuples sorted nearest first
+        """
+        radius = min(self.cell_deg * 111.0, max_radius_km)
+        while True:
+            found = self.query_radius(lat, lng, radius, company_id=company_id)
+            if len(found) >= k or radius >= max_radius_km:
+                return found[:k]
+            radius = min(radius * 2, max_radius_km)
+
+    def _install_listeners(self):
+        """
+        Hook Rider mapper events so committed changes in this process update
+        the index. Mapper events fire at flush, so each change is held in
+        session.info (as a snapshot of the row) until that session commits;
+        a rollback discards it.
+        """
+        if self._listeners_installed:
+            return
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session as OrmSession, object_session
+        from shared.models import Rider
+
+        key = ("rider_spatial_index", id(self))
+
+        def _stage(target, state):
+            session = object_session(target)
+            if session is None:
+                # Not flushed through a session; nothing to wait for
+                if state is None:
+                    self.remove(target.id)
+                else:
+                    self._apply_state(state)
+                return
+            session.info.setdefault(key, {})[target.id] = state
+
+        def _on_change(mapper, connection, target):
+            _stage(target, self._rider_state(target))
+
+        def _on_delete(mapper, connection, target):
+            _stage(target, None)
+
+        def _on_commit(session):
+            for rider_id, state in session.info.pop(key, {}).items():
+                if state is None:
+                    self.remove(rider_id)
+                else:
+                    self._apply_state(state)
+
+        def _on_rollback(session):
+            session.info.pop(key, None)
+
+        event.listen(Rider, "after_insert", _on_change)
+        event.listen(Rider, "after_update", _on_change)
+        event.listen(Rider, "after_delete", _on_delete)
+        event.listen(OrmSession, "after_commit", _on_commit)
+        event.listen(OrmSession, "after_rollback", _on_rollback)
+        self._listeners_installed = True
+
+
+# ==================== Rider Features ====================
+
+@dataclass
+class RiderFeatures:
+    """Per-rider aggregates used by availability checks and scoring."""
+    avg_rating: Optional[float] = None         # None when the rider has no reviews
+    num_reviews: int = 0
+    active_orders: int = 0
+    avg_delivery_time: Optional[float] = None  # Mean Order.eta_min, None if no orders
+
+
+class RiderFeatureLoader:
+    """
+    Loads RiderFeatures for a whole candidate set.
+    
+    Reads the incrementally maintained rider_stats rows (one query). Riders
+    without a row yet fall back to two grouped aggregate queries over
+    rider_reviews and orders, so results are correct before the first
+    rebuild_rider_stats() run.
+    """
+    
+    @staticmethod
+    def active_statuses() -> list:
+        """Order statuses that count towards a rider's current load."""
+        from shared.models import ACTIVE_ORDER_STATUSES
+        return list(ACTIVE_ORDER_STATUSES)
+    
+    @staticmethod
+    def load(db: Session, rider_ids: List[str]) -> Dict[str, RiderFeatures]:
+        """
+        Fetch features for the given riders.
+        
+        Args:
+            db: Database session
+            rider_ids: Riders to load
+            
+        Returns:
+            Dict of rider_id -> RiderFeatures (every requested id is present)
+        """
+        from shared.rider_stats import load_rider_stats
+        
+        features = {rider_id: RiderFeatures() for rider_id in rider_ids}
+        if not rider_ids:
+            return features
+        
+        stats = load_rider_stats(db, rider_ids)
+        for rider_id, row in stats.items():
+            features[rider_id] = RiderFeatures(
+                avg_rating=row.avg_rating,
+                num_reviews=row.num_ratings,
+                active_orders=row.active_orders,
+                avg_delivery_time=row.avg_delivery_time
+            )
+        
+        missing = [rider_id for rider_id in rider_ids if rider_id not in stats]
+        if missing:
+            logger.debug(f"{len(missing)} riders have no rider_stats row; aggregating directly")
+            features.update(RiderFeatureLoader.aggregate(db, missing))
+        
+        return features
+    
+    @staticmethod
+    def aggregate(db: Session, rider_ids: List[str]) -> Dict[str, RiderFeatures]:
+        """Compute features from rider_reviews/orders in two GROUP BY rider_id queries."""
+        from sqlalchemy import case
+        from shared.models import Order, RiderReview
+        
+        features = {rider_id: RiderFeatures() for rider_id in rider_ids}
+        if not rider_ids:
+            return features
+        
+        # Query 1: ratings
+        rating_rows = db.query(
+            RiderReview.rider_id,
+            func.avg(RiderReview.rating),
+            func.count(RiderReview.id)
+        ).filter(
+            RiderReview.rider_id.in_(rider_ids)
+        ).group_by(RiderReview.rider_id).all()
+        
+        for rider_id, avg_rating, num_reviews in rating_rows:
+            f = features[rider_id]
+            f.avg_rating = float(avg_rating) if avg_rating is not None else None
+            f.num_reviews = num_reviews
+        
+        # Query 2: active load + average delivery time
+        active = case(
+            (Order.status.in_(RiderFeatureLoader.active_statuses()), 1),
+            else_=0
+        )
+        order_rows = db.query(
+            Order.assigned_rider_id,
+            func.sum(active),
+            func.avg(Order.eta_min)
+        ).filter(
+            Order.assigned_rider_id.in_(rider_ids)
+        ).group_by(Order.assigned_rider_id).all()
+        
+        for rider_id, active_orders, avg_eta in order_rows:
+            f = features[rider_id]
+            f.active_orders = int(active_orders or 0)
+            f.avg_delivery_time = float(avg_eta) if avg_eta is not None else None
+        
+        return features
+
+
 # ==================== Rider Availability ====================
 
 class RiderAvailabilityChecker:
@@ -94,7 +448,8 @@ class RiderAvailabilityChecker:
         rider,
         db: Session,
         min_rating: float = 3.5,
-        max_active: int = 3
+        max_active: int = 3,
+        features: Optional[RiderFeatures] = None
     ) -> bool:
         """
         Check if rider is available for new assignment.
@@ -104,6 +459,7 @@ class RiderAvailabilityChecker:
             db: Database session
             min_rating: Minimum rating threshold
             max_active: Maximum active orders allowed
+            features: Preloaded RiderFeatures (skips the per-rider queries)
             
         Returns:
             True if rider can accept new orders
@@ -117,9 +473,12 @@ class RiderAvailabilityChecker:
             return False
         
         # Check 2: Minimum rating
-        avg_rating = db.query(func.avg(RiderReview.rating)).filter(
-            RiderReview.rider_id == rider.id
-        ).scalar() or 0
+        if features is not None:
+            avg_rating = features.avg_rating or 0
+        else:
+            avg_rating = db.query(func.avg(RiderReview.rating)).filter(
+                RiderReview.rider_id == rider.id
+            ).scalar() or 0
         
         # Only enforce rating threshold if rider has enough ratings
         if avg_rating < min_rating and rider.num_ratings > 5:
@@ -127,17 +486,15 @@ class RiderAvailabilityChecker:
             return False
         
         # Check 3: Active order count
-        active_orders = db.query(Order).filter(
-            and_(
-                Order.assigned_rider_id == rider.id,
-                Order.status.in_([
-                    OrderStatus.AWAITING_ACCEPTANCE,
-                    OrderStatus.ASSIGNED,
-                    OrderStatus.PICKED_UP,
-                    OrderStatus.IN_TRANSIT
-                ])
-            )
-        ).count()
+        if features is not None:
+            active_orders = features.active_orders
+        else:
+            active_orders = db.query(Order).filter(
+                and_(
+                    Order.assigned_rider_id == rider.id,
+                    Order.status.in_(RiderFeatureLoader.active_statuses())
+                )
+            ).count()
         
         if active_orders >= max_active:
             logger.debug(f"Rider {rider.id} has {active_orders} active orders")
@@ -241,6 +598,93 @@ class RiderScoringEngine:
         # Penalty for slower than target
         ratio = avg_delivery_time_min / target_time_min
         return max(0.1, 1.0 / ratio)
+    
+    # ---------- Columnar (NumPy) variants ----------
+    # Each mirrors the scalar method above element-wise so both paths
+    # rank riders identically.
+    
+    # HYBRID weights: proximity=40%, rating=30%, load=20%, speed=10%
+    HYBRID_WEIGHTS = {"proximity": 0.40, "rating": 0.30, "load_balance": 0.20, "speed": 0.10}
+    
+    @staticmethod
+    def proximity_scores(distances_km: np.ndarray, max_distance_km: float = 50.0) -> np.ndarray:
+        """Array form of proximity_score."""
+        k = math.log(10) / max_distance_km
+        scores = np.clip(np.exp(-k * distances_km), 0.0, 1.0)
+        return np.where(distances_km <= 0, 1.0, scores)
+    
+    @staticmethod
+    def rating_scores(average_ratings: np.ndarray) -> np.ndarray:
+        """Array form of rating_score."""
+        scores = np.minimum(1.0, average_ratings / 5.0)
+        return np.where(average_ratings < 0, 0.0, scores)
+    
+    @staticmethod
+    def load_balance_scores(active_orders: np.ndarray, max_orders: int = 3) -> np.ndarray:
+        """Array form of load_balance_score."""
+        scores = 1.0 - (active_orders / max_orders)
+        scores = np.where(active_orders >= max_orders, 0.0, scores)
+        return np.where(active_orders <= 0, 1.0, scores)
+    
+    @staticmethod
+    def speed_scores(avg_delivery_times_min: np.ndarray, target_time_min: float = 60.0) -> np.ndarray:
+        """Array form of speed_score; NaN marks an unknown delivery time."""
+        times = np.asarray(avg_delivery_times_min, dtype=float)
+        unknown = np.isnan(times) | (times <= 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.maximum(0.1, 1.0 / (times / target_time_min))
+        scores = np.where(times <= target_time_min, 1.0, scores)
+        return np.where(unknown, 0.5, scores)
+    
+    @classmethod
+    def score_batch(
+        cls,
+        strategy: "AssignmentStrategy",
+        distances_km: np.ndarray,
+        ratings: np.ndarray,
+        active_orders: np.ndarray,
+        delivery_times: np.ndarray
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Score many riders in one pass.
+        
+        Args:
+            strategy: Assignment strategy
+            distances_km: Distance from the order to each rider
+            ratings: Average rating per rider
+            active_orders: Active order count per rider
+            delivery_times: Average delivery time per rider (NaN if unknown)
+            
+        Returns:
+            Tuple of (scores, components) where components maps the
+            component name to its per-rider score array
+        """
+        if strategy == AssignmentStrategy.PROXIMITY:
+            components = {"proximity": cls.proximity_scores(distances_km)}
+        elif strategy == AssignmentStrategy.HIGHEST_RATING:
+            components = {"rating": cls.rating_scores(ratings)}
+        elif strategy == AssignmentStrategy.BALANCED_LOAD:
+            components = {"load_balance": cls.load_balance_scores(active_orders)}
+        elif strategy == AssignmentStrategy.FASTEST_DELIVERY:
+            components = {"speed": cls.speed_scores(delivery_times)}
+        else:  # HYBRID (default)
+            components = {
+                "proximity": cls.proximity_scores(distances_km),
+                "rating": cls.rating_scores(ratings),
+                "load_balance": cls.load_balance_scores(active_orders),
+                "speed": cls.speed_scores(delivery_times)
+            }
+            w = cls.HYBRID_WEIGHTS
+            scores = (
+                w["proximity"] * components["proximity"] +
+                w["rating"] * components["rating"] +
+                w["load_balance"] * components["load_balance"] +
+                w["speed"] * components["speed"]
+            )
+            return scores, components
+        
+        (scores,) = components.values()
+        return scores, components
 
 
 # ==================== Assignment Algorithms ====================
@@ -248,10 +692,145 @@ class RiderScoringEngine:
 class AssignmentEngine:
     """Main engine for automatic rider assignment."""
     
+    # Radius searched in the spatial index before falling back to a full scan
+    SEARCH_RADIUS_KM = 20.0
+    
     def __init__(self, strategy: AssignmentStrategy = AssignmentStrategy.HYBRID):
         self.strategy = strategy
         self.scorer = RiderScoringEngine()
         self.availability_checker = RiderAvailabilityChecker()
+        self.feature_loader = RiderFeatureLoader()
+        self.spatial_index = RiderSpatialIndex()
+    
+    def candidate_riders(
+        self,
+        order_lat: float,
+        order_lng: float,
+        db: Session,
+        company_id: Optional[str] = None,
+        wide: bool = False
+    ) -> list:
+        """
+        Load candidate Rider rows for an order location.
+        
+        Uses the spatial index to fetch only ONLINE riders within
+        SEARCH_RADIUS_KM. Falls back to every rider (optionally filtered by
+        company) when nobody is indexed nearby, e.g. riders without a
+        reported location, or when wide is set.
+        
+        Args:
+            order_lat, order_lng: Order location coordinates
+            db: Database session
+            company_id: Restrict to specific company (optional)
+            wide: Skip the radius and load the whole fleet
+            
+        Returns:
+            List of Rider model instances
+        """
+        from sqlalchemy.orm import joinedload
+        from shared.models import Rider
+        
+        nearby = None
+        if not wide:
+            self.spatial_index.sync(db)
+            nearby = self.spatial_index.query_radius(
+                order_lat, order_lng, self.SEARCH_RADIUS_KM, company_id=company_id
+            )
+        
+        # Riders' usernames are needed for every score; load users in the same query
+        query = db.query(Rider).options(joinedload(Rider.user))
+        if nearby:
+            return query.filter(
+                Rider.id.in_([rider_id for rider_id, _ in nearby])
+            ).all()
+        
+        if company_id:
+            query = query.filter(Rider.company_id == company_id)
+        return query.all()
+    
+    def available_riders(
+        self,
+        order_lat: float,
+        order_lng: float,
+        db: Session,
+        company_id: Optional[str] = None,
+        exclude_rider_id: Optional[str] = None
+    ) -> Tuple[list, Dict[str, RiderFeatures]]:
+        """
+        Candidate riders that can take an order, with their features.
+        
+        Riders within SEARCH_RADIUS_KM are tried first. If none of them is
+        available (all at capacity, below the rating cutoff or excluded),
+        the whole fleet is searched, so a free rider farther away still
+        gets the order.
+        
+        Returns:
+            Tuple of (available riders, RiderFeatures keyed by rider id)
+        """
+        self.spatial_index.sync(db)
+        has_nearby = bool(self.spatial_index.query_radius(
+            order_lat, order_lng, self.SEARCH_RADIUS_KM, company_id=company_id
+        ))
+        
+        for wide in ((False, True) if has_nearby else (False,)):
+            riders = [
+                r for r in self.candidate_riders(order_lat, order_lng, db, company_id=company_id, wide=wide)
+                if r.id != exclude_rider_id
+            ]
+            features = self.feature_loader.load(db, [r.id for r in riders])
+            available = [
+                r for r in riders
+                if self.availability_checker.is_available(r, db, features=features[r.id])
+            ]
+            if available:
+                return available, features
+        return [], {}
+    
+    def score_riders(
+        self,
+        order_lat: float,
+        order_lng: float,
+        riders: list,
+        features: Dict[str, RiderFeatures],
+        strategy: AssignmentStrategy
+    ) -> List[RiderScore]:
+        """
+        Score riders for an order location in one vectorized pass.
+        
+        Args:
+            order_lat, order_lng: Order location coordinates
+            riders: Rider model instances to score
+            features: Preloaded RiderFeatures keyed by rider id
+            strategy: Assignment strategy
+            
+        Returns:
+            List of RiderScore objects (unsorted)
+        """
+        if not riders:
+            return []
+        
+        lats = np.array([r.current_lat or 0 for r in riders], dtype=float)
+        lngs = np.array([r.current_lng or 0 for r in riders], dtype=float)
+        ratings = np.array([features[r.id].avg_rating or 3.5 for r in riders], dtype=float)
+        loads = np.array([features[r.id].active_orders for r in riders], dtype=float)
+        speeds = np.array([
+            features[r.id].avg_delivery_time if features[r.id].avg_delivery_time is not None else np.nan
+            for r in riders
+        ], dtype=float)
+        
+        distances = haversine_distance_array(order_lat, order_lng, lats, lngs)
+        scores, components = self.scorer.score_batch(strategy, distances, ratings, loads, speeds)
+        
+        return [
+            RiderScore(
+                rider_id=rider.id,
+                rider_name=rider.user.username if rider.user else "Unknown",
+                distance_km=float(distances[i]),
+                score=float(scores[i]),
+                components={name: float(values[i]) for name, values in components.items()}
+            )
+            for i, rider in enumerate(riders)
+        ]
     
     def find_best_rider(
         self,
@@ -275,100 +854,20 @@ class AssignmentEngine:
         Returns:
             Tuple of (rider, score_details) or None if no riders available
         """
-        from shared.models import Rider, RiderCompany, RiderReview, Order, OrderStatus
-
         # Determine strategy
         strat = strategy or self.strategy
 
         # Get available riders
-        query = db.query(Rider)
-        if company_id:
-            query = query.filter(Rider.company_id == company_id)
-
-        riders = query.all()
-        available_riders = [
-            r for r in riders
-            if self.availability_checker.is_available(r, db)
-            and r.id != exclude_rider_id
-        ]
+        available_riders, features = self.available_riders(
+            order_lat, order_lng, db, company_id=company_id, exclude_rider_id=exclude_rider_id
+        )
 
         if not available_riders:
             logger.warning(f"No available riders for order at ({order_lat}, {order_lng})")
             return None
         
         # Score all available riders
-        scored_riders = []
-        
-        for rider in available_riders:
-            # Calculate distance
-            distance = haversine_distance(
-                order_lat, order_lng,
-                rider.current_lat or 0, rider.current_lng or 0
-            )
-            
-            # Get rider stats
-            avg_rating = db.query(func.avg(RiderReview.rating)).filter(
-                RiderReview.rider_id == rider.id
-            ).scalar() or 3.5
-            
-            active_orders = db.query(Order).filter(
-                and_(
-                    Order.assigned_rider_id == rider.id,
-                    Order.status.in_([OrderStatus.AWAITING_ACCEPTANCE, OrderStatus.ASSIGNED, OrderStatus.PICKED_UP, OrderStatus.IN_TRANSIT])
-                )
-            ).count()
-            
-            avg_delivery_time_raw = db.query(func.avg(Order.eta_min)).filter(
-                Order.assigned_rider_id == rider.id
-            ).scalar()
-            avg_delivery_time = float(avg_delivery_time_raw) if avg_delivery_time_raw is not None else None
-            avg_rating = float(avg_rating)
-            if strat == AssignmentStrategy.PROXIMITY:
-                score = self.scorer.proximity_score(distance)
-                components = {"proximity": score}
-            
-            elif strat == AssignmentStrategy.HIGHEST_RATING:
-                score = self.scorer.rating_score(avg_rating)
-                components = {"rating": score}
-            
-            elif strat == AssignmentStrategy.BALANCED_LOAD:
-                score = self.scorer.load_balance_score(active_orders)
-                components = {"load_balance": score}
-            
-            elif strat == AssignmentStrategy.FASTEST_DELIVERY:
-                score = self.scorer.speed_score(avg_delivery_time)
-                components = {"speed": score}
-            
-            else:  # HYBRID (default)
-                # Weighted combination
-                proximity = self.scorer.proximity_score(distance)
-                rating = self.scorer.rating_score(avg_rating)
-                load = self.scorer.load_balance_score(active_orders)
-                speed = self.scorer.speed_score(avg_delivery_time)
-                
-                # Weights: proximity=40%, rating=30%, load=20%, speed=10%
-                score = (
-                    0.40 * proximity +
-                    0.30 * rating +
-                    0.20 * load +
-                    0.10 * speed
-                )
-                
-                components = {
-                    "proximity": proximity,
-                    "rating": rating,
-                    "load_balance": load,
-                    "speed": speed
-                }
-            
-            rider_score = RiderScore(
-                rider_id=rider.id,
-                rider_name=rider.user.username if rider.user else "Unknown",
-                distance_km=distance,
-                score=score,
-                components=components
-            )
-            scored_riders.append(rider_score)
+        scored_riders = self.score_riders(order_lat, order_lng, available_riders, features, strat)
         
         if not scored_riders:
             return None
@@ -382,7 +881,20 @@ class AssignmentEngine:
             f"(distance={best.distance_km:.1f}km, score={best.score:.3f})"
         )
         
-        return db.query(Rider).filter(Rider.id == best.rider_id).first(), best
+        best_rider = next(r for r in available_riders if r.id == best.rider_id)
+        return best_rider, best
+    
+    @staticmethod
+    def mark_awaiting_acceptance(order, rider):
+        """Send an order to a rider: AWAITING_ACCEPTANCE with a 90s deadline (caller commits)."""
+        from shared.models import OrderStatus
+        
+        order.assigned_rider_id  = rider.id
+        order.company_id          = rider.company_id
+        order.status              = OrderStatus.AWAITING_ACCEPTANCE
+        order.assigned_at         = datetime.utcnow()
+        order.acceptance_deadline = datetime.utcnow() + timedelta(seconds=90)
+        order.assignment_attempts = (order.assignment_attempts or 0) + 1
     
     def assign_order(
         self,
@@ -429,12 +941,7 @@ class AssignmentEngine:
             if order.status != OrderStatus.PENDING:
                 return False, f"Order status is {order.status.value}, cannot assign", None
             
-            order.assigned_rider_id  = rider.id
-            order.company_id          = rider.company_id
-            order.status              = OrderStatus.AWAITING_ACCEPTANCE
-            order.assigned_at         = datetime.utcnow()
-            order.acceptance_deadline = datetime.utcnow() + __import__('datetime').timedelta(seconds=90)
-            order.assignment_attempts = (order.assignment_attempts or 0) + 1
+            self.mark_awaiting_acceptance(order, rider)
 
             db.commit()
 
@@ -454,6 +961,310 @@ class AssignmentEngine:
             return False, f"Assignment failed: {str(e)}", None
 
 
+# ==================== Batch Assignment ====================
+
+def linear_sum_assignment(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Solve the rectangular assignment problem (Hungarian algorithm, O(n^2 m)).
+    
+    Finds a minimum-cost matching that assigns every row to a distinct
+    column. The inner column scan is vectorized with NumPy.
+    
+    Args:
+        cost: (n_rows, n_cols) cost matrix with n_rows <= n_cols
+        
+    Returns:
+        List of (row, col) pairs, one per row
+    """
+    n, m = cost.shape
+    if n == 0:
+        return []
+    if n > m:
+        raise ValueError("cost matrix must have at least as many columns as rows")
+    
+    # 1-indexed potentials/matching as in the classic formulation; index 0 is a sentinel
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)      # p[j] = row matched to column j (0 = free)
+    way = np.zeros(m + 1, dtype=int)
+    
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            improve = free & (cur < minv[1:])
+            minv[1:][improve] = cur[improve]
+            way[1:][improve] = j0
+            
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Augment along the alternating path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    
+    return [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+class BatchAssignmentSolver:
+    """
+    Assigns a batch of orders to riders in one globally optimal pass.
+    
+    Builds an order x rider-slot cost matrix (cost = 1 - score) from the
+    same features and scoring components as find_best_rider. Each rider
+    contributes one column per free slot (MAX_ACTIVE_ORDERS minus current
+    load), scored with the load the rider would carry in that slot, so the
+    solver respects capacity and spreads work like repeated greedy picks
+    would. Orders with no feasible rider are matched to a dummy column
+    and reported as unassigned.
+    """
+    
+    # Cost for pairs that are not allowed (other company / outside radius)
+    INFEASIBLE_COST = 1e6
+    # Cost of leaving an order unassigned (worse than any real match, cost <= 1)
+    UNASSIGNED_COST = 2.0
+    
+    def __init__(self, engine: AssignmentEngine):
+        self.engine = engine
+    
+    def _load_candidates(self, orders: list, db: Session, widen: Set[int] = frozenset()) -> Tuple[list, List[bool]]:
+        """
+        Load the candidate riders for all orders with a single riders query.
+        
+        Args:
+            orders: Orders in the batch
+            db: Database session
+            widen: Indexes of orders to search the whole fleet for
+        
+        Returns:
+            Tuple of (riders, use_radius) where use_radius[i] is False when
+            order i found nobody in the spatial index (or is in widen) and
+            falls back to all riders of its company, as find_best_rider does.
+        """
+        from sqlalchemy import or_
+        from sqlalchemy.orm import joinedload
+        from shared.models import Rider
+        
+        index = self.engine.spatial_index
+        index.sync(db)
+        
+        nearby_ids = set()
+        fallback_companies = set()
+        fallback_all = False
+        use_radius = []
+        for i, order in enumerate(orders):
+            nearby = index.query_radius(
+                order.pickup_lat, order.pickup_lng,
+                self.engine.SEARCH_RADIUS_KM, company_id=order.company_id
+            )
+            if i in widen:
+                nearby = []
+            use_radius.append(bool(nearby))
+            if nearby:
+                nearby_ids.update(rider_id for rider_id, _ in nearby)
+            elif order.company_id:
+                fallback_companies.add(order.company_id)
+            else:
+                fallback_all = True
+        
+        query = db.query(Rider).options(joinedload(Rider.user))
+        if not fallback_all:
+            conditions = []
+            if nearby_ids:
+                conditions.append(Rider.id.in_(nearby_ids))
+            if fallback_companies:
+                conditions.append(Rider.company_id.in_(fallback_companies))
+            query = query.filter(or_(*conditions))
+        
+        return query.all(), use_radius
+    
+    def _in_reach(self, order, riders: list) -> bool:
+        """Whether any of riders is within SEARCH_RADIUS_KM of the order (and in its company, if set)."""
+        riders = [r for r in riders if not order.company_id or r.company_id == order.company_id]
+        if not riders:
+            return False
+        lats = np.array([r.current_lat or 0 for r in riders], dtype=float)
+        lngs = np.array([r.current_lng or 0 for r in riders], dtype=float)
+        distances = haversine_distance_array(order.pickup_lat, order.pickup_lng, lats, lngs)
+        return bool((distances <= self.engine.SEARCH_RADIUS_KM).any())
+    
+    def _greedy(self, cost: np.ndarray) -> List[Tuple[int, int]]:
+        """Order-by-order cheapest free column: what sequential find_best_rider calls would pick."""
+        taken = np.zeros(cost.shape[1], dtype=bool)
+        matches = []
+        for i in range(cost.shape[0]):
+            row = np.where(taken, np.inf, cost[i])
+            j = int(np.argmin(row))
+            taken[j] = True
+            matches.append((i, j))
+        return matches
+    
+    def solve(
+        self,
+        orders: list,
+        db: Session,
+        strategy: Optional[AssignmentStrategy] = None
+    ) -> dict:
+        """
+        Compute the optimal order -> rider matching for a batch (no writes).
+        
+        Args:
+            orders: PENDING Order model instances
+            db: Database session
+            strategy: Assignment strategy (uses engine default if None)
+            
+        Returns:
+            Dict with "assignments" ({order_id: (rider, RiderScore)}) and
+            "report" comparing the optimal and greedy solutions
+        """
+        strat = strategy or self.engine.strategy
+        checker = self.engine.availability_checker
+        
+        riders, use_radius = self._load_candidates(orders, db)
+        features = self.engine.feature_loader.load(db, [r.id for r in riders])
+        available = [r for r in riders if checker.is_available(r, db, features=features[r.id])]
+        
+        # Orders whose nearby riders are all busy or filtered out search the whole fleet instead
+        stranded = {i for i, order in enumerate(orders) if use_radius[i] and not self._in_reach(order, available)}
+        if stranded:
+            riders, use_radius = self._load_candidates(orders, db, widen=stranded)
+            features = self.engine.feature_loader.load(db, [r.id for r in riders])
+            available = [r for r in riders if checker.is_available(r, db, features=features[r.id])]
+        
+        # One column per free slot; slot k is scored as if the rider already had k more orders
+        slot_riders = []
+        slot_loads = []
+        for rider in available:
+            active = features[rider.id].active_orders
+            for k in range(max(0, checker.MAX_ACTIVE_ORDERS - active)):
+                slot_riders.append(rider)
+                slot_loads.append(active + k)
+        
+        n_orders, n_slots = len(orders), len(slot_riders)
+        cost = np.full((n_orders, n_slots + n_orders), self.UNASSIGNED_COST)
+        distances = np.zeros((n_orders, n_slots))
+        scores = np.zeros((n_orders, n_slots))
+        components = {}
+        
+        if n_slots:
+            lats = np.array([r.current_lat or 0 for r in slot_riders], dtype=float)
+            lngs = np.array([r.current_lng or 0 for r in slot_riders], dtype=float)
+            ratings = np.array([features[r.id].avg_rating or 3.5 for r in slot_riders], dtype=float)
+            loads = np.array(slot_loads, dtype=float)
+            speeds = np.array([
+                features[r.id].avg_delivery_time if features[r.id].avg_delivery_time is not None else np.nan
+                for r in slot_riders
+            ], dtype=float)
+            companies = np.array([r.company_id or "" for r in slot_riders], dtype=object)
+            
+            for i, order in enumerate(orders):
+                distances[i] = haversine_distance_array(order.pickup_lat, order.pickup_lng, lats, lngs)
+            
+            scores, components = self.engine.scorer.score_batch(
+                strat, distances, ratings[None, :], loads[None, :], speeds[None, :]
+            )
+            scores = np.broadcast_to(scores, (n_orders, n_slots))
+            
+            feasible = np.ones((n_orders, n_slots), dtype=bool)
+            for i, order in enumerate(orders):
+                if order.company_id:
+                    feasible[i] &= companies == order.company_id
+                if use_radius[i]:
+                    feasible[i] &= distances[i] <= self.engine.SEARCH_RADIUS_KM
+            
+            cost[:, :n_slots] = np.where(feasible, 1.0 - scores, self.INFEASIBLE_COST)
+        
+        def summarize(matches, elapsed_ms):
+            real = [(i, j) for i, j in matches if j < n_slots and cost[i, j] < self.INFEASIBLE_COST]
+            return {
+                "assigned": len(real),
+                "total_cost": round(float(sum(cost[i, j] for i, j in real)), 4),
+                "total_distance_km": round(float(sum(distances[i, j] for i, j in real)), 3),
+                "solve_ms": round(elapsed_ms, 3)
+            }, real
+        
+        started = time.perf_counter()
+        optimal_matches = linear_sum_assignment(cost)
+        optimal_report, optimal = summarize(optimal_matches, (time.perf_counter() - started) * 1000)
+        
+        started = time.perf_counter()
+        greedy_matches = self._greedy(cost)
+        greedy_report, _ = summarize(greedy_matches, (time.perf_counter() - started) * 1000)
+        
+        assignments = {}
+        for i, j in optimal:
+            rider = slot_riders[j]
+            component_values = {
+                name: float(np.broadcast_to(values, (n_orders, n_slots))[i, j])
+                for name, values in components.items()
+            }
+            assignments[orders[i].id] = (rider, RiderScore(
+                rider_id=rider.id,
+                rider_name=rider.user.username if rider.user else "Unknown",
+                distance_km=float(distances[i, j]),
+                score=float(scores[i, j]),
+                components=component_values
+            ))
+        
+        logger.info(
+            f"Batch assignment: {n_orders} orders x {n_slots} rider slots — "
+            f"optimal cost {optimal_report['total_cost']} vs greedy {greedy_report['total_cost']}"
+        )
+        
+        return {
+            "assignments": assignments,
+            "report": {
+                "orders": n_orders,
+                "riders": len(available),
+                "rider_slots": n_slots,
+                "optimal": optimal_report,
+                "greedy": greedy_report,
+                "cost_saved": round(greedy_report["total_cost"] - optimal_report["total_cost"], 4)
+            }
+        }
+    
+    def assign_batch(
+        self,
+        orders: list,
+        db: Session,
+        strategy: Optional[AssignmentStrategy] = None
+    ) -> dict:
+        """
+        Solve a batch and send every matched order to its rider in one commit.
+        
+        Returns:
+            The solve() result; "assignments" only holds orders that were sent
+        """
+        result = self.solve(orders, db, strategy=strategy)
+        by_id = {order.id: order for order in orders}
+        
+        try:
+            for order_id, (rider, _) in result["assignments"].items():
+                self.engine.mark_awaiting_acceptance(by_id[order_id], rider)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        return result
+
+
 # ==================== Pre-Scoring & Recommendations ====================
 
 class RiderRecommender:
@@ -484,65 +1295,18 @@ class RiderRecommender:
         Returns:
             List of RiderScore objects ranked by score
         """
-        from shared.models import Rider, RiderReview, Order
-        
         # Get available riders
-        query = db.query(Rider)
-        if company_id:
-            query = query.filter(Rider.company_id == company_id)
-        
-        riders = query.all()
-        available_riders = [
-            r for r in riders
-            if self.engine.availability_checker.is_available(r, db)
-        ]
+        available_riders, features = self.engine.available_riders(
+            order_lat, order_lng, db, company_id=company_id
+        )
         
         if not available_riders:
             return []
         
         # Score all riders
-        scored_riders = []
-        
-        for rider in available_riders:
-            distance = haversine_distance(
-                order_lat, order_lng,
-                rider.current_lat or 0, rider.current_lng or 0
-            )
-            
-            avg_rating = db.query(func.avg(RiderReview.rating)).filter(
-                RiderReview.rider_id == rider.id
-            ).scalar() or 3.5
-            
-            active_orders = db.query(Order).filter(
-                Order.assigned_rider_id == rider.id
-            ).count()
-            
-            avg_delivery_time_raw2 = db.query(func.avg(Order.eta_min)).filter(
-                Order.assigned_rider_id == rider.id
-            ).scalar()
-            avg_delivery_time = float(avg_delivery_time_raw2) if avg_delivery_time_raw2 is not None else None
-            avg_rating = float(avg_rating)
-            
-            # Compute score
-            proximity = scorer.proximity_score(distance)
-            rating = scorer.rating_score(avg_rating)
-            load = scorer.load_balance_score(active_orders)
-            speed = scorer.speed_score(avg_delivery_time)
-            
-            score = 0.40 * proximity + 0.30 * rating + 0.20 * load + 0.10 * speed
-            
-            scored_riders.append(RiderScore(
-                rider_id=rider.id,
-                rider_name=rider.user.username if rider.user else "Unknown",
-                distance_km=distance,
-                score=score,
-                components={
-                    "proximity": proximity,
-                    "rating": rating,
-                    "load_balance": load,
-                    "speed": speed
-                }
-            ))
+        scored_riders = self.engine.score_riders(
+            order_lat, order_lng, available_riders, features, strategy
+        )
         
         # Sort and return top N
         scored_riders.sort()
@@ -25,3 +25,46 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# ==================== Async Sessions ====================
+#
+# AsyncSession for endpoints that should not block the event loop while a
+# query runs. The async engine is created on first use so services that only
+# use get_db don't need an async driver installed (asyncpg for Postgres,
+# aiosqlite for SQLite).
+
+def _async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL", _async_database_url(DATABASE_URL))
+
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    """Create the shared async engine on first use."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
+        _async_sessionmaker = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+def AsyncSessionLocal():
+    """New AsyncSession bound to the shared async engine."""
+    get_async_engine()
+    return _async_sessionmaker()
+
+async def get_async_db():
+    """Dependency for FastAPI to inject async database sessions."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,129 @@
+"""
+Deadline Scheduler
+
+Min-heap of (deadline, key) pairs driven by a single asyncio task that sleeps
+until the earliest deadline and then hands every due key to a handler in
+one batch. Used by the assignment service to expire AWAITING_ACCEPTANCE
+orders exactly at their acceptance_deadline instead of polling.
+
+Deadlines are naive UTC datetimes, matching the models' datetime.utcnow()
+timestamps. Rescheduling or cancelling a key is O(log n); superseded heap
+entries are skipped lazily when they reach the top.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Fires a batch handler exactly when keys reach their deadline."""
+
+    def __init__(self, handler: Callable[[List[str]], Awaitable[None]], name: str = "deadlines"):
+        """
+        Args:
+            handler: Coroutine called with the list of keys that are due
+            name: Label used in logs
+        """
+        self.handler = handler
+        self.name = name
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._deadlines: Dict[str, datetime] = {}  # key -> current deadline
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+        # Metrics
+        self.fired_total = 0
+        self.batches_total = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_batch_size = 0
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, key: str, deadline: datetime):
+        """Schedule (or reschedule) a key to fire at deadline."""
+        if self._deadlines.get(key) == deadline:
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        # Wake the runner only if this became the earliest deadline
+        if self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def cancel(self, key: str):
+        """Forget a key; its heap entry is discarded when it surfaces."""
+        self._deadlines.pop(key, None)
+
+    def next_deadline(self) -> Optional[datetime]:
+        """Earliest live deadline, discarding stale heap entries."""
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            if self._deadlines.get(key) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> List[str]:
+        """Remove and return every key whose deadline is <= now."""
+        due = []
+        lag_ms = 0.0
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            _, _, key = heapq.heappop(self._heap)
+            del self._deadlines[key]
+            due.append(key)
+            lag_ms = max(lag_ms, (now - deadline).total_seconds() * 1000)
+
+        if due:
+            self.fired_total += len(due)
+            self.batches_total += 1
+            self.last_batch_size = len(due)
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        return due
+
+    async def run(self):
+        """Sleep until the next deadline (or a new earlier one), then fire the due batch."""
+        while True:
+            self._wakeup.clear()
+            deadline = self.next_deadline()
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, (deadline - datetime.utcnow()).total_seconds())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                continue  # schedule changed; recompute the sleep
+            except asyncio.TimeoutError:
+                pass
+
+            due = self.pop_due(datetime.utcnow())
+            if not due:
+                continue
+            try:
+                await self.handler(due)
+            except Exception as e:
+                logger.error(f"{self.name}: handler failed for {len(due)} keys: {e}")
+
+    def metrics(self) -> dict:
+        """Queue depth and firing lag."""
+        deadline = self.next_deadline()
+        return {
+            "queue_depth": len(self._deadlines),
+            "next_deadline_in_s": (
+                round((deadline - datetime.utcnow()).total_seconds(), 3) if deadline else None
+            ),
+            "fired_total": self.fired_total,
+            "batches_total": self.batches_total,
+            "last_batch_size": self.last_batch_size,
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3)
+        }
@@ -0,0 +1,243 @@
+"""
+Delivery ETA Estimation
+
+Replaces the fixed 30 km/h straight-line ETA with a blend of three signals:
+
+    observed speed    EWMA of the rider's speed between successive fixes,
+                      time-weighted so irregular fix intervals count fairly
+    hour profile      median road speed of recent deliveries by hour of day
+                      (pickup → delivered), the prior before we've seen the
+                      rider move and the anchor while they're stopped
+    route factor      road distance / straight-line distance, applied to the
+                      remaining haversine distance; learned online from
+                      finished sessions
+
+    eta = remaining_straight_m * route_factor / blended_speed
+
+The per-session state is a small JSON-serialisable dict kept on the tracking
+session (so it survives in the Redis session store), and observe()/estimate()
+are O(1) per fix.
+
+`python3 evaluate_eta.py` replays recorded tracks from tracking_points
+through this estimator and the old constant-speed formula.
+"""
+
+import logging
+import math
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000
+
+ETA_DEFAULT_SPEED_KMH = float(os.environ.get("ETA_DEFAULT_SPEED_KMH", "30"))
+ETA_ROUTE_FACTOR = float(os.environ.get("ETA_ROUTE_FACTOR", "1.3"))
+ETA_SPEED_TAU_SECONDS = float(os.environ.get("ETA_SPEED_TAU_SECONDS", "300"))
+ETA_PROFILE_DAYS = int(os.environ.get("ETA_PROFILE_DAYS", "28"))
+ETA_PROFILE_MIN_SAMPLES = int(os.environ.get("ETA_PROFILE_MIN_SAMPLES", "20"))
+# Hour-of-day profiles are bucketed in local time (Accra is UTC+0)
+ETA_UTC_OFFSET_HOURS = int(os.environ.get("ETA_UTC_OFFSET_HOURS", "0"))
+
+MIN_ETA_SECONDS = 60
+MAX_PLAUSIBLE_SPEED_MPS = 40.0   # faster between two fixes is a GPS jump
+MAX_FIX_GAP_SECONDS = 600        # longer gaps say nothing about current speed
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in metres."""
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return EARTH_RADIUS_M * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def local_hour(ts: int) -> int:
+    return (time.gmtime(ts).tm_hour + ETA_UTC_OFFSET_HOURS) % 24
+
+
+class SpeedProfile:
+    """Typical road speed (m/s) for each hour of the day."""
+
+    def __init__(self, speeds_mps: Optional[List[float]] = None, samples: Optional[List[int]] = None):
+        default = ETA_DEFAULT_SPEED_KMH / 3.6
+        self.speeds_mps = list(speeds_mps) if speeds_mps else [default] * 24
+        self.samples = list(samples) if samples else [0] * 24
+        self.loaded_at: Optional[int] = None
+
+    def speed_at(self, ts: int) -> float:
+        return self.speeds_mps[local_hour(ts)]
+
+    @classmethod
+    def from_trips(cls, trips, route_factor: float = ETA_ROUTE_FACTOR,
+                   min_samples: int = ETA_PROFILE_MIN_SAMPLES) -> "SpeedProfile":
+        """
+        Build a profile from finished trips.
+
+        Args:
+            trips: Iterable of (start_ts, duration_seconds, straight_line_m)
+            route_factor: Converts straight-line distance to road distance
+            min_samples: Hours with fewer trips keep the default speed
+
+        Returns:
+            SpeedProfile
+        """
+        by_hour: List[List[float]] = [[] for _ in range(24)]
+        for start_ts, duration, straight_m in trips:
+            if duration < 60 or straight_m < 200:
+                continue
+            speed = straight_m * route_factor / duration
+            if 0.5 <= speed <= MAX_PLAUSIBLE_SPEED_MPS:
+                by_hour[local_hour(int(start_ts))].append(speed)
+        profile = cls()
+        for hour, speeds in enumerate(by_hour):
+            profile.samples[hour] = len(speeds)
+            if len(speeds) >= min_samples:
+                profile.speeds_mps[hour] = statistics.median(speeds)
+        return profile
+
+
+async def load_speed_profile(days: int = ETA_PROFILE_DAYS, route_factor: float = ETA_ROUTE_FACTOR) -> SpeedProfile:
+    """Hour-of-day speed profile from orders delivered in the last `days` days."""
+    from shared.database import AsyncSessionLocal
+    from shared.models import Order, OrderStatus
+
+    since = datetime.utcnow() - timedelta(days=days)
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(
+                Order.pickup_lat, Order.pickup_lng, Order.dropoff_lat, Order.dropoff_lng,
+                Order.picked_up_at, Order.delivered_at
+            ).where(
+                Order.status == OrderStatus.DELIVERED,
+                Order.delivered_at >= since,
+                Order.picked_up_at.isnot(None)
+            )
+        )).all()
+    trips = (
+        (
+            # naive UTC datetimes, as stored
+            (r.picked_up_at - datetime(1970, 1, 1)).total_seconds(),
+            (r.delivered_at - r.picked_up_at).total_seconds(),
+            haversine_m(r.pickup_lat, r.pickup_lng, r.dropoff_lat, r.dropoff_lng)
+        )
+        for r in rows
+    )
+    profile = SpeedProfile.from_trips(trips, route_factor)
+    profile.loaded_at = int(time.time())
+    return profile
+
+
+class EtaEstimator:
+    """
+    Per-fix ETA updates. Session state (session["eta"]):
+
+        speed     EWMA of observed speed, m/s (None until two usable fixes)
+        samples   usable speed observations so far
+        path_m    distance travelled along fixes
+        origin    [lat, lng] of the first fix
+    """
+
+    def __init__(self, profile: Optional[SpeedProfile] = None, route_factor: float = ETA_ROUTE_FACTOR,
+                 tau_seconds: float = ETA_SPEED_TAU_SECONDS, prior_weight: float = 5.0,
+                 max_observed_weight: float = 0.7, min_speed_fraction: float = 0.25):
+        """
+        Args:
+            profile: Hour-of-day prior (defaults to ETA_DEFAULT_SPEED_KMH all day)
+            route_factor: Initial road / straight-line distance ratio
+            tau_seconds: EWMA time constant for observed speed
+            prior_weight: Observations needed before observed speed gets half the weight
+            max_observed_weight: Cap on observed speed's weight against the profile
+            min_speed_fraction: Floor on the blended speed as a fraction of the
+                profile, so a rider stopped at lights doesn't get an unbounded ETA
+        """
+        self.profile = profile or SpeedProfile()
+        self.route_factor = route_factor
+        self.tau_seconds = tau_seconds
+        self.prior_weight = prior_weight
+        self.max_observed_weight = max_observed_weight
+        self.min_speed_fraction = min_speed_fraction
+        self.route_factor_samples = 0
+        self.rejected_fixes = 0
+
+    @staticmethod
+    def new_state() -> dict:
+        return {"speed": None, "samples": 0, "path_m": 0.0, "origin": None}
+
+    def observe(self, state: Optional[dict], prev: Optional[dict], fix: dict) -> dict:
+        """
+        Fold a new fix into the session state.
+
+        Args:
+            state: Current state (None for a new session)
+            prev: Previous current_location ({lat, lng, timestamp}) or None
+            fix: New current_location
+
+        Returns:
+            Updated state (the same dict when one was passed in)
+        """
+        state = state if state is not None else self.new_state()
+        if state["origin"] is None:
+            state["origin"] = [fix["lat"], fix["lng"]]
+        if not prev:
+            return state
+
+        dt = fix["timestamp"] - prev["timestamp"]
+        if dt <= 0 or dt > MAX_FIX_GAP_SECONDS:
+            return state
+        dist = haversine_m(prev["lat"], prev["lng"], fix["lat"], fix["lng"])
+        speed = dist / dt
+        if speed > MAX_PLAUSIBLE_SPEED_MPS:
+            self.rejected_fixes += 1
+            return state
+
+        state["path_m"] += dist
+        if state["speed"] is None:
+            state["speed"] = speed
+        else:
+            alpha = 1 - math.exp(-dt / self.tau_seconds)
+            state["speed"] += alpha * (speed - state["speed"])
+        state["samples"] += 1
+        return state
+
+    def speed(self, state: Optional[dict], ts: int) -> float:
+        """Blended road speed (m/s) to use for the remaining distance."""
+        prior = self.profile.speed_at(ts)
+        if not state or state["speed"] is None:
+            return prior
+        w = min(self.max_observed_weight, state["samples"] / (state["samples"] + self.prior_weight))
+        blended = w * state["speed"] + (1 - w) * prior
+        return max(blended, prior * self.min_speed_fraction)
+
+    def estimate(self, state: Optional[dict], lat: float, lng: float,
+                 dropoff_lat: float, dropoff_lng: float, ts: int) -> int:
+        """ETA in seconds from (lat, lng) to the dropoff."""
+        remaining_m = haversine_m(lat, lng, dropoff_lat, dropoff_lng) * self.route_factor
+        return max(MIN_ETA_SECONDS, int(remaining_m / self.speed(state, ts)))
+
+    def observe_delivery(self, state: Optional[dict], dropoff_lat: float, dropoff_lng: float):
+        """Learn the route factor from a finished session's travelled vs straight-line distance."""
+        if not state or state["origin"] is None:
+            return
+        straight = haversine_m(state["origin"][0], state["origin"][1], dropoff_lat, dropoff_lng)
+        if straight < 500 or state["path_m"] <= 0:
+            return
+        ratio = min(2.5, max(1.0, state["path_m"] / straight))
+        self.route_factor_samples += 1
+        # Slow EWMA across deliveries; one odd trip shouldn't move it much
+        self.route_factor += 0.02 * (ratio - self.route_factor)
+
+    def stats(self) -> dict:
+        return {
+            "route_factor": round(self.route_factor, 3),
+            "route_factor_samples": self.route_factor_samples,
+            "rejected_fixes": self.rejected_fixes,
+            "profile_loaded_at": self.profile.loaded_at,
+            "profile_kmh_by_hour": [round(s * 3.6, 1) for s in self.profile.speeds_mps],
+            "profile_samples_by_hour": self.profile.samples
+        }
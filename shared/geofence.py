@@ -0,0 +1,144 @@
+"""
+Delivery Geofences
+
+Arrival detection for tracking sessions. Each session carries circular
+fences around its pickup and dropoff points:
+
+    ARRIVED_AT_PICKUP    evaluated while the order is ASSIGNED
+    ARRIVED_AT_DROPOFF   evaluated while it is PICKED_UP or IN_TRANSIT
+
+Fences are plain dicts kept on the session (session["geofences"]), so their
+state survives in the Redis session store like the ETA state does. Each
+fence stores a precomputed lat/lng bounding box; a fix is only measured
+with haversine once it falls inside the box, which rules out almost every
+fix of a delivery with four comparisons. A fence fires once, after
+GEOFENCE_CONFIRM_FIXES consecutive fixes inside it, so a single GPS jump
+doesn't announce an arrival.
+"""
+
+import math
+import os
+from typing import List, Optional
+
+from shared.eta import EARTH_RADIUS_M, haversine_m
+
+GEOFENCE_PICKUP_RADIUS_M = float(os.environ.get("GEOFENCE_PICKUP_RADIUS_M", "75"))
+GEOFENCE_DROPOFF_RADIUS_M = float(os.environ.get("GEOFENCE_DROPOFF_RADIUS_M", "50"))
+GEOFENCE_CONFIRM_FIXES = int(os.environ.get("GEOFENCE_CONFIRM_FIXES", "2"))
+
+ARRIVED_AT_PICKUP = "ARRIVED_AT_PICKUP"
+ARRIVED_AT_DROPOFF = "ARRIVED_AT_DROPOFF"
+
+_METRES_PER_DEGREE = math.radians(1) * EARTH_RADIUS_M
+
+
+def make_fence(event: str, lat: float, lng: float, radius_m: float, statuses: List[str]) -> dict:
+    """
+    Circular fence with its bounding box.
+
+    Args:
+        event: Event emitted when the rider arrives
+        lat, lng: Centre
+        radius_m: Arrival radius in metres
+        statuses: Session statuses during which the fence is evaluated
+
+    Returns:
+        JSON-serialisable fence dict
+    """
+    dlat = radius_m / _METRES_PER_DEGREE
+    # Widen by the cos of the box's pole-side edge so the box always covers the circle
+    cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+    dlng = min(180.0, radius_m / (_METRES_PER_DEGREE * cos_lat))
+    return {
+        "event": event,
+        "lat": lat,
+        "lng": lng,
+        "radius_m": radius_m,
+        "bbox": [lat - dlat, lng - dlng, lat + dlat, lng + dlng],  # min_lat, min_lng, max_lat, max_lng
+        "statuses": statuses,
+        "hits": 0,           # consecutive fixes inside
+        "fired_at": None
+    }
+
+
+class GeofenceEngine:
+    """Evaluates fixes against a session's fences and reports arrivals."""
+
+    def __init__(self, pickup_radius_m: float = GEOFENCE_PICKUP_RADIUS_M,
+                 dropoff_radius_m: float = GEOFENCE_DROPOFF_RADIUS_M,
+                 confirm_fixes: int = GEOFENCE_CONFIRM_FIXES):
+        """
+        Args:
+            pickup_radius_m: Arrival radius around the pickup point
+            dropoff_radius_m: Arrival radius around the dropoff point
+            confirm_fixes: Consecutive fixes inside a fence before it fires
+        """
+        self.pickup_radius_m = pickup_radius_m
+        self.dropoff_radius_m = dropoff_radius_m
+        self.confirm_fixes = max(1, confirm_fixes)
+
+        # Metrics
+        self.fixes_evaluated = 0
+        self.bbox_rejects = 0
+        self.distance_checks = 0
+        self.events = {ARRIVED_AT_PICKUP: 0, ARRIVED_AT_DROPOFF: 0}
+
+    def register(self, session: dict, pickup: Optional[dict], dropoff: dict):
+        """Attach pickup (when known) and dropoff fences to a new session."""
+        fences = []
+        if pickup:
+            fences.append(make_fence(
+                ARRIVED_AT_PICKUP, pickup["lat"], pickup["lng"], self.pickup_radius_m, ["ASSIGNED"]
+            ))
+        fences.append(make_fence(
+            ARRIVED_AT_DROPOFF, dropoff["lat"], dropoff["lng"], self.dropoff_radius_m, ["PICKED_UP", "IN_TRANSIT"]
+        ))
+        session["geofences"] = fences
+
+    def evaluate(self, session: dict, fix: dict) -> List[dict]:
+        """
+        Fold a fix into the session's fences.
+
+        Args:
+            session: Tracking session (its fences are updated in place)
+            fix: {lat, lng, timestamp}
+
+        Returns:
+            Events fired by this fix: [{event, at, lat, lng}]
+        """
+        fences = session.get("geofences")
+        if not fences:
+            return []
+        self.fixes_evaluated += 1
+        status = getattr(session["status"], "value", session["status"])
+        lat, lng = fix["lat"], fix["lng"]
+        fired = []
+        for fence in fences:
+            if fence["fired_at"] is not None or status not in fence["statuses"]:
+                continue
+            min_lat, min_lng, max_lat, max_lng = fence["bbox"]
+            if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                self.bbox_rejects += 1
+                fence["hits"] = 0
+                continue
+            self.distance_checks += 1
+            if haversine_m(fence["lat"], fence["lng"], lat, lng) > fence["radius_m"]:
+                fence["hits"] = 0
+                continue
+            fence["hits"] += 1
+            if fence["hits"] >= self.confirm_fixes:
+                fence["fired_at"] = fix["timestamp"]
+                self.events[fence["event"]] += 1
+                fired.append({"event": fence["event"], "at": fix["timestamp"], "lat": lat, "lng": lng})
+        return fired
+
+    def stats(self) -> dict:
+        return {
+            "pickup_radius_m": self.pickup_radius_m,
+            "dropoff_radius_m": self.dropoff_radius_m,
+            "confirm_fixes": self.confirm_fixes,
+            "fixes_evaluated": self.fixes_evaluated,
+            "bbox_rejects": self.bbox_rejects,
+            "distance_checks": self.distance_checks,
+            "events": dict(self.events)
+        }
@@ -0,0 +1,190 @@
+"""
+Shared HTTP Clients
+
+Pooled httpx clients for calls between services (and out to Hubtel). One
+client, and therefore one connection pool, is kept per target origin, so
+repeated calls reuse keep-alive connections instead of paying a TCP/TLS
+handshake each time, and a slow service can only exhaust its own pool.
+
+    async with http_client(timeout=5.0) as client:
+        await client.post(f"{TRACKING_SERVICE_URL}/tracking/start", json=payload)
+
+    with sync_http_client(timeout=10.0) as client:      # sync handlers
+        r = client.get(f"{ORDER_SERVICE_URL}/orders", headers=headers)
+
+The `with` block only scopes per-call defaults (timeout, auth, headers);
+leaving it never closes connections. Pools are closed on app shutdown once
+setup_http_clients(app) has been called. HTTP/2 is used when the optional
+`h2` package is installed.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Per-target pool sizing
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+DEFAULT_TIMEOUT = 5.0  # httpx default
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _origin(url) -> Tuple[str, str, Optional[int]]:
+    """(scheme, host, port) — the key a connection pool is shared on."""
+    u = httpx.URL(str(url))
+    return (u.scheme, u.host, u.port)
+
+
+class HTTPClientPool:
+    """Lazily created httpx clients, one per target origin."""
+
+    def __init__(self):
+        self._async: Dict[tuple, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+        self._sync: Dict[tuple, httpx.Client] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _client_options() -> dict:
+        return {
+            "limits": httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            "timeout": DEFAULT_TIMEOUT,
+            "http2": HTTP2_AVAILABLE,
+        }
+
+    def async_client(self, url) -> httpx.AsyncClient:
+        """Pooled AsyncClient for url's origin, bound to the running event loop."""
+        key = _origin(url)
+        loop = asyncio.get_running_loop()
+        entry = self._async.get(key)
+        if entry is None or entry[0] is not loop or entry[1].is_closed:
+            # AsyncClients can't be shared across event loops (e.g. test clients)
+            entry = (loop, httpx.AsyncClient(**self._client_options()))
+            self._async[key] = entry
+        return entry[1]
+
+    def sync_client(self, url) -> httpx.Client:
+        """Pooled (thread-safe) Client for url's origin."""
+        key = _origin(url)
+        with self._lock:
+            client = self._sync.get(key)
+            if client is None or client.is_closed:
+                client = httpx.Client(**self._client_options())
+                self._sync[key] = client
+            return client
+
+    async def aclose(self):
+        """Close every pool; clients are recreated on next use."""
+        entries, self._async = self._async, {}
+        loop = asyncio.get_running_loop()
+        for owner, client in entries.values():
+            if owner is loop:
+                await client.aclose()
+        with self._lock:
+            clients, self._sync = self._sync, {}
+        for client in clients.values():
+            client.close()
+
+    def stats(self) -> dict:
+        """Open pools per client type (for health/debug endpoints)."""
+        return {
+            "async_pools": len(self._async),
+            "sync_pools": len(self._sync),
+            "http2": HTTP2_AVAILABLE,
+        }
+
+
+pool = HTTPClientPool()
+
+
+class _ClientView:
+    """
+    Routes each request to the pooled client for its URL's origin, applying
+    per-call defaults. Works as both a sync and an async context manager.
+    """
+
+    def __init__(self, get_client: Callable, timeout=None, auth=None, headers: Optional[dict] = None):
+        self._get_client = get_client
+        self._timeout = timeout
+        self._auth = auth
+        self._headers = headers or {}
+
+    def request(self, method: str, url, **kwargs):
+        if self._timeout is not None:
+            kwargs.setdefault("timeout", self._timeout)
+        if self._auth is not None:
+            kwargs.setdefault("auth", self._auth)
+        if self._headers:
+            kwargs["headers"] = {**self._headers, **(kwargs.get("headers") or {})}
+        return self._get_client(url).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def http_client(timeout=None, auth=None, headers: Optional[dict] = None) -> _ClientView:
+    """
+    Async view over the shared pools.
+
+    Args:
+        timeout: Default timeout for requests made through this view
+        auth: Default auth (e.g. (client_id, secret) for Hubtel)
+        headers: Headers added to every request
+
+    Returns:
+        Object with awaitable get/post/put/patch/delete/request methods
+    """
+    return _ClientView(pool.async_client, timeout, auth, headers)
+
+
+def sync_http_client(timeout=None, auth=None, headers: Optional[dict] = None) -> _ClientView:
+    """Sync counterpart of http_client() for non-async handlers and scripts."""
+    return _ClientView(pool.sync_client, timeout, auth, headers)
+
+
+def setup_http_clients(app):
+    """Close the shared pools when the app shuts down."""
+
+    @app.on_event("shutdown")
+    async def _close_http_clients():
+        await pool.aclose()
+        logger.info("Closed pooled HTTP clients")
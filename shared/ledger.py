@@ -0,0 +1,161 @@
+"""
+Double-Entry Ledger
+
+Money held by the payment service, as append-only rows in ledger_entries.
+Every movement is one transaction of two or more legs that sum to zero:
+
+    payment         customer pays        provider -> company + platform fees
+    payout_hold     payout is being sent company -> payouts in flight
+    payout_sent     provider accepted it in flight -> provider
+    payout_release  send failed          in flight -> company
+    payout_refund   payout failed later  provider -> company
+
+Entries are never updated or deleted. An account's balance is its
+ledger_accounts snapshot (the sum of its entries up to snapshot.entry_id)
+plus the tail of entries after it; the snapshot is rolled forward once the
+tail reaches LEDGER_SNAPSHOT_EVERY entries, so a balance read touches at
+most that many rows however long the account's history is.
+
+Posting locks the ledger_accounts row of every account involved (in name
+order, so concurrent posts can't deadlock) until the caller commits. That
+makes "check funds, then debit" safe across workers, and guarantees no
+uncommitted entry is left behind when a snapshot moves past it.
+"""
+
+import os
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from shared.models import LedgerAccount, LedgerEntry
+
+LEDGER_SNAPSHOT_EVERY = int(os.environ.get("LEDGER_SNAPSHOT_EVERY", "100"))
+
+ACCOUNT_PROVIDER = "external:hubtel"       # money held at / paid out through Hubtel
+ACCOUNT_PLATFORM_FEES = "platform:fees"
+ACCOUNT_PAYOUTS_IN_FLIGHT = "payouts:in_flight"
+ACCOUNT_UNALLOCATED = "escrow:unallocated"  # paid orders without a company yet
+
+
+class LedgerError(ValueError):
+    """Transaction legs don't balance."""
+
+
+class InsufficientFunds(LedgerError):
+    """A posting would take an account below zero."""
+
+
+def company_account(company_id: str) -> str:
+    return f"company:{company_id}"
+
+
+def _tail(db: Session, account: LedgerAccount) -> Tuple[int, int, Optional[int]]:
+    """(sum, count, last id) of the account's entries after its snapshot."""
+    total, count, last_id = db.execute(
+        select(func.coalesce(func.sum(LedgerEntry.amount), 0), func.count(), func.max(LedgerEntry.id))
+        .where(LedgerEntry.account == account.account, LedgerEntry.id > account.entry_id)
+    ).one()
+    return int(total), count, last_id
+
+
+def _lock_account(db: Session, name: str) -> LedgerAccount:
+    """The account's snapshot row, locked FOR UPDATE (created on first use)."""
+    query = db.query(LedgerAccount).filter(LedgerAccount.account == name).with_for_update().populate_existing()
+    account = query.first()
+    if account is None:
+        try:
+            with db.begin_nested():
+                db.add(LedgerAccount(account=name, balance=0, entry_id=0))
+        except IntegrityError:
+            pass  # another worker created it first
+        account = query.one()
+    return account
+
+
+def balance(db: Session, account: str) -> int:
+    """Current balance: latest snapshot plus the entries after it."""
+    snapshot = db.get(LedgerAccount, account)
+    if snapshot is None:
+        snapshot = LedgerAccount(account=account, balance=0, entry_id=0)
+    total, _, _ = _tail(db, snapshot)
+    return (snapshot.balance or 0) + total
+
+
+def post(db: Session, entry_type: str, legs: Iterable[Tuple[str, int]], payment_id: Optional[str] = None,
+         payout_id: Optional[str] = None, ref: Optional[str] = None,
+         require_funds: Optional[str] = None) -> str:
+    """
+    Append a balanced transaction. The caller commits (or rolls back).
+
+    Args:
+        entry_type: What happened (payment, payout_hold, ...)
+        legs: (account, signed amount) pairs summing to zero
+        payment_id, payout_id, ref: Recorded on every leg
+        require_funds: Account that must not go below zero; raises
+            InsufficientFunds (before anything is written) if it would
+
+    Returns:
+        Transaction id shared by the legs
+    """
+    legs = [(account, int(amount)) for account, amount in legs if amount]
+    if sum(amount for _, amount in legs) != 0:
+        raise LedgerError(f"{entry_type} legs don't balance: {legs}")
+    if not legs:
+        raise LedgerError(f"{entry_type} has no non-zero legs")
+
+    accounts = {name: _lock_account(db, name) for name in sorted({name for name, _ in legs})}
+    if require_funds:
+        change = sum(amount for name, amount in legs if name == require_funds)
+        available = balance(db, require_funds)
+        if available + change < 0:
+            raise InsufficientFunds(f"{require_funds} has {available}, needs {-change}")
+
+    txn_id = str(uuid.uuid4())
+    db.add_all([
+        LedgerEntry(txn_id=txn_id, account=name, amount=amount, entry_type=entry_type,
+                    payment_id=payment_id, payout_id=payout_id, ref=ref)
+        for name, amount in legs
+    ])
+    db.flush()
+
+    for account in accounts.values():
+        total, count, last_id = _tail(db, account)
+        if count >= LEDGER_SNAPSHOT_EVERY:
+            account.balance = (account.balance or 0) + total
+            account.entry_id = last_id
+    return txn_id
+
+
+def payout_in_flight(db: Session, payout_id: str) -> int:
+    """Amount a payout still holds in ACCOUNT_PAYOUTS_IN_FLIGHT."""
+    return int(db.execute(
+        select(func.coalesce(func.sum(LedgerEntry.amount), 0))
+        .where(LedgerEntry.payout_id == payout_id, LedgerEntry.account == ACCOUNT_PAYOUTS_IN_FLIGHT)
+    ).scalar())
+
+
+def entries(db: Session, account: Optional[str] = None, account_prefix: Optional[str] = None,
+            before: Optional[int] = None, limit: int = 100) -> List[LedgerEntry]:
+    """
+    Ledger entries, newest first (keyset paginated on id).
+
+    Args:
+        account: Exact account
+        account_prefix: Account name prefix, e.g. "company:"
+        before: Only entries with id < before (the last id of the previous page)
+        limit: Page size
+
+    Returns:
+        List of LedgerEntry
+    """
+    query = select(LedgerEntry)
+    if account:
+        query = query.where(LedgerEntry.account == account)
+    if account_prefix:
+        query = query.where(LedgerEntry.account.startswith(account_prefix))
+    if before:
+        query = query.where(LedgerEntry.id < before)
+    return list(db.execute(query.order_by(LedgerEntry.id.desc()).limit(limit)).scalars())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, ForeignKey, Enum, JSON, Text
+from sqlalchemy import Column, String, Integer, BigInteger, Float, DateTime, Boolean, ForeignKey, Enum, JSON, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -21,6 +21,14 @@ class OrderStatus(str, enum.Enum):
     DELIVERED            = "DELIVERED"
     CANCELLED            = "CANCELLED"
 
+# Statuses that count towards a rider's current load
+ACTIVE_ORDER_STATUSES = (
+    OrderStatus.AWAITING_ACCEPTANCE,
+    OrderStatus.ASSIGNED,
+    OrderStatus.PICKED_UP,
+    OrderStatus.IN_TRANSIT,
+)
+
 class PaymentStatus(str, enum.Enum):
     INITIATED = "INITIATED"
     PENDING = "PENDING"
@@ -153,6 +161,9 @@ class Order(Base):
     assigned_at   = Column(DateTime, nullable=True)
     picked_up_at  = Column(DateTime, nullable=True)
     delivered_at  = Column(DateTime, nullable=True)
+    # Geofence arrivals reported by tracking_service (first report wins)
+    arrived_pickup_at  = Column(DateTime, nullable=True)
+    arrived_dropoff_at = Column(DateTime, nullable=True)
 
     # Acceptance timeout (Option 3 — Bolt-style)
     acceptance_deadline = Column(DateTime, nullable=True)   # now() + 90s when sent to rider
@@ -164,6 +175,14 @@ class Order(Base):
     company = relationship("RiderCompany")
     assigned_rider = relationship("Rider", back_populates="orders")
     tracking = relationship("OrderTracking", back_populates="order", uselist=False)
+    
+    # Composite indexes for the hot predicates (migration: alembic/versions/0001_hot_query_indexes.py)
+    __table_args__ = (
+        Index("ix_orders_rider_status", "assigned_rider_id", "status"),           # rider load / availability
+        Index("ix_orders_status_deadline", "status", "acceptance_deadline"),     # acceptance timeouts
+        Index("ix_orders_company_status", "company_id", "status"),               # company dashboards
+        Index("ix_orders_merchant_created", "merchant_id", "created_at", "id"),  # merchant order list (keyset)
+    )
 
 class OrderTracking(Base):
     __tablename__ = "order_tracking"
@@ -180,6 +199,20 @@ class OrderTracking(Base):
     # Relationships
     order = relationship("Order", back_populates="tracking")
 
+class TrackingPoint(Base):
+    """Location fix from a tracking session (flushed in batches, see shared/tracking_history.py)."""
+    __tablename__ = "tracking_points"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    tracking_id = Column(String(36), nullable=False)  # tracking_service session id
+    ts = Column(Integer, nullable=False)              # epoch seconds of the fix
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_tracking_points_tracking_ts", "tracking_id", "ts"),  # route replay
+    )
+
 # ==================== Payment Models ====================
 class Payment(Base):
     __tablename__ = "payments"
@@ -227,6 +260,83 @@ class Payout(Base):
     hubtel_ref = Column(String(100), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     processed_at = Column(DateTime, nullable=True)
+    schedule = Column(String(20), default="immediate")  # immediate, 3day, weekly
+    next_run = Column(Integer, nullable=True)           # epoch seconds of the next attempt
+    retries = Column(Integer, default=0)
+    reason = Column(String(100), nullable=True)
+    last_retry_at = Column(Integer, nullable=True)
+    cancelled_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_payouts_status_next_run", "status", "next_run"),  # due payouts (payment_service scheduler)
+    )
+
+# ==================== Ledger Models ====================
+class PaymentIntent(Base):
+    """Checkout started through payment_service's /payments/initiate (Hubtel Receive Money)."""
+    __tablename__ = "payment_intents"
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    status = Column(String(30), default="CREATED", index=True)  # CREATED, PENDING_CUSTOMER, PAID, ESCROW, RELEASED, FAILED
+    amount = Column(Integer, nullable=False)                     # GHS integer units
+    currency = Column(String(3), default="GHS")
+    phone = Column(String(20), nullable=True)
+    meta = Column("metadata", JSON, default=dict)
+    company_id = Column(String(36), nullable=True, index=True)  # metadata.company_id, credited when paid
+    platform_fee = Column(Integer, default=0)
+    merchant_amount = Column(Integer, default=0)
+    hubtel_ref = Column(String(100), nullable=True)
+    reference = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LedgerEntry(Base):
+    """One leg of a double-entry ledger transaction (append-only, see shared/ledger.py)."""
+    __tablename__ = "ledger_entries"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    txn_id = Column(String(36), nullable=False, index=True)  # legs of one transaction sum to zero
+    account = Column(String(100), nullable=False)              # company:<id>, platform:fees, ...
+    amount = Column(BigInteger, nullable=False)                # signed, GHS integer units
+    entry_type = Column(String(30), nullable=False)            # payment, payout_hold, payout_sent, ...
+    payment_id = Column(String(36), nullable=True)
+    payout_id = Column(String(36), nullable=True)
+    ref = Column(String(100), nullable=True)                   # provider reference
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_ledger_entries_account_id", "account", "id"),  # balance tail, statements (keyset)
+        Index("ix_ledger_entries_payout", "payout_id"),
+    )
+
+class LedgerAccount(Base):
+    """Per-account balance snapshot; also the row locked while posting to the account."""
+    __tablename__ = "ledger_accounts"
+    
+    account = Column(String(100), primary_key=True)
+    balance = Column(BigInteger, nullable=False, default=0)   # sum of entries up to entry_id
+    entry_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PaymentEvent(Base):
+    """Payment service audit trail: alerts, payout webhooks, reconciliations, refunds."""
+    __tablename__ = "payment_events"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    kind = Column(String(20), nullable=False)  # alert, webhook, reconcile, refund
+    level = Column(String(20), nullable=True)
+    message = Column(Text, nullable=True)
+    payment_id = Column(String(36), nullable=True, index=True)
+    payout_id = Column(String(36), nullable=True)
+    status = Column(String(50), nullable=True)
+    hubtel_ref = Column(String(100), nullable=True)
+    amount = Column(Float, nullable=True)
+    data = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_payment_events_kind_id", "kind", "id"),  # newest alerts / webhooks
+    )
 
 # ==================== Rider Document Models ====================
 class RiderDocument(Base):
@@ -264,6 +374,30 @@ class RiderReview(Base):
     
     # Relationships
     rider = relationship("Rider", back_populates="reviews")
+    
+    __table_args__ = (
+        Index("ix_rider_reviews_rider_created", "rider_id", "created_at"),  # a rider's reviews, newest first
+    )
+
+class RiderStats(Base):
+    """Incrementally maintained per-rider aggregates (see shared/rider_stats.py)."""
+    __tablename__ = "rider_stats"
+    
+    rider_id = Column(String(36), ForeignKey("riders.id"), primary_key=True)
+    num_ratings = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    active_orders = Column(Integer, nullable=False, default=0)  # AWAITING_ACCEPTANCE..IN_TRANSIT
+    eta_count = Column(Integer, nullable=False, default=0)      # assigned orders with an eta_min
+    eta_sum = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.num_ratings if self.num_ratings else None
+    
+    @property
+    def avg_delivery_time(self):
+        return self.eta_sum / self.eta_count if self.eta_count else None
 
 # ==================== Messaging Models ====================
 class Message(Base):
@@ -0,0 +1,211 @@
+"""
+Pub/Sub Backplane
+
+Fans tracking events out across every replica of a service. Publishers
+never deliver to their local websockets directly; they publish, and each
+replica's subscription hands every message to a local handler (for
+tracking_service, ConnectionManager.broadcast), which delivers it to the
+sockets that replica holds. A rider update received by replica A therefore
+reaches a customer watching on replica B.
+
+    backplane = create_backplane(os.environ.get("TRACKING_PUBSUB_URL"))
+    await backplane.start(connection_manager.broadcast)   # on startup
+    await backplane.publish(tracking_id, {"type": "location_update", ...})
+
+Backends:
+
+    InProcessBackplane   single process; publish calls the handler directly
+    RedisBackplane       Redis PUBLISH / PSUBSCRIBE on `<prefix>*`; any
+                         Redis-protocol server or compatible client works
+
+Delivery is at-most-once. A replica that is reconnecting misses what was
+published meanwhile; websocket clients recover their state from the next
+update or from initial_state on reconnect.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Optional
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    aioredis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, dict], Awaitable[None]]
+
+
+async def _aclose(obj):
+    """Close a redis client/pubsub across redis-py versions (aclose() from 5.0.1)."""
+    close = getattr(obj, "aclose", None) or getattr(obj, "close", None)
+    if close is not None:
+        await close()
+
+
+class Backplane:
+    """Publish to a channel; deliver every channel's messages to one local handler."""
+
+    backend = "abstract"
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+        self.published_total = 0
+        self.delivered_total = 0
+        self.handler_errors = 0
+
+    async def start(self, handler: Handler):
+        """
+        Begin delivering messages.
+
+        Args:
+            handler: Coroutine called with (channel, message) for each message
+        """
+        self.handler = handler
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    async def close(self):
+        """Stop delivering and release backend resources."""
+
+    async def _deliver(self, channel: str, message: dict):
+        if self.handler is None:
+            return
+        try:
+            await self.handler(channel, message)
+            self.delivered_total += 1
+        except Exception as e:
+            self.handler_errors += 1
+            logger.error(f"Backplane handler failed for {channel}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "published_total": self.published_total,
+            "delivered_total": self.delivered_total,
+            "handler_errors": self.handler_errors
+        }
+
+
+class InProcessBackplane(Backplane):
+    """Loopback backplane for a single process."""
+
+    backend = "memory"
+
+    async def publish(self, channel: str, message: dict):
+        self.published_total += 1
+        await self._deliver(channel, message)
+
+
+class RedisBackplane(Backplane):
+    """
+    Messages are JSON on Redis channel `<prefix><channel>`. Each replica holds
+    one pattern subscription and reconnects with backoff if it drops.
+
+    The client only needs the redis.asyncio methods publish and pubsub().
+    """
+
+    backend = "redis"
+    RECONNECT_DELAY_MAX = 10.0
+
+    def __init__(self, client, prefix: str = "tracking:events:"):
+        """
+        Args:
+            client: redis.asyncio.Redis (or a compatible stand-in)
+            prefix: Namespace for channels
+        """
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self._listener: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBackplane":
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("TRACKING_PUBSUB_URL points at Redis but the `redis` package is not installed")
+        from shared.tracking_store import redis_client
+        return cls(redis_client(url), **kwargs)
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        # Subscribe before returning so nothing published after startup is missed
+        pubsub = None
+        try:
+            pubsub = await self._subscribe()
+        except Exception as e:
+            logger.error(f"Backplane subscribe failed ({e}); retrying in the background")
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def publish(self, channel: str, message: dict):
+        self.published_total += 1
+        await self.client.publish(f"{self.prefix}{channel}", json.dumps(message))
+
+    async def _subscribe(self):
+        pubsub = self.client.pubsub()
+        await pubsub.psubscribe(f"{self.prefix}*")
+        return pubsub
+
+    async def _listen(self, pubsub=None):
+        delay = 0.5
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = await self._subscribe()
+                    delay = 0.5
+                async for item in pubsub.listen():
+                    if item.get("type") != "pmessage":
+                        continue
+                    channel = item["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    await self._deliver(channel[len(self.prefix):], json.loads(item["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.reconnects += 1
+                logger.error(f"Backplane subscription lost ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_DELAY_MAX)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await _aclose(pubsub)
+                    except Exception:
+                        pass
+                pubsub = None
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+        await _aclose(self.client)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "reconnects": self.reconnects}
+
+
+def create_backplane(url: Optional[str] = None) -> Backplane:
+    """
+    Build a backplane from a URL: memory:// (default) or redis://, rediss://, unix://.
+
+    Args:
+        url: Backplane URL, usually TRACKING_PUBSUB_URL
+
+    Returns:
+        Backplane instance (call start() before publishing)
+    """
+    if not url or url.startswith("memory://"):
+        return InProcessBackplane()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackplane.from_url(url)
+    raise ValueError(f"Unsupported backplane URL: {url}")
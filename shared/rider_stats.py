@@ -0,0 +1,269 @@
+"""
+Rider Stats Materialization
+
+Keeps one `rider_stats` row per rider (rating count/sum, active-order load,
+delivery-time count/sum) so the assignment engine, the availability check
+and the rating endpoints read a single row instead of aggregating
+`rider_reviews` and `orders` on every call.
+
+Importing this module registers a Session after_flush hook that applies
+deltas whenever an Order or RiderReview is inserted, updated or deleted
+through the ORM, in the same transaction as the change. Counters are
+updated with `col = col + delta` so concurrent writers never lose updates.
+A missing row is recomputed from the source tables on first touch.
+
+rebuild_rider_stats() recomputes everything from scratch; run it after
+bulk imports or raw SQL edits:
+
+    python -m shared.rider_stats
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, func, case, select, update, insert, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from shared.models import (
+    Order, Rider, RiderReview, RiderStats, ACTIVE_ORDER_STATUSES
+)
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("num_ratings", "rating_sum", "active_orders", "eta_count", "eta_sum")
+
+# Attributes whose old value is needed to compute a delta. active_history makes
+# SQLAlchemy load the committed value before an expired attribute is overwritten
+# (e.g. order.status = ... right after a commit), so history.deleted is reliable.
+TRACKED_ATTRIBUTES = (
+    Order.assigned_rider_id, Order.status, Order.eta_min,
+    RiderReview.rider_id, RiderReview.rating,
+)
+
+def _load_old_value(target, value, oldvalue, initiator):
+    """No-op 'set' listener; registering it is what enables active_history."""
+
+
+for _attr in TRACKED_ATTRIBUTES:
+    event.listen(_attr, "set", _load_old_value, active_history=True)
+
+# ==================== Delta Computation ====================
+
+def _old_new(obj, attr: str):
+    """(committed value, pending value) of an attribute from its history."""
+    hist = inspect(obj).attrs[attr].history
+    current = getattr(obj, attr)
+    old = hist.deleted[0] if hist.deleted else (hist.unchanged[0] if hist.unchanged else current)
+    new = hist.added[0] if hist.added else current
+    return old, new
+
+
+def _add_order(deltas: dict, rider_id: Optional[str], status, eta_min, sign: int):
+    """Add (sign=+1) or remove (sign=-1) one order's contribution."""
+    if not rider_id:
+        return
+    d = deltas[rider_id]
+    if status in ACTIVE_ORDER_STATUSES:
+        d["active_orders"] += sign
+    if eta_min is not None:
+        d["eta_count"] += sign
+        d["eta_sum"] += sign * eta_min
+
+
+def _add_review(deltas: dict, rider_id: Optional[str], rating, sign: int):
+    """Add (sign=+1) or remove (sign=-1) one review's contribution."""
+    if not rider_id or rating is None:
+        return
+    d = deltas[rider_id]
+    d["num_ratings"] += sign
+    d["rating_sum"] += sign * rating
+
+
+def _collect_deltas(session: Session) -> dict:
+    """Per-rider counter deltas for the Orders/RiderReviews in this flush."""
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            _add_order(deltas, obj.assigned_rider_id, obj.status, obj.eta_min, +1)
+        elif isinstance(obj, RiderReview):
+            _add_review(deltas, obj.rider_id, obj.rating, +1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            old_rider, new_rider = _old_new(obj, "assigned_rider_id")
+            old_status, new_status = _old_new(obj, "status")
+            old_eta, new_eta = _old_new(obj, "eta_min")
+            if (old_rider, old_status, old_eta) != (new_rider, new_status, new_eta):
+                _add_order(deltas, old_rider, old_status, old_eta, -1)
+                _add_order(deltas, new_rider, new_status, new_eta, +1)
+        elif isinstance(obj, RiderReview):
+            old_rider, new_rider = _old_new(obj, "rider_id")
+            old_rating, new_rating = _old_new(obj, "rating")
+            if (old_rider, old_rating) != (new_rider, new_rating):
+                _add_review(deltas, old_rider, old_rating, -1)
+                _add_review(deltas, new_rider, new_rating, +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            old_rider, _ = _old_new(obj, "assigned_rider_id")
+            old_status, _ = _old_new(obj, "status")
+            old_eta, _ = _old_new(obj, "eta_min")
+            _add_order(deltas, old_rider, old_status, old_eta, -1)
+        elif isinstance(obj, RiderReview):
+            old_rider, _ = _old_new(obj, "rider_id")
+            old_rating, _ = _old_new(obj, "rating")
+            _add_review(deltas, old_rider, old_rating, -1)
+
+    return {
+        rider_id: d for rider_id, d in deltas.items()
+        if any(d[c] for c in COUNTERS)
+    }
+
+# ==================== Aggregation ====================
+
+def _aggregate(connection, rider_ids: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Compute counters from rider_reviews/orders (all riders if rider_ids is None)."""
+    rows = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    rating_q = select(
+        RiderReview.rider_id, func.count(RiderReview.id), func.sum(RiderReview.rating)
+    ).group_by(RiderReview.rider_id)
+    if rider_ids is not None:
+        rating_q = rating_q.where(RiderReview.rider_id.in_(rider_ids))
+    for rider_id, num_ratings, rating_sum in connection.execute(rating_q):
+        rows[rider_id]["num_ratings"] = num_ratings or 0
+        rows[rider_id]["rating_sum"] = rating_sum or 0
+
+    active = case((Order.status.in_(ACTIVE_ORDER_STATUSES), 1), else_=0)
+    order_q = select(
+        Order.assigned_rider_id,
+        func.sum(active),
+        func.count(Order.eta_min),
+        func.sum(Order.eta_min)
+    ).where(Order.assigned_rider_id.isnot(None)).group_by(Order.assigned_rider_id)
+    if rider_ids is not None:
+        order_q = order_q.where(Order.assigned_rider_id.in_(rider_ids))
+    for rider_id, active_orders, eta_count, eta_sum in connection.execute(order_q):
+        rows[rider_id]["active_orders"] = int(active_orders or 0)
+        rows[rider_id]["eta_count"] = eta_count or 0
+        rows[rider_id]["eta_sum"] = float(eta_sum or 0)
+
+    if rider_ids is not None:
+        # Riders with no reviews or orders still get a zero row
+        return {rider_id: rows[rider_id] for rider_id in rider_ids}
+    return dict(rows)
+
+
+def _sync_rider_ratings(connection, rider_ids: Iterable[str]):
+    """Mirror rating counters onto Rider.avg_rating / Rider.num_ratings."""
+    rider_ids = list(rider_ids)
+    if not rider_ids:
+        return
+    for rider_id, num_ratings, rating_sum in connection.execute(
+        select(RiderStats.rider_id, RiderStats.num_ratings, RiderStats.rating_sum)
+        .where(RiderStats.rider_id.in_(rider_ids))
+    ):
+        connection.execute(
+            update(Rider).where(Rider.id == rider_id).values(
+                num_ratings=num_ratings,
+                avg_rating=(rating_sum / num_ratings) if num_ratings else 0.0
+            )
+        )
+
+# ==================== Incremental Maintenance ====================
+
+def _apply_deltas(connection, deltas: dict):
+    """Add counter deltas to rider_stats rows, creating missing rows from source data."""
+    now = datetime.utcnow()
+    for rider_id, d in deltas.items():
+        result = connection.execute(
+            update(RiderStats).where(RiderStats.rider_id == rider_id).values(
+                updated_at=now,
+                **{c: getattr(RiderStats, c) + d[c] for c in COUNTERS}
+            )
+        )
+        if result.rowcount:
+            continue
+
+        # No row yet: the aggregate already includes this flush's changes
+        counters = _aggregate(connection, [rider_id])[rider_id]
+        try:
+            with connection.begin_nested():
+                connection.execute(
+                    insert(RiderStats).values(rider_id=rider_id, updated_at=now, **counters)
+                )
+        except IntegrityError:
+            # Another writer created the row first; fall back to the delta update
+            connection.execute(
+                update(RiderStats).where(RiderStats.rider_id == rider_id).values(
+                    updated_at=now,
+                    **{c: getattr(RiderStats, c) + d[c] for c in COUNTERS}
+                )
+            )
+
+    _sync_rider_ratings(connection, [
+        rider_id for rider_id, d in deltas.items() if d["num_ratings"] or d["rating_sum"]
+    ])
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_rider_stats(session: Session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+# ==================== Reads & Rebuild ====================
+
+def load_rider_stats(db: Session, rider_ids: List[str]) -> Dict[str, RiderStats]:
+    """Fetch rider_stats rows for the given riders (missing riders are omitted)."""
+    if not rider_ids:
+        return {}
+    rows = db.query(RiderStats).filter(RiderStats.rider_id.in_(rider_ids)).all()
+    return {row.rider_id: row for row in rows}
+
+
+def rebuild_rider_stats(db: Session, rider_ids: Optional[List[str]] = None) -> int:
+    """
+    Recompute rider_stats from rider_reviews and orders.
+
+    Args:
+        db: Database session
+        rider_ids: Riders to rebuild (all riders if None)
+
+    Returns:
+        Number of rider_stats rows written
+    """
+    connection = db.connection()
+    if rider_ids is None:
+        rider_ids = [row[0] for row in connection.execute(select(Rider.id))]
+    counters = _aggregate(connection, rider_ids)
+    now = datetime.utcnow()
+
+    for start in range(0, len(rider_ids), 500):
+        chunk = rider_ids[start:start + 500]
+        connection.execute(RiderStats.__table__.delete().where(RiderStats.rider_id.in_(chunk)))
+        connection.execute(insert(RiderStats), [
+            {"rider_id": rider_id, "updated_at": now, **counters[rider_id]}
+            for rider_id in chunk
+        ])
+        _sync_rider_ratings(connection, chunk)
+
+    db.commit()
+    logger.info(f"Rebuilt rider_stats for {len(rider_ids)} riders")
+    return len(rider_ids)
+
+
+if __name__ == "__main__":
+    from shared.database import SessionLocal, engine, Base
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        rebuild_rider_stats(session)
+    finally:
+        session.close()
@@ -0,0 +1,76 @@
+"""
+Compact Tracking Frames
+
+Binary encoding of location_update frames for websocket clients that opt
+in (subprotocol `anomaah.compact.v1`, or `?protocol=compact`). The full
+session still arrives as JSON in initial_state; after that each update is
+a 16-byte delta carrying only what changes:
+
+    offset  size  field
+    0       1     frame type (0x01 = location)
+    1       1     status code (index into STATUS_CODES, 0xFF = unknown)
+    2       4     lat * 1e7, int32        (~1 cm resolution)
+    6       4     lng * 1e7, int32
+    10      2     eta_seconds, uint16     (0xFFFF = unknown, capped below)
+    12      4     updated_at, uint32 epoch seconds
+
+All fields are little-endian. A fix with no location yet is sent as
+lat = lng = INT32_MIN. Control messages (pong, error) stay JSON text
+frames, so clients tell the formats apart by websocket frame type.
+"""
+
+import struct
+from typing import Optional
+
+COMPACT_SUBPROTOCOL = "anomaah.compact.v1"
+
+FRAME_LOCATION = 0x01
+STATUS_CODES = ("ASSIGNED", "PICKED_UP", "IN_TRANSIT", "DELIVERED")
+STATUS_UNKNOWN = 0xFF
+ETA_UNKNOWN = 0xFFFF
+NO_LOCATION = -2 ** 31
+COORD_SCALE = 10_000_000
+
+_LOCATION = struct.Struct("<BBiiHI")
+FRAME_SIZE = _LOCATION.size  # 16
+
+
+def encode_location_frame(data: dict) -> bytes:
+    """
+    Pack a location_update payload (the `data` of the JSON frame).
+
+    Args:
+        data: Session data as built by tracking_service's _get_session_data
+
+    Returns:
+        FRAME_SIZE bytes
+    """
+    loc = data.get("current_location") or {}
+    lat, lng = loc.get("lat"), loc.get("lng")
+    if lat is None or lng is None:
+        lat_i = lng_i = NO_LOCATION
+    else:
+        lat_i, lng_i = round(lat * COORD_SCALE), round(lng * COORD_SCALE)
+
+    status = data.get("status")
+    status_code = STATUS_CODES.index(status) if status in STATUS_CODES else STATUS_UNKNOWN
+    eta = data.get("eta_seconds")
+    eta_code = ETA_UNKNOWN if eta is None else min(max(int(eta), 0), ETA_UNKNOWN - 1)
+
+    return _LOCATION.pack(FRAME_LOCATION, status_code, lat_i, lng_i, eta_code, int(data.get("updated_at") or 0))
+
+
+def decode_location_frame(frame: bytes) -> Optional[dict]:
+    """Inverse of encode_location_frame (None for unknown frame types)."""
+    frame_type, status_code, lat_i, lng_i, eta_code, updated_at = _LOCATION.unpack(frame)
+    if frame_type != FRAME_LOCATION:
+        return None
+    return {
+        "status": STATUS_CODES[status_code] if status_code < len(STATUS_CODES) else None,
+        "current_location": (
+            None if lat_i == NO_LOCATION
+            else {"lat": lat_i / COORD_SCALE, "lng": lng_i / COORD_SCALE}
+        ),
+        "eta_seconds": None if eta_code == ETA_UNKNOWN else eta_code,
+        "updated_at": updated_at,
+    }
@@ -0,0 +1,264 @@
+"""
+Tracking Location History
+
+Per-session breadcrumbs for route replay and distance travelled.
+
+    LocationRing     bounded ring of (ts, lat, lng) fixes in flat arrays;
+                     remembers which fixes haven't been persisted yet
+    RouteRecorder    one ring per live session on this replica; flush()
+                     writes the unpersisted fixes of every ring to the
+                     tracking_points table in one batch
+    simplify_route   Douglas-Peucker downsampling for polylines
+    route_length_m   distance along a sequence of fixes
+
+Recording is cheap (three array writes) and never touches the database on
+the request path; the service calls flush() every few seconds or once
+enough fixes are pending. A replica that dies loses at most its unflushed
+fixes. Each replica records only the fixes it received, so readers combine
+the table with this replica's unflushed tail.
+"""
+
+import logging
+import math
+import time
+from array import array
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import insert, select
+
+from shared.eta import EARTH_RADIUS_M, haversine_m
+
+logger = logging.getLogger(__name__)
+
+Point = Tuple[int, float, float]  # (ts, lat, lng)
+
+
+class LocationRing:
+    """
+    Last `capacity` fixes of one session, oldest overwritten first. The
+    arrays grow with the session up to capacity, so short deliveries don't
+    pay for a full ring.
+    """
+
+    __slots__ = ("capacity", "ts", "lat", "lng", "head", "size", "unflushed", "overwritten", "last_append")
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.ts = array("q")
+        self.lat = array("d")
+        self.lng = array("d")
+        self.head = 0          # next slot to write
+        self.size = 0
+        self.unflushed = 0     # newest `unflushed` fixes aren't in the table yet
+        self.overwritten = 0   # unflushed fixes lost because the ring wrapped
+        self.last_append = 0.0
+
+    def append(self, ts: int, lat: float, lng: float) -> bool:
+        """Add a fix; returns False for a repeat of the newest one."""
+        if self.size:
+            last = (self.head - 1) % self.capacity
+            if self.ts[last] == ts and self.lat[last] == lat and self.lng[last] == lng:
+                return False
+        if self.size < self.capacity:
+            self.ts.append(ts)
+            self.lat.append(lat)
+            self.lng.append(lng)
+            self.size += 1
+        else:
+            self.ts[self.head], self.lat[self.head], self.lng[self.head] = ts, lat, lng
+        self.head = (self.head + 1) % self.capacity
+        if self.unflushed == self.capacity:
+            self.overwritten += 1
+        else:
+            self.unflushed += 1
+        self.last_append = time.monotonic()
+        return True
+
+    def _tail(self, n: int) -> List[Point]:
+        start = (self.head - n) % self.capacity
+        return [
+            (self.ts[i], self.lat[i], self.lng[i])
+            for i in ((start + k) % self.capacity for k in range(n))
+        ]
+
+    def points(self) -> List[Point]:
+        """Every buffered fix, oldest first."""
+        return self._tail(self.size)
+
+    def pending(self) -> List[Point]:
+        """Fixes not yet flushed, oldest first."""
+        return self._tail(self.unflushed)
+
+    def mark_flushed(self, n: int):
+        """Record that the oldest `n` of the pending fixes were written."""
+        self.unflushed = max(0, self.unflushed - n)
+
+
+class RouteRecorder:
+    """Buffers fixes per tracking session and flushes them to tracking_points."""
+
+    def __init__(self, capacity: int = 256, batch_size: int = 500, idle_seconds: float = 3600):
+        """
+        Args:
+            capacity: Fixes kept per session in memory
+            batch_size: Pending fixes (all sessions) at which a flush is due
+            idle_seconds: Drop a fully flushed ring after this long without fixes
+                (finish() drops it as soon as its session ends)
+        """
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self.rings: Dict[str, LocationRing] = {}
+        self.finished: Set[str] = set()  # ended sessions whose rings still hold unflushed fixes
+        self.pending_total = 0
+        self.flushed_total = 0
+        self.flush_errors = 0
+
+    def record(self, tracking_id: str, ts: int, lat: float, lng: float) -> bool:
+        """
+        Buffer a fix.
+
+        Returns:
+            True once pending fixes reach batch_size (the caller should flush)
+        """
+        ring = self.rings.get(tracking_id)
+        if ring is None:
+            ring = self.rings[tracking_id] = LocationRing(self.capacity)
+        self.finished.discard(tracking_id)
+        before = ring.unflushed
+        ring.append(ts, lat, lng)
+        self.pending_total += ring.unflushed - before
+        return self.pending_total >= self.batch_size
+
+    def pending(self, tracking_id: str) -> List[Point]:
+        """This replica's unflushed fixes for a session."""
+        ring = self.rings.get(tracking_id)
+        return ring.pending() if ring else []
+
+    def finish(self, tracking_id: str):
+        """Release a session's ring once its pending fixes are written (now, if there are none)."""
+        ring = self.rings.get(tracking_id)
+        if ring is None:
+            return
+        if ring.unflushed:
+            self.finished.add(tracking_id)
+        else:
+            del self.rings[tracking_id]
+
+    async def flush(self) -> int:
+        """Write every ring's pending fixes in one transaction; returns the count written."""
+        from shared.database import AsyncSessionLocal
+        from shared.models import TrackingPoint
+
+        batch, taken = [], []
+        for tracking_id, ring in self.rings.items():
+            points = ring.pending()
+            if points:
+                taken.append((ring, len(points)))
+                batch.extend(
+                    {"tracking_id": tracking_id, "ts": ts, "lat": lat, "lng": lng}
+                    for ts, lat, lng in points
+                )
+        if batch:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(TrackingPoint), batch)
+                    await db.commit()
+            except Exception as e:
+                # Fixes stay pending and are retried on the next flush
+                self.flush_errors += 1
+                logger.error(f"Failed to flush {len(batch)} tracking points: {e}")
+                return 0
+            for ring, n in taken:
+                ring.mark_flushed(n)
+            self.flushed_total += len(batch)
+            self.pending_total = sum(ring.unflushed for ring in self.rings.values())
+
+        idle_before = time.monotonic() - self.idle_seconds
+        for tracking_id in [t for t, r in self.rings.items() if not r.unflushed and r.last_append < idle_before]:
+            del self.rings[tracking_id]
+        for tracking_id in [t for t in self.finished if t not in self.rings or not self.rings[t].unflushed]:
+            self.rings.pop(tracking_id, None)
+            self.finished.discard(tracking_id)
+        return len(batch)
+
+    async def route(self, tracking_id: str) -> List[Point]:
+        """Every stored fix for a session plus this replica's unflushed ones, in time order."""
+        from shared.database import AsyncSessionLocal
+        from shared.models import TrackingPoint
+
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(TrackingPoint.ts, TrackingPoint.lat, TrackingPoint.lng)
+                .where(TrackingPoint.tracking_id == tracking_id)
+                .order_by(TrackingPoint.ts, TrackingPoint.id)
+            )).all()
+        points = [tuple(row) for row in rows] + self.pending(tracking_id)
+        points.sort(key=lambda p: p[0])
+        return points
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.rings),
+            "finished_sessions": len(self.finished),
+            "pending_points": self.pending_total,
+            "flushed_total": self.flushed_total,
+            "overwritten_total": sum(r.overwritten for r in self.rings.values()),
+            "flush_errors": self.flush_errors
+        }
+
+# ==================== Geometry ====================
+
+def route_length_m(points: List[Point]) -> float:
+    """Distance along consecutive fixes, in metres."""
+    return sum(
+        haversine_m(a[1], a[2], b[1], b[2])
+        for a, b in zip(points, points[1:])
+    )
+
+
+def simplify_route(points: List[Point], tolerance_m: float) -> List[Point]:
+    """
+    Douglas-Peucker: drop fixes closer than tolerance_m to the line between
+    the fixes kept around them. Endpoints are always kept.
+
+    Distances use an equirectangular projection around the route's mean
+    latitude, which is accurate to well under a metre at city scale.
+
+    Args:
+        points: Fixes in time order
+        tolerance_m: Maximum deviation of the result from the input
+
+    Returns:
+        Subset of points, in the same order
+    """
+    if len(points) < 3 or tolerance_m <= 0:
+        return list(points)
+
+    k_lat = math.radians(1) * EARTH_RADIUS_M
+    k_lng = k_lat * math.cos(math.radians(sum(p[1] for p in points) / len(points)))
+    xs = [p[2] * k_lng for p in points]
+    ys = [p[1] * k_lat for p in points]
+
+    keep = bytearray(len(points))
+    keep[0] = keep[-1] = 1
+    stack = [(0, len(points) - 1)]  # iterative, so long routes don't hit the recursion limit
+    while stack:
+        first, last = stack.pop()
+        dx, dy = xs[last] - xs[first], ys[last] - ys[first]
+        seg2 = dx * dx + dy * dy
+        worst, worst_d = None, tolerance_m
+        for i in range(first + 1, last):
+            px, py = xs[i] - xs[first], ys[i] - ys[first]
+            if seg2 == 0:
+                d = math.hypot(px, py)
+            else:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+                d = math.hypot(px - t * dx, py - t * dy)
+            if d > worst_d:
+                worst, worst_d = i, d
+        if worst is not None:
+            keep[worst] = 1
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return [p for p, k in zip(points, keep) if k]
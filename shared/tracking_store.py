@@ -0,0 +1,565 @@
+"""
+Tracking Session Store
+
+Where tracking_service keeps its live tracking sessions. Two backends share
+one async interface:
+
+    InMemorySessionStore   single process; expired sessions are evicted from
+                           an expiry heap by evict_expired()
+    RedisSessionStore      any Redis-protocol server (Redis, Valkey, KeyDB,
+                           or a fake client in tests); sessions survive
+                           restarts and every replica/worker sees the same
+                           state; expiry is left to the server's key TTLs
+
+    store = create_session_store(os.environ.get("TRACKING_STORE_URL"))
+    await store.put(session)
+    session = await store.get(tracking_id)
+
+Sessions are plain JSON-serialisable dicts with at least tracking_id,
+order_id, rider_id, status, updated_at and expires_at (epoch seconds). Both
+backends return copies, so callers must put() a session back after changing
+it. Expired sessions are kept for TRACKING_EXPIRED_GRACE_SECONDS after
+expires_at so readers can still answer 410 Gone rather than 404 for a
+delivery that just finished.
+
+Both backends also maintain secondary indexes on every put(), so the hot
+reads never scan all sessions:
+
+    sessions_for_riders()   rider_id -> its sessions
+    session_for_order()     order_id -> its latest session
+    counts()                active sessions by status and by recency of
+                            their last update, kept as running counters
+                            that an expiry-ordered structure retires when
+                            sessions expire
+
+The Redis backend needs the optional `redis` package unless a client is
+passed in.
+"""
+
+import heapq
+import json
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    aioredis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TRACKING_EXPIRED_GRACE_SECONDS = int(os.environ.get("TRACKING_EXPIRED_GRACE_SECONDS", "3600"))
+
+# Redis connections per process; when all are busy a command waits up to
+# TRACKING_REDIS_POOL_TIMEOUT for one instead of failing (e.g. a reconnect storm)
+TRACKING_REDIS_MAX_CONNECTIONS = int(os.environ.get("TRACKING_REDIS_MAX_CONNECTIONS", "100"))
+TRACKING_REDIS_POOL_TIMEOUT = float(os.environ.get("TRACKING_REDIS_POOL_TIMEOUT", "5"))
+
+# counts() buckets active sessions by the age of their last update
+RECENCY_BUCKETS = ("last_5_min", "last_hour", "older")
+_RECENCY_LIMITS = (300, 3600)
+
+# Statuses a Redis status index can hold (tracking_service's OrderStatus)
+TRACKING_STATUSES = ("ASSIGNED", "PICKED_UP", "IN_TRANSIT", "DELIVERED")
+
+
+def _now_ts() -> int:
+    return int(time.time())
+
+
+def _status_value(session: dict) -> str:
+    status = session["status"]
+    return getattr(status, "value", status)
+
+
+def _recency_bucket(updated_at: int, now: int) -> int:
+    """Index into RECENCY_BUCKETS for a session last updated at updated_at."""
+    age = now - updated_at
+    for bucket, limit in enumerate(_RECENCY_LIMITS):
+        if age <= limit:
+            return bucket
+    return len(_RECENCY_LIMITS)
+
+
+def _empty_counts() -> dict:
+    return {"active": 0, "by_status": {}, "by_recency": dict.fromkeys(RECENCY_BUCKETS, 0)}
+
+
+class TrackingSessionStore:
+    """Async interface shared by the session store backends."""
+
+    backend = "abstract"
+
+    def __init__(self, grace_seconds: int = TRACKING_EXPIRED_GRACE_SECONDS):
+        """
+        Args:
+            grace_seconds: How long an expired session is kept before eviction
+        """
+        self.grace_seconds = grace_seconds
+
+    def _evict_at(self, session: dict) -> int:
+        return int(session["expires_at"]) + self.grace_seconds
+
+    async def get(self, tracking_id: str) -> Optional[dict]:
+        """Session by id (a copy), or None if unknown or already evicted."""
+        raise NotImplementedError
+
+    async def put(self, session: dict):
+        """Insert or replace a session."""
+        raise NotImplementedError
+
+    async def delete(self, tracking_id: str):
+        """Remove a session if present."""
+        raise NotImplementedError
+
+    async def sessions(self) -> List[dict]:
+        """Every retained session, including expired ones still in their grace period."""
+        raise NotImplementedError
+
+    # The index lookups below scan sessions(); both backends override them
+
+    async def sessions_for_riders(self, rider_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        """rider_id -> its retained sessions, for riders that have any."""
+        wanted = set(rider_ids)
+        result: Dict[str, List[dict]] = defaultdict(list)
+        for session in await self.sessions():
+            if session["rider_id"] in wanted:
+                result[session["rider_id"]].append(session)
+        return dict(result)
+
+    async def session_for_order(self, order_id: str) -> Optional[dict]:
+        """Most recently started retained session for an order."""
+        matches = [s for s in await self.sessions() if s["order_id"] == order_id]
+        return max(matches, key=lambda s: s.get("started_at", 0)) if matches else None
+
+    async def counts(self, now: Optional[int] = None) -> dict:
+        """
+        Active (unexpired) sessions in total, by status and by recency.
+
+        Returns:
+            {"active": n, "by_status": {status: n}, "by_recency": {bucket: n}}
+        """
+        now = _now_ts() if now is None else now
+        result = _empty_counts()
+        by_status = Counter()
+        for session in await self.sessions():
+            if now <= session["expires_at"]:
+                result["active"] += 1
+                by_status[_status_value(session)] += 1
+                result["by_recency"][RECENCY_BUCKETS[_recency_bucket(session["updated_at"], now)]] += 1
+        result["by_status"] = dict(by_status)
+        return result
+
+    async def evict_expired(self, now: Optional[int] = None) -> int:
+        """Drop sessions past their grace period; returns how many were removed."""
+        return 0
+
+    async def close(self):
+        """Release backend resources."""
+
+    def stats(self) -> dict:
+        return {"backend": self.backend}
+
+
+class InMemorySessionStore(TrackingSessionStore):
+    """
+    Process-local store; only correct with a single worker.
+
+    Index upkeep is O(log n) per put. The counters cover active sessions
+    only; two lazily-validated heaps move sessions between them as time
+    passes: one keyed by expires_at (active -> expired), one holding at most
+    one live entry per session for its next recency-bucket boundary. A heap
+    is rebuilt from its live entries once superseded ones outnumber them, so
+    memory follows the retained sessions rather than the delivery rate.
+    """
+
+    backend = "memory"
+
+    def __init__(self, grace_seconds: int = TRACKING_EXPIRED_GRACE_SECONDS):
+        super().__init__(grace_seconds)
+        self._sessions: Dict[str, dict] = {}
+        # (evict_at, tracking_id); superseded entries are skipped lazily
+        self._expiry: List[Tuple[int, str]] = []
+        self.evicted_total = 0
+        # Secondary indexes
+        self._by_rider: Dict[str, Set[str]] = defaultdict(set)
+        self._by_order: Dict[str, Set[str]] = defaultdict(set)
+        # Counters over active sessions
+        self._active: Set[str] = set()
+        self._active_expiry: List[Tuple[int, str]] = []  # (expires_at, tracking_id)
+        self._status_counts: Counter = Counter()
+        self._recency_counts = [0] * len(RECENCY_BUCKETS)
+        self._recency_of: Dict[str, int] = {}
+        self._recency_heap: List[Tuple[int, str]] = []   # (bucket boundary, tracking_id)
+        self._recency_due: Dict[str, int] = {}           # live heap entry per session
+
+    async def get(self, tracking_id: str) -> Optional[dict]:
+        session = self._sessions.get(tracking_id)
+        if session is None:
+            return None
+        if _now_ts() > self._evict_at(session):
+            self._remove(tracking_id)
+            self.evicted_total += 1
+            return None
+        return dict(session)
+
+    async def put(self, session: dict):
+        now = _now_ts()
+        self._advance(now)
+        tracking_id = session["tracking_id"]
+        previous = self._sessions.get(tracking_id)
+        session = self._sessions[tracking_id] = dict(session)
+        if previous is None or previous["expires_at"] != session["expires_at"]:
+            heapq.heappush(self._expiry, (self._evict_at(session), tracking_id))
+            heapq.heappush(self._active_expiry, (session["expires_at"], tracking_id))
+        if previous is not None:
+            self._uncount(tracking_id, previous)
+            if previous["rider_id"] != session["rider_id"]:
+                self._unlink(self._by_rider, previous["rider_id"], tracking_id)
+            if previous["order_id"] != session["order_id"]:
+                self._unlink(self._by_order, previous["order_id"], tracking_id)
+
+        self._by_rider[session["rider_id"]].add(tracking_id)
+        self._by_order[session["order_id"]].add(tracking_id)
+        if now <= session["expires_at"]:
+            self._count(tracking_id, session, now)
+        self._compact()
+
+    async def delete(self, tracking_id: str):
+        if tracking_id in self._sessions:
+            self._remove(tracking_id)
+
+    async def sessions(self) -> List[dict]:
+        return [dict(s) for s in self._sessions.values()]
+
+    async def sessions_for_riders(self, rider_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        now = _now_ts()
+        result = {}
+        for rider_id in set(rider_ids):
+            found = [
+                dict(session) for session in (self._sessions[t] for t in self._by_rider.get(rider_id, ()))
+                if now <= self._evict_at(session)  # past grace, awaiting evict_expired()
+            ]
+            if found:
+                result[rider_id] = found
+        return result
+
+    async def session_for_order(self, order_id: str) -> Optional[dict]:
+        now = _now_ts()
+        found = [
+            session for session in (self._sessions[t] for t in self._by_order.get(order_id, ()))
+            if now <= self._evict_at(session)
+        ]
+        return dict(max(found, key=lambda s: s.get("started_at", 0))) if found else None
+
+    async def counts(self, now: Optional[int] = None) -> dict:
+        now = _now_ts() if now is None else now
+        self._advance(now)
+        return {
+            "active": len(self._active),
+            "by_status": {status: n for status, n in self._status_counts.items() if n},
+            "by_recency": dict(zip(RECENCY_BUCKETS, self._recency_counts))
+        }
+
+    async def evict_expired(self, now: Optional[int] = None) -> int:
+        now = _now_ts() if now is None else now
+        evicted = 0
+        while self._expiry and self._expiry[0][0] < now:
+            evict_at, tracking_id = heapq.heappop(self._expiry)
+            session = self._sessions.get(tracking_id)
+            if session is not None and self._evict_at(session) == evict_at:
+                self._remove(tracking_id)
+                evicted += 1
+        self.evicted_total += evicted
+        self._advance(now)
+        return evicted
+
+    # -------- index upkeep --------
+
+    def _remove(self, tracking_id: str):
+        session = self._sessions.pop(tracking_id)
+        self._uncount(tracking_id, session)
+        self._recency_due.pop(tracking_id, None)
+        self._unlink(self._by_rider, session["rider_id"], tracking_id)
+        self._unlink(self._by_order, session["order_id"], tracking_id)
+
+    @staticmethod
+    def _unlink(index: Dict[str, Set[str]], key: str, tracking_id: str):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(tracking_id)
+            if not ids:
+                del index[key]
+
+    def _count(self, tracking_id: str, session: dict, now: int):
+        self._active.add(tracking_id)
+        self._status_counts[_status_value(session)] += 1
+        bucket = _recency_bucket(session["updated_at"], now)
+        self._recency_counts[bucket] += 1
+        self._recency_of[tracking_id] = bucket
+        self._schedule_recency(tracking_id, session["updated_at"], bucket)
+
+    def _uncount(self, tracking_id: str, session: dict):
+        if tracking_id not in self._active:
+            return
+        self._active.discard(tracking_id)
+        self._status_counts[_status_value(session)] -= 1
+        self._recency_counts[self._recency_of.pop(tracking_id)] -= 1
+
+    def _schedule_recency(self, tracking_id: str, updated_at: int, bucket: int):
+        if bucket >= len(_RECENCY_LIMITS):
+            return
+        boundary = updated_at + _RECENCY_LIMITS[bucket]
+        due = self._recency_due.get(tracking_id)
+        # A later entry is re-examined when the earlier one fires
+        if due is None or boundary < due:
+            self._recency_due[tracking_id] = boundary
+            heapq.heappush(self._recency_heap, (boundary, tracking_id))
+
+    def _advance(self, now: int):
+        """Retire sessions that expired and move sessions between recency buckets."""
+        while self._active_expiry and self._active_expiry[0][0] < now:
+            expires_at, tracking_id = heapq.heappop(self._active_expiry)
+            session = self._sessions.get(tracking_id)
+            if session is not None and session["expires_at"] == expires_at:
+                self._uncount(tracking_id, session)
+                self._recency_due.pop(tracking_id, None)
+
+        while self._recency_heap and self._recency_heap[0][0] < now:
+            boundary, tracking_id = heapq.heappop(self._recency_heap)
+            if self._recency_due.get(tracking_id) != boundary:
+                continue
+            del self._recency_due[tracking_id]
+            if tracking_id not in self._active:
+                continue
+            updated_at = self._sessions[tracking_id]["updated_at"]
+            bucket = _recency_bucket(updated_at, now)
+            old = self._recency_of[tracking_id]
+            if bucket != old:
+                self._recency_counts[old] -= 1
+                self._recency_counts[bucket] += 1
+                self._recency_of[tracking_id] = bucket
+            self._schedule_recency(tracking_id, updated_at, bucket)
+
+    def _compact(self):
+        """Rebuild a heap from its live entries once superseded entries dominate it."""
+        if len(self._expiry) > 2 * len(self._sessions) + 1024:
+            self._expiry = [(self._evict_at(s), t) for t, s in self._sessions.items()]
+            heapq.heapify(self._expiry)
+        if len(self._active_expiry) > 2 * len(self._active) + 1024:
+            self._active_expiry = [(self._sessions[t]["expires_at"], t) for t in self._active]
+            heapq.heapify(self._active_expiry)
+        if len(self._recency_heap) > 2 * len(self._recency_due) + 1024:
+            self._recency_heap = [(boundary, t) for t, boundary in self._recency_due.items()]
+            heapq.heapify(self._recency_heap)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "sessions": len(self._sessions),
+            "active": len(self._active),
+            "riders_indexed": len(self._by_rider),
+            "orders_indexed": len(self._by_order),
+            "expiry_heap": len(self._expiry),
+            "recency_heap": len(self._recency_heap),
+            "evicted_total": self.evicted_total
+        }
+
+
+class RedisSessionStore(TrackingSessionStore):
+    """
+    Sessions as JSON strings under `<prefix><tracking_id>`, each with a key
+    TTL ending at its grace deadline.
+
+    Indexes live under `<index_prefix>` and are written in the same pipeline
+    as the session:
+
+        rider:<rider_id>     SET of tracking_ids (vanished ones pruned on read)
+        order:<order_id>     tracking_id last written for the order, same TTL
+        active               ZSET tracking_id -> expires_at
+        updated              ZSET tracking_id -> updated_at
+        status:<status>      ZSET tracking_id -> expires_at
+
+    The ZSETs hold active sessions only; counts() first sweeps members whose
+    expires_at has passed out of all of them, so each count is a ZCARD or
+    ZCOUNT.
+
+    The client needs the redis.asyncio methods get, set(ex=), delete, mget,
+    scan_iter(match=, count=), smembers, srem, zcard, zcount, zrangebyscore
+    and pipeline() (sadd, expire(nx=, gt=), set, zadd, zrem).
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, key_prefix: str = "tracking:session:",
+                 grace_seconds: int = TRACKING_EXPIRED_GRACE_SECONDS,
+                 index_prefix: str = "tracking:index:",
+                 statuses: Sequence[str] = TRACKING_STATUSES):
+        """
+        Args:
+            client: redis.asyncio.Redis (or a compatible stand-in)
+            key_prefix: Namespace for session keys
+            grace_seconds: How long an expired session is kept before eviction
+            index_prefix: Namespace for index keys (must not overlap key_prefix)
+            statuses: Every status a session can have, for the status indexes
+        """
+        super().__init__(grace_seconds)
+        self.client = client
+        self.key_prefix = key_prefix
+        self.index_prefix = index_prefix
+        self.statuses = tuple(statuses)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisSessionStore":
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("TRACKING_STORE_URL points at Redis but the `redis` package is not installed")
+        return cls(redis_client(url), **kwargs)
+
+    def _key(self, tracking_id: str) -> str:
+        return f"{self.key_prefix}{tracking_id}"
+
+    def _index(self, name: str) -> str:
+        return f"{self.index_prefix}{name}"
+
+    async def get(self, tracking_id: str) -> Optional[dict]:
+        raw = await self.client.get(self._key(tracking_id))
+        return json.loads(raw) if raw is not None else None
+
+    async def put(self, session: dict):
+        now = _now_ts()
+        tracking_id = session["tracking_id"]
+        ttl = self._evict_at(session) - now
+        if ttl <= 0:
+            await self.delete(tracking_id)
+            return
+        status = _status_value(session)
+        rider_key = self._index(f"rider:{session['rider_id']}")
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self._key(tracking_id), json.dumps(session), ex=ttl)
+        pipe.sadd(rider_key, tracking_id)
+        # NX gives a new set a TTL, GT only ever extends it (a TTL-less key counts as infinite for GT)
+        pipe.expire(rider_key, ttl, nx=True)
+        pipe.expire(rider_key, ttl, gt=True)
+        pipe.set(self._index(f"order:{session['order_id']}"), tracking_id, ex=ttl)
+        for other in self.statuses:
+            if other != status:
+                pipe.zrem(self._index(f"status:{other}"), tracking_id)
+        if now <= session["expires_at"]:
+            pipe.zadd(self._index("active"), {tracking_id: session["expires_at"]})
+            pipe.zadd(self._index("updated"), {tracking_id: session["updated_at"]})
+            pipe.zadd(self._index(f"status:{status}"), {tracking_id: session["expires_at"]})
+        else:
+            self._unindex_active(pipe, [tracking_id])
+        await pipe.execute()
+
+    async def delete(self, tracking_id: str):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(self._key(tracking_id))
+        self._unindex_active(pipe, [tracking_id])
+        await pipe.execute()
+
+    def _unindex_active(self, pipe, tracking_ids: List[str]):
+        pipe.zrem(self._index("active"), *tracking_ids)
+        pipe.zrem(self._index("updated"), *tracking_ids)
+        for status in self.statuses:
+            pipe.zrem(self._index(f"status:{status}"), *tracking_ids)
+
+    async def _sweep_expired(self, now: int):
+        """Drop sessions whose expires_at has passed from the active indexes."""
+        expired = await self.client.zrangebyscore(self._index("active"), "-inf", f"({now}")
+        for start in range(0, len(expired), 500):
+            pipe = self.client.pipeline(transaction=False)
+            self._unindex_active(pipe, expired[start:start + 500])
+            await pipe.execute()
+
+    async def sessions_for_riders(self, rider_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        result = {}
+        for rider_id in set(rider_ids):
+            rider_key = self._index(f"rider:{rider_id}")
+            ids = sorted(await self.client.smembers(rider_key))
+            if not ids:
+                continue
+            found, gone = [], []
+            for tracking_id, raw in zip(ids, await self.client.mget([self._key(t) for t in ids])):
+                if raw is None:
+                    gone.append(tracking_id)  # session key expired
+                else:
+                    found.append(json.loads(raw))
+            if gone:
+                await self.client.srem(rider_key, *gone)
+            if found:
+                result[rider_id] = found
+        return result
+
+    async def session_for_order(self, order_id: str) -> Optional[dict]:
+        tracking_id = await self.client.get(self._index(f"order:{order_id}"))
+        return await self.get(tracking_id) if tracking_id else None
+
+    async def counts(self, now: Optional[int] = None) -> dict:
+        now = _now_ts() if now is None else now
+        await self._sweep_expired(now)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcard(self._index("active"))
+        for status in self.statuses:
+            pipe.zcard(self._index(f"status:{status}"))
+        pipe.zcount(self._index("updated"), now - _RECENCY_LIMITS[0], "+inf")
+        pipe.zcount(self._index("updated"), now - _RECENCY_LIMITS[1], f"({now - _RECENCY_LIMITS[0]}")
+        results = await pipe.execute()
+
+        active, status_counts, recent, last_hour = results[0], results[1:-2], results[-2], results[-1]
+        return {
+            "active": active,
+            "by_status": {status: n for status, n in zip(self.statuses, status_counts) if n},
+            "by_recency": dict(zip(RECENCY_BUCKETS, (recent, last_hour, active - recent - last_hour)))
+        }
+
+    async def evict_expired(self, now: Optional[int] = None) -> int:
+        # Redis expires the session keys itself; keep the active indexes tidy
+        await self._sweep_expired(_now_ts() if now is None else now)
+        return 0
+
+    async def sessions(self) -> List[dict]:
+        keys = [key async for key in self.client.scan_iter(match=f"{self.key_prefix}*", count=500)]
+        result = []
+        for start in range(0, len(keys), 500):
+            for raw in await self.client.mget(keys[start:start + 500]):
+                if raw is not None:  # expired between SCAN and MGET
+                    result.append(json.loads(raw))
+        return result
+
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+
+def redis_client(url: str):
+    """redis.asyncio client on a blocking pool of TRACKING_REDIS_MAX_CONNECTIONS."""
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url, decode_responses=True,
+        max_connections=TRACKING_REDIS_MAX_CONNECTIONS, timeout=TRACKING_REDIS_POOL_TIMEOUT
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+def create_session_store(url: Optional[str] = None) -> TrackingSessionStore:
+    """
+    Build a store from a URL: memory:// (default) or redis://, rediss://, unix://.
+
+    Args:
+        url: Store URL, usually TRACKING_STORE_URL
+
+    Returns:
+        Session store instance
+    """
+    if not url or url.startswith("memory://"):
+        return InMemorySessionStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionStore.from_url(url)
+    raise ValueError(f"Unsupported tracking store URL: {url}")